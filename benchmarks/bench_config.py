@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+# Times the config operations on generated configs of growing size.
+#
+# Every config has the given number of schemes (random colors) and profiles
+# and a comment in front of every profile and scheme plus a trailing comment
+# on every fifth line. Each operation is timed on its own, the results can
+# be saved as JSON and compared against a baseline run, which fails (exit
+# status 1) if an operation got slower than the tolerance allows.
+#
+# Run from the repo root: python -m benchmarks.bench_config [--help]
+# or through doit: pipenv run doit benchmark
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tempfile
+from windows_terminal_scheme_manager import jsonc
+from windows_terminal_scheme_manager.terminal_config import (
+    WindowsTerminalConfig, WindowsTerminalConfigFile)
+
+# (schemes, profiles)
+SIZES = ((10, 1), (100, 20), (1000, 100), (10000, 500))
+COLOR_KEYS = (
+    'background', 'foreground', 'cursorColor', 'selectionBackground',
+    'black', 'red', 'green', 'yellow', 'blue', 'purple', 'cyan', 'white',
+    'brightBlack', 'brightRed', 'brightGreen', 'brightYellow', 'brightBlue',
+    'brightPurple', 'brightCyan', 'brightWhite')
+# Added by the add_scheme and bulk_import operations
+NEW_SCHEMES = 200
+# A timing only counts as a regression if it is also this much slower
+MIN_REGRESSION_SECONDS = 0.002
+
+
+def generate_scheme(rng, name):
+    scheme = {key: '#{:06x}'.format(rng.randrange(0x1000000)) for key in COLOR_KEYS}
+    scheme['name'] = name
+    return scheme
+
+
+def generate_config(schemes, profiles, seed=0):
+    rng = random.Random(seed)
+    config = {
+        '$schema': 'https://aka.ms/terminal-profiles-schema',
+        'defaultProfile': '{00000000-0000-0000-0000-000000000000}',
+        'profiles': {
+            'defaults': {'colorScheme': 'Scheme 0'},
+            'list': [{'guid': '{{00000000-0000-0000-0000-{:012d}}}'.format(i),
+                      'name': 'Profile {}'.format(i),
+                      'commandline': 'profile{}.exe'.format(i),
+                      'hidden': False} for i in range(profiles)]},
+        'schemes': [generate_scheme(rng, 'Scheme {}'.format(i))
+                    for i in range(schemes)],
+        'actions': []}
+    lines = ['// Generated by benchmarks/bench_config.py']
+    for number, line in enumerate(jsonc.dumps(config).split('\n')):
+        stripped = line.strip()
+        if stripped.startswith(('"guid"', '"background"')):
+            lines.append(line[:len(line) - len(stripped)] + '// Comment')
+        if number % 5 == 0 and stripped.endswith(','):
+            line += ' // trailing'
+        lines.append(line)
+    return '\n'.join(lines)
+
+
+def best_of(function, setup=lambda: None, repeat=5):
+    times = []
+    for _ in range(repeat):
+        argument = setup()
+        start = time.perf_counter()
+        function(argument)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def bench_size(schemes, profiles, repeat):
+    text = generate_config(schemes, profiles)
+    rng = random.Random(1)
+    new_schemes = [generate_scheme(rng, 'New {}'.format(i))
+                   for i in range(NEW_SCHEMES)]
+
+    def parsed(_=None):
+        return WindowsTerminalConfig.parse(text)
+
+    results = {
+        'parse': best_of(parsed, repeat=repeat),
+        'add_scheme': best_of(lambda config: config.add_scheme(new_schemes[0]),
+                              parsed, repeat),
+        'bulk_import': best_of(lambda config: config.add_schemes(new_schemes),
+                               parsed, repeat),
+        'cycle_schemes': best_of(lambda config: config.cycle_schemes(
+            profile='Profile {}'.format(profiles - 1)), parsed, repeat),
+        'assemble_config': best_of(lambda config: config.assemble_config(),
+                                   parsed, repeat),
+    }
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, 'profiles.json')
+
+        def changed_config_file():
+            with open(path, 'w') as file:
+                file.write(text)
+            config_file = WindowsTerminalConfigFile(path=path)
+            config_file.cycle_schemes()
+            return config_file
+
+        results['write'] = best_of(lambda config_file: config_file.write(),
+                                   changed_config_file, repeat)
+    return results
+
+
+def run(sizes, repeat):
+    results = {}
+    for schemes, profiles in sizes:
+        # Few repeats for the big configs, they are slow and less noisy
+        size_repeat = max(1, repeat if schemes < 1000 else repeat // 2)
+        for operation, seconds in bench_size(schemes, profiles, size_repeat).items():
+            results['{}/{}x{}'.format(operation, schemes, profiles)] = seconds
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Prints the results next to the baseline and returns the names of the
+    regressions."""
+    regressions = []
+    print('{:<32} {:>11} {:>11} {:>8}'.format(
+        'operation/schemes x profiles', 'baseline', 'now', 'change'))
+    for name, seconds in results.items():
+        before = baseline.get(name)
+        if before is None:
+            print('{:<32} {:>11} {:>9.2f}ms'.format(name, '-', seconds * 1000))
+            continue
+        regression = (seconds > before * (1 + tolerance) and
+                      seconds - before > MIN_REGRESSION_SECONDS)
+        if regression:
+            regressions.append(name)
+        print('{:<32} {:>9.2f}ms {:>9.2f}ms {:>+7.0%}{}'.format(
+            name, before * 1000, seconds * 1000, seconds / before - 1,
+            '  REGRESSION' if regression else ''))
+    return regressions
+
+
+def parse_size(size):
+    schemes, _, profiles = size.partition('x')
+    return int(schemes), int(profiles or 1)
+
+
+def main(arguments):
+    parser = argparse.ArgumentParser(
+        description='Times the config operations on generated configs.')
+    parser.add_argument('sizes', nargs='*', type=parse_size,
+                        help='SCHEMESxPROFILES, e.g. 1000x50 (default: {})'.format(
+                            ' '.join('{}x{}'.format(*size) for size in SIZES)))
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='runs of each operation, the fastest counts')
+    parser.add_argument('--output', help='save the results to this JSON file')
+    parser.add_argument('--baseline', help='compare with the results in this file')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='slowdown that counts as a regression (0.25 = 25%%)')
+    options = parser.parse_args(arguments)
+
+    results = run(options.sizes or SIZES, options.repeat)
+    baseline = {}
+    if options.baseline and os.path.exists(options.baseline):
+        with open(options.baseline, 'r') as file:
+            baseline = json.load(file)['results']
+    regressions = compare(results, baseline, options.tolerance)
+    if options.output:
+        os.makedirs(os.path.dirname(options.output) or '.', exist_ok=True)
+        with open(options.output, 'w') as file:
+            json.dump({'python': platform.python_version(),
+                       'machine': platform.machine(),
+                       'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                       'results': results}, file, indent=2)
+    if regressions:
+        print('{} regressions: {}'.format(len(regressions), ', '.join(regressions)))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
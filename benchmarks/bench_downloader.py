@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+# Times loading schemes from an archive with and without worker processes.
+# The bundled test archive is scaled up synthetically by repeating its
+# schemes under new names.
+#
+# Run from the repo root: python -m benchmarks.bench_downloader [copies ...]
+
+import io
+import os
+import sys
+import time
+import zipfile
+from windows_terminal_scheme_manager.downloader import WindowsTerminalSchemeDownloader
+
+TEST_ZIP = os.path.join('tests', 'windows_terminal_scheme_manager',
+                        'iTerm2-Color-Schemes-only-windowsterminal.zip')
+ZIP_SCHEME_PATH = WindowsTerminalSchemeDownloader.ZIP_SCHEME_PATH
+
+
+def scaled_archive(copies):
+    archive = io.BytesIO()
+    with zipfile.ZipFile(TEST_ZIP) as source:
+        members = [(info.filename[len(ZIP_SCHEME_PATH):], source.read(info))
+                   for info in source.infolist() if info.filename.endswith('.json')]
+    with zipfile.ZipFile(archive, 'w', zipfile.ZIP_DEFLATED) as target:
+        for copy in range(copies):
+            for name, data in members:
+                target.writestr('{}{} {}'.format(ZIP_SCHEME_PATH, copy, name),
+                                data.replace(b'"name": "', '"name": "{} '.format(
+                                    copy).encode()))
+    return archive
+
+
+def best_of(function, repeat=5):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def main(copies_list):
+    downloader = WindowsTerminalSchemeDownloader()
+    processes = max(2, downloader.LOADER_PROCESSES)
+    print('{:>8} {:>12} {:>12}'.format(
+        'schemes', '1 process', '{} processes'.format(processes)))
+    for copies in copies_list:
+        archive = scaled_archive(copies)
+        single, schemes = best_of(
+            lambda: downloader.read_schemes(archive, processes=1))
+        parallel, parallel_schemes = best_of(
+            lambda: downloader.read_schemes(archive, processes=processes))
+        assert schemes == parallel_schemes
+        print('{:>8} {:>10.1f}ms {:>10.1f}ms'.format(
+            len(schemes), single * 1000, parallel * 1000))
+
+
+if __name__ == '__main__':
+    main([int(copies) for copies in sys.argv[1:]] or [1, 10, 50])
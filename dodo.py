@@ -17,6 +17,34 @@ def task_test():
     }
 
 
+BENCHMARK_RESULTS = path.join('.', '.benchmarks', 'latest.json')
+BENCHMARK_BASELINE = path.join('.', '.benchmarks', 'baseline.json')
+
+
+def _run_benchmark(arguments):
+    from benchmarks import bench_config
+    return bench_config.main(arguments) == 0
+
+
+def task_benchmark():
+    """Times the config operations, fails if they got slower than the baseline"""
+    return {
+        'actions': [(_run_benchmark, [[
+            '--output', BENCHMARK_RESULTS, '--baseline', BENCHMARK_BASELINE]])],
+        'verbosity': 2,
+        'uptodate': [False],
+    }
+
+
+def task_benchmark_baseline():
+    """Saves the timings of the config operations as the new baseline"""
+    return {
+        'actions': [(_run_benchmark, [['--output', BENCHMARK_BASELINE]])],
+        'verbosity': 2,
+        'uptodate': [False],
+    }
+
+
 def task_build_msi():
     return {
         'file_dep': _source_files(),
@@ -34,6 +62,7 @@ def task_build_onefile():
             'pyinstaller --onefile \
             --noupx\
             --hidden-import="pkg_resources.py2_warn" \
+            --collect-submodules windows_terminal_scheme_manager.commands \
             --name wtsm \
             {}\
             '.format(path.join(
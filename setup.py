@@ -3,11 +3,16 @@ from setuptools import setup
 setup(
     name='windows_terminal_scheme_manager',
     version='0.3',
-    packages=['windows_terminal_scheme_manager'],
+    packages=['windows_terminal_scheme_manager',
+              'windows_terminal_scheme_manager.commands'],
     include_package_data=True,
     install_requires=[
         'Click',
     ],
+    extras_require={
+        # wtsm stats and the --dark/--light/--min_contrast filters
+        'stats': ['numpy'],
+    },
     entry_points={
         'console_scripts': [
             'wtsm = windows_terminal_scheme_manager.scheme_manager:cli'
@@ -0,0 +1,58 @@
+import unittest
+import os
+import time
+import shutil
+import tempfile
+from windows_terminal_scheme_manager.terminal_config import WindowsTerminalConfigFile
+from windows_terminal_scheme_manager.background_writer import BackgroundWriter
+
+
+class TestBackgroundWriter(unittest.TestCase):
+
+    TESTFILES_PATH = os.path.join('.', 'tests', 'windows_terminal_scheme_manager')
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'profiles.json')
+        shutil.copy(os.path.join(self.TESTFILES_PATH, 'profile_with_all_schemes.json'),
+                    self.path)
+        self.config_file = WindowsTerminalConfigFile(path=self.path)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _scheme_in_file(self):
+        return WindowsTerminalConfigFile(path=self.path).config.get_current_scheme()
+
+    def test_coalesces_changes(self):
+        names = self.config_file.config.schemes()[:50]
+        with BackgroundWriter(self.config_file, delay=60, max_delay=60) as writer:
+            for name in names:
+                with writer.lock:
+                    self.config_file.set_scheme(name)
+                writer.changed()
+            self.assertNotEqual(self._scheme_in_file(), names[-1])
+        self.assertEqual(self._scheme_in_file(), names[-1])
+        # One write, so only the original file was backed up
+        self.assertEqual(len(self.config_file.backup_store().backups()), 1)
+
+    def test_writes_after_delay(self):
+        writer = BackgroundWriter(self.config_file, delay=0.01)
+        try:
+            self.config_file.set_scheme('Monokai Soda')
+            writer.changed()
+            deadline = time.monotonic() + 5
+            while (self._scheme_in_file() != 'Monokai Soda' and
+                   time.monotonic() < deadline):
+                time.sleep(0.01)
+            self.assertEqual(self._scheme_in_file(), 'Monokai Soda')
+        finally:
+            writer.close()
+
+    def test_close_raises_write_errors(self):
+        writer = BackgroundWriter(self.config_file, delay=60)
+        self.config_file.set_scheme('Monokai Soda')
+        self.config_file.path = os.path.join(self.tmpdir.name, 'missing', 'x.json')
+        writer.changed()
+        with self.assertRaises(OSError):
+            writer.close()
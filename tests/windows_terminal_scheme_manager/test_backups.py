@@ -0,0 +1,52 @@
+import unittest
+import os
+import tempfile
+from datetime import datetime, timedelta
+from windows_terminal_scheme_manager.backups import BackupStore, BackupNotFoundError
+
+
+class TestBackupStore(unittest.TestCase):
+
+    NOW = datetime(2020, 6, 15, 12, 30)
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.store = BackupStore(os.path.join(self.tmpdir.name, 'backups'))
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_add_and_read(self):
+        first = self.store.add(b'{"a": 1}', time=self.NOW)
+        self.assertIs(self.store.add(b'{"a": 1}', time=self.NOW), first)
+        second = self.store.add(b'{"a": 2}', time=self.NOW)
+        third = self.store.add(b'{"a": 1}', time=self.NOW)
+        self.assertEqual([first['id'], second['id'], third['id']], [1, 2, 3])
+        self.assertEqual(third['object'], first['object'])
+        # Only two objects and the index are stored
+        self.assertEqual(len(os.listdir(self.store.directory)), 3)
+        store = BackupStore(self.store.directory)
+        self.assertEqual(store.backups(), self.store.backups())
+        self.assertEqual(store.read(store.find(2)), b'{"a": 2}')
+        self.assertEqual(store.find(first['hash'][:8])['id'], 3)
+        with self.assertRaises(BackupNotFoundError):
+            store.find(4)
+
+    def test_prune(self):
+        times = [self.NOW - timedelta(minutes=20 * i) for i in range(100)][::-1]
+        times = [self.NOW - timedelta(days=40)] + times
+        for i, time in enumerate(times):
+            self.store.add('{}'.format(i).encode(), time=time)
+        removed = self.store.prune(keep_last=5, hourly=3, daily=2, now=self.NOW)
+        kept = self.store.backups()
+        self.assertEqual(len(removed) + len(kept), len(times))
+        kept_times = [datetime.strptime(backup['time'], BackupStore.DATE_FORMAT)
+                      for backup in kept]
+        self.assertEqual(kept_times[-5:], times[-5:])
+        # The newest of the hours 9 and 10 and of the day before
+        self.assertEqual(kept_times[:-5], [
+            datetime(2020, 6, 14, 23, 50), datetime(2020, 6, 15, 9, 50),
+            datetime(2020, 6, 15, 10, 50)])
+        self.assertEqual(len(os.listdir(self.store.directory)), len(kept) + 1)
+        self.store.clear()
+        self.assertEqual(os.listdir(self.store.directory), ['index.json'])
@@ -0,0 +1,125 @@
+import unittest
+import os
+import time
+import shutil
+import socket
+import tempfile
+import threading
+from unittest import mock
+from windows_terminal_scheme_manager import daemon
+from windows_terminal_scheme_manager.terminal_config import WindowsTerminalConfigFile
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+@unittest.skipUnless(hasattr(socket, 'AF_UNIX'), 'needs Unix sockets')
+class TestSchemeDaemon(unittest.TestCase):
+
+    TESTFILES_PATH = os.path.join('.', 'tests', 'windows_terminal_scheme_manager')
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'profiles.json')
+        shutil.copy(os.path.join(self.TESTFILES_PATH, 'profile_with_all_schemes.json'),
+                    self.path)
+        self.socket_path = os.path.join(self.tmpdir.name, 'wtsm.sock')
+        environment = mock.patch.dict(
+            os.environ, {daemon.SOCKET_ENV_VARIABLE: self.socket_path})
+        environment.start()
+        self.addCleanup(environment.stop)
+        self.daemon = daemon.SchemeDaemon(self.path, poll_seconds=0.05).start()
+        self.thread = threading.Thread(target=self.daemon.serve_forever)
+        self.thread.start()
+
+    def tearDown(self):
+        self.daemon.shutdown()
+        self.thread.join()
+        self.tmpdir.cleanup()
+
+    def _scheme_in_file(self):
+        return WindowsTerminalConfigFile(path=self.path).config.get_current_scheme()
+
+    def test_commands(self):
+        schemes = WindowsTerminalConfigFile(path=self.path).config.schemes()
+        self.assertEqual(daemon.forward('set', self.path, scheme='Monokai Soda'),
+                         {'scheme': 'Monokai Soda'})
+        self.assertEqual(self._scheme_in_file(), 'Monokai Soda')
+        response = daemon.forward('next', self.path)
+        self.assertEqual(response['scheme'],
+                         schemes[schemes.index('Monokai Soda') + 1])
+        self.assertEqual(self._scheme_in_file(), response['scheme'])
+        self.assertEqual(daemon.forward('previous', self.path)['scheme'],
+                         'Monokai Soda')
+        self.assertEqual(daemon.forward('list', self.path)['schemes'], schemes)
+        with self.assertRaises(daemon.DaemonError):
+            daemon.forward('next', self.path, profile='Missing')
+
+    def test_reloads_outside_changes(self):
+        daemon.forward('set', self.path, scheme='Monokai Soda')
+        text = self._read()
+        with open(self.path, 'w') as file:
+            file.write(text.replace('"Monokai Soda"', '"3024 Day"', 1))
+        # Also without waiting for the watcher
+        self.assertEqual(daemon.forward('list', self.path)['scheme'], '3024 Day')
+        with open(self.path, 'w') as file:
+            file.write(text)
+        self.assertTrue(wait_for(
+            lambda: self.daemon.config_file.config.get_current_scheme() ==
+            'Monokai Soda'))
+        with open(self.path, 'w') as file:
+            file.write('{"broken": ')
+        with self.assertRaises(daemon.DaemonError):
+            daemon.forward('next', self.path)
+        self.assertEqual(self._read(), '{"broken": ')
+
+    def _read(self):
+        with open(self.path, 'r') as file:
+            return file.read()
+
+    def test_no_daemon_for_other_configs(self):
+        other_path = os.path.join(self.tmpdir.name, 'other.json')
+        shutil.copy(self.path, other_path)
+        self.assertIsNone(daemon.forward('next', other_path))
+        with self.assertRaises(daemon.DaemonError):
+            daemon.SchemeDaemon(self.path).start()
+
+    def test_no_daemon_after_shutdown(self):
+        self.daemon.shutdown()
+        self.thread.join()
+        self.assertFalse(os.path.exists(self.socket_path))
+        self.assertIsNone(daemon.forward('next', self.path))
+        # A stale socket file is replaced
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as stale:
+            stale.bind(self.socket_path)
+        self.assertIsNone(daemon.forward('next', self.path))
+        self.daemon = daemon.SchemeDaemon(self.path).start()
+        self.thread = threading.Thread(target=self.daemon.serve_forever)
+        self.thread.start()
+        self.assertEqual(daemon.forward('set', self.path, scheme='Monokai Soda'),
+                         {'scheme': 'Monokai Soda'})
+
+
+class TestFileWatcher(unittest.TestCase):
+
+    def test_watch(self):
+        for use_inotify in (True, False):
+            with tempfile.TemporaryDirectory() as tmpdir:
+                path = os.path.join(tmpdir, 'profiles.json')
+                calls = []
+                watcher = daemon.FileWatcher(path, lambda: calls.append(1),
+                                             poll_seconds=0.01,
+                                             use_inotify=use_inotify).start()
+                try:
+                    with open(os.path.join(tmpdir, 'other.json'), 'w') as file:
+                        file.write('{}')
+                    with open(path + '.tmp', 'w') as file:
+                        file.write('{}')
+                    os.replace(path + '.tmp', path)
+                    self.assertTrue(wait_for(lambda: calls))
+                finally:
+                    watcher.stop()
@@ -1,7 +1,19 @@
 import unittest
 import os
+import io
+import json
+import zipfile
+import threading
+import urllib.error
+from functools import partial
+from unittest import mock
+import shutil
+import tempfile
 from multiprocessing import Process
-from windows_terminal_scheme_manager.downloader import WindowsTerminalSchemeDownloader
+from windows_terminal_scheme_manager.downloader import (
+    WindowsTerminalSchemeDownloader, InvalidSchemeError, validate_scheme)
+from windows_terminal_scheme_manager.catalog import SchemeCatalog
+from windows_terminal_scheme_manager.terminal_config import WindowsTerminalConfigFile
 import http.server
 import socketserver
 
@@ -15,9 +27,50 @@ def serve_schemes_zip():
         httpd.serve_forever()
 
 
+class RecordingHandler(http.server.SimpleHTTPRequestHandler):
+    status_codes = []
+
+    def log_request(self, code='-', size='-'):
+        self.status_codes.append(int(code))
+
+
+class FlakyHandler(http.server.BaseHTTPRequestHandler):
+    """Serves data, but closes the connection after drop_after bytes for the
+    first `drops` requests. Answers Range requests if support_range is set."""
+    data = b''
+    drop_after = 0
+    drops = 0
+    support_range = True
+    requests = []
+
+    def do_GET(self):
+        type(self).requests.append(self.headers.get('Range'))
+        start = 0
+        if self.support_range and self.headers.get('Range'):
+            start = int(self.headers['Range'][len('bytes='):-1])
+            self.send_response(206)
+            self.send_header('Content-Range', 'bytes {}-{}/{}'.format(
+                start, len(self.data) - 1, len(self.data)))
+        else:
+            self.send_response(200)
+        self.send_header('Content-Length', str(len(self.data) - start))
+        self.send_header('ETag', '"test"')
+        self.end_headers()
+        if type(self).drops:
+            type(self).drops -= 1
+            self.wfile.write(self.data[start:start + self.drop_after])
+            self.close_connection = True
+            return
+        self.wfile.write(self.data[start:])
+
+    def log_message(self, *args):
+        pass
+
+
 class TestWindowsTerminalSchemeDownloader(unittest.TestCase):
     TEST_ZIP = 'iTerm2-Color-Schemes-only-windowsterminal.zip'
     TEST_URL = 'http://localhost:8000/{}'.format(TEST_ZIP)
+    TESTFILES_PATH = os.path.join('.', 'tests', 'windows_terminal_scheme_manager')
     SCHEME_PATH = os.path.join('iTerm2-Color-Schemes-master', 'windowsterminal')
 
     def setUp(self):
@@ -26,15 +79,175 @@ class TestWindowsTerminalSchemeDownloader(unittest.TestCase):
     def test_everything(self):
         p = Process(target=serve_schemes_zip)
         p.start()
-        zip_file = self.downloader.download_repo()
-        p.terminate()
-        tmpdir, scheme_filenames = self.downloader.unpack_schemes(zip_file)
-        self.assertEqual(len(scheme_filenames), 211)
+        try:
+            archive = self.downloader.download_archive()
+        finally:
+            # A failed download must not leave the server running
+            p.terminate()
+        with archive:
+            new_schemes = self.downloader.read_schemes(archive)
+            with tempfile.TemporaryDirectory() as tmpdir:
+                zipfile.ZipFile(archive).extractall(tmpdir)
+                schemes_path = os.path.join(tmpdir, self.SCHEME_PATH)
+                scheme_filenames = sorted(os.listdir(schemes_path))
+                extracted_schemes = self.downloader.get_all_schemes(
+                    schemes_path, scheme_filenames)
+        self.assertEqual(len(new_schemes), 211)
+        self.assertEqual(len(str(new_schemes)), 92459)
+        self.assertEqual(new_schemes[0]['name'], '3024 Day')
         self.assertEqual(scheme_filenames[0], '3024 Day.json')
         self.assertEqual(scheme_filenames[-1], 'synthwave.json')
+        self.assertEqual(len(extracted_schemes), 211)
 
-        schemes_path = os.path.join(tmpdir, self.SCHEME_PATH)
-        new_schemes = self.downloader.get_all_schemes(schemes_path, scheme_filenames)
+    def test_read_schemes_from_archive(self):
+        zip_path = os.path.join(self.TESTFILES_PATH, self.TEST_ZIP)
+        new_schemes = self.downloader.read_schemes(zip_path)
         self.assertEqual(len(new_schemes), 211)
         self.assertEqual(len(str(new_schemes)), 92459)
         self.assertEqual(new_schemes[0]['name'], '3024 Day')
+        self.assertEqual(new_schemes[-1]['name'], 'synthwave')
+
+    def test_add_schemes_from_archive(self):
+        zip_path = os.path.join(self.TESTFILES_PATH, self.TEST_ZIP)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            config_path = os.path.join(tmpdir, 'profiles.json')
+            shutil.copyfile(os.path.join(
+                self.TESTFILES_PATH, 'schemes_without_set_scheme.json'), config_path)
+            self.downloader.download_and_add_schemes_to_config(
+                repo_path=zip_path, config_file=config_path)
+            config = WindowsTerminalConfigFile(path=config_path).config
+            self.assertEqual(len(config.schemes()), 211)
+            self.assertEqual(sorted(os.listdir(tmpdir)),
+                             ['profiles.json', 'wtsm_backups'])
+
+    def test_read_schemes_in_processes(self):
+        zip_path = os.path.join(self.TESTFILES_PATH, self.TEST_ZIP)
+        with open(zip_path, 'rb') as file:
+            archive = io.BytesIO(file.read())
+        self.downloader.MEMBERS_PER_TASK = 20
+        self.assertEqual(self.downloader.read_schemes(archive, processes=3),
+                         self.downloader.read_schemes(zip_path, processes=1))
+
+    def test_invalid_schemes_are_skipped(self):
+        scheme = self.downloader.read_schemes(
+            os.path.join(self.TESTFILES_PATH, self.TEST_ZIP))[0]
+        validate_scheme(scheme)
+        invalid_schemes = [
+            [], {**scheme, 'name': ''}, {**scheme, 'red': '#12345'},
+            {**scheme, 'cursorColor': 'red'},
+            {key: value for key, value in scheme.items() if key != 'blue'}]
+        for invalid_scheme in invalid_schemes:
+            with self.assertRaises(InvalidSchemeError):
+                validate_scheme(invalid_scheme)
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, 'w') as z:
+            path = self.downloader.ZIP_SCHEME_PATH
+            z.writestr(path + 'a.json', json.dumps(invalid_schemes[2]))
+            z.writestr(path + 'b.json', json.dumps(scheme))
+            z.writestr(path + 'c.json', '{"name": ')
+            z.writestr(path + 'sub/d.json', json.dumps(scheme))
+            z.writestr(path + 'e.json', json.dumps(scheme),
+                       compress_type=zipfile.ZIP_DEFLATED)
+        self.assertEqual(self.downloader.read_schemes(archive), [scheme, scheme])
+        self.assertEqual(self.downloader.read_schemes(archive, processes=2),
+                         [scheme, scheme])
+
+    def _start_server(self, handler=None):
+        RecordingHandler.status_codes = []
+        server = http.server.ThreadingHTTPServer(
+            ('localhost', 0),
+            handler or partial(RecordingHandler, directory=self.TESTFILES_PATH))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        return server
+
+    def test_catalog(self):
+        server = self._start_server()
+        url = 'http://localhost:{}/{}'.format(server.server_address[1], self.TEST_ZIP)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            catalog_path = os.path.join(tmpdir, 'catalog.json')
+            downloader = WindowsTerminalSchemeDownloader(url, catalog_path)
+            schemes = downloader.fetch_schemes()
+            self.assertEqual(len(schemes), 211)
+            self.assertEqual(RecordingHandler.status_codes, [200])
+            self.assertTrue(os.path.exists(catalog_path))
+
+            downloader = WindowsTerminalSchemeDownloader(url, catalog_path, retries=0)
+            with mock.patch.object(downloader, 'read_schemes',
+                                   side_effect=AssertionError):
+                self.assertEqual(downloader.fetch_schemes(), schemes)
+                self.assertEqual(RecordingHandler.status_codes, [200, 304])
+                server.shutdown()
+                server.server_close()
+                # Offline
+                self.assertEqual(downloader.fetch_schemes(), schemes)
+
+            downloader = WindowsTerminalSchemeDownloader(
+                url + '?other', catalog_path, retries=0)
+            with self.assertRaises(urllib.error.URLError):
+                downloader.fetch_schemes()
+
+    def test_sync_prunes_schemes_removed_upstream(self):
+        schemes = self.downloader.read_schemes(
+            os.path.join(self.TESTFILES_PATH, self.TEST_ZIP))[:3]
+        with tempfile.TemporaryDirectory() as tmpdir:
+            config_path = os.path.join(tmpdir, 'profiles.json')
+            shutil.copyfile(os.path.join(
+                self.TESTFILES_PATH, 'schemes_without_set_scheme.json'), config_path)
+            config_file = WindowsTerminalConfigFile(path=config_path)
+            config_file.config.add_schemes(schemes + [{**schemes[0], 'name': 'Own'}])
+            config_file.write()
+            downloader = WindowsTerminalSchemeDownloader(
+                self.TEST_URL, os.path.join(tmpdir, 'catalog.json'))
+            with mock.patch.object(downloader, 'fetch_schemes',
+                                   return_value=schemes[1:]):
+                # Without an earlier download nothing is known to be removed
+                self.assertEqual(downloader.sync_schemes_to_config(
+                    prune=True, config_file=config_path), ([], [], []))
+                SchemeCatalog(downloader.catalog_path, self.TEST_URL,
+                              schemes=schemes).save()
+                self.assertEqual(downloader.sync_schemes_to_config(
+                    prune=True, config_file=config_path),
+                    ([], [], [schemes[0]['name']]))
+            self.assertEqual(WindowsTerminalConfigFile(path=config_path).config
+                             .schemes()[-3:], [schemes[1]['name'],
+                                               schemes[2]['name'], 'Own'])
+
+    def _flaky_downloader(self, drops, support_range=True):
+        with open(os.path.join(self.TESTFILES_PATH, self.TEST_ZIP), 'rb') as file:
+            FlakyHandler.data = file.read()
+        FlakyHandler.drop_after = 20000
+        FlakyHandler.drops = drops
+        FlakyHandler.support_range = support_range
+        FlakyHandler.requests = []
+        server = self._start_server(FlakyHandler)
+        self.addCleanup(server.shutdown)
+        progress = []
+        downloader = WindowsTerminalSchemeDownloader(
+            'http://localhost:{}/schemes.zip'.format(server.server_address[1]),
+            timeout=5, retries=3,
+            progress=lambda downloaded, total: progress.append((downloaded, total)))
+        downloader.retry_backoff = 0
+        return downloader, progress
+
+    def test_download_resumes_after_dropped_connections(self):
+        downloader, progress = self._flaky_downloader(drops=2)
+        with downloader.download_archive() as archive:
+            self.assertEqual(archive.read(), FlakyHandler.data)
+        self.assertEqual(FlakyHandler.requests,
+                         [None, 'bytes=20000-', 'bytes=40000-'])
+        size = len(FlakyHandler.data)
+        self.assertEqual(progress[0], (20000, size))
+        self.assertEqual(progress[-1], (size, size))
+
+    def test_download_starts_over_without_range_support(self):
+        downloader, progress = self._flaky_downloader(drops=1, support_range=False)
+        with downloader.download_archive() as archive:
+            self.assertEqual(archive.read(), FlakyHandler.data)
+        self.assertEqual(FlakyHandler.requests, [None, 'bytes=20000-'])
+
+    def test_download_gives_up(self):
+        downloader, progress = self._flaky_downloader(drops=4)
+        with self.assertRaises(ConnectionError):
+            downloader.download_archive()
+        self.assertEqual(len(FlakyHandler.requests), 4)
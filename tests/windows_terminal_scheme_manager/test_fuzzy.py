@@ -0,0 +1,27 @@
+import unittest
+from windows_terminal_scheme_manager.fuzzy import FuzzyIndex
+
+
+class TestFuzzyIndex(unittest.TestCase):
+
+    NAMES = ['Solarized Dark', 'Monokai Soda', 'Monokai Remastered', 'Dark+',
+             'Builtin Solarized Dark', 'MaterialDark']
+
+    def test_search(self):
+        index = FuzzyIndex(self.NAMES)
+        self.assertEqual(index.search_names('mon'),
+                         ['Monokai Soda', 'Monokai Remastered'])
+        self.assertEqual(index.search_names('MONSOD'), ['Monokai Soda'])
+        # Contiguous matches first, then earlier ones, then shorter names
+        self.assertEqual(index.search_names('dark'), [
+            'Dark+', 'MaterialDark', 'Solarized Dark', 'Builtin Solarized Dark'])
+        self.assertEqual(index.search_names('xyz'), [])
+        # The tightest match counts, not the first one
+        self.assertEqual(FuzzyIndex(['a_b', 'xa__ab']).search_names('ab'),
+                         ['xa__ab', 'a_b'])
+        self.assertEqual(index.search(''), list(range(len(self.NAMES))))
+
+    def test_narrowing_matches_full_search(self):
+        index = FuzzyIndex(self.NAMES)
+        for query in ('s', 'so', 'sol', 'sold', 'so', 'sa', 'a', 'ar', ''):
+            self.assertEqual(index.search(query), FuzzyIndex(self.NAMES).search(query))
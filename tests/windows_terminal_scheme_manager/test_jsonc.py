@@ -0,0 +1,149 @@
+import io
+import unittest
+import os
+import re
+import json
+from windows_terminal_scheme_manager import jsonc
+from unittest import mock
+from windows_terminal_scheme_manager.terminal_config import WindowsTerminalConfig
+
+BRACKET_REGEX = re.compile(r":\s*\n\s*([\[\{])")
+EMPTY_ARRAY_REGEX = re.compile(r"([ \t]*)(\"[^\[\n\"]+\"\: )\[[\t ]*\](,?)")
+EMPTY_OBJECT_REGEX = re.compile(r"([ \t]*)(\"[^{\n\"]+\"\: ){[\t ]*}(,?)")
+
+
+def fix_formatting(lines):
+    # How older versions of wtsm formatted the output of json.dumps
+    lines = BRACKET_REGEX.sub(': \\1', lines)
+    lines = EMPTY_ARRAY_REGEX.sub('\\1\\2[\n\\1]\\3', lines)
+    return EMPTY_OBJECT_REGEX.sub('\\1\\2{\n\\1}\\3', lines)
+
+
+class TestJsonc(unittest.TestCase):
+
+    TESTFILES_PATH = os.path.join('.', 'tests', 'windows_terminal_scheme_manager')
+    JSONC_EXAMPLE = '\n'.join([
+        '// head',
+        '/* block',
+        '   comment */',
+        '{',
+        '    "a": 1, // one',
+        '    "b": [ /* inline */ 1, 2.5, ], // list',
+        '    /* own line */',
+        '    "c": {',
+        '        // inside',
+        '    },',
+        '    "d": "x" /* multi',
+        '    line */ , "e": true,',
+        '}',
+        '// tail',
+        ''])
+    ASSEMBLED_EXAMPLE = '\n'.join([
+        '// head',
+        '/* block',
+        '   comment */',
+        '{',
+        '    "a": 1, // one',
+        '    "b": [',
+        '        1,',
+        '        2.5',
+        '    ], /* inline */ // list',
+        '    /* own line */',
+        '    "c": {',
+        '        // inside',
+        '    },',
+        '    "d": "x", /* multi',
+        '    line */',
+        '    "e": true',
+        '}',
+        '// tail'])
+
+    def test_parse(self):
+        config, comments, trailing_comments = jsonc.parse(self.JSONC_EXAMPLE)
+        self.assertEqual(config, {'a': 1, 'b': [1, 2.5], 'c': {}, 'd': 'x', 'e': True})
+        self.assertEqual(comments[0], '// head')
+        self.assertEqual(comments[11], '        // inside')
+        self.assertEqual(trailing_comments[4], ' // one')
+
+    def test_parse_like_json(self):
+        for filename in ('fixed_default_profiles.json',
+                         'profile_with_all_schemes.json'):
+            with open(os.path.join(self.TESTFILES_PATH, filename), 'r') as file:
+                text = file.read()
+            lines = [line for line in text.split('\n')
+                     if not line.strip().startswith('//')]
+            config, _, _ = jsonc.parse(text)
+            self.assertEqual(config, json.loads('\n'.join(lines)))
+
+    def test_round_trip(self):
+        config = WindowsTerminalConfig.parse(self.JSONC_EXAMPLE)
+        assembled_config = config.assemble_config()
+        self.assertEqual(assembled_config, self.ASSEMBLED_EXAMPLE)
+        self.assertEqual(
+            WindowsTerminalConfig.parse(assembled_config).assemble_config(),
+            assembled_config)
+        examples = {
+            # Multi line comments after a value
+            '{\n    "a": [ // t\n    ] /* x\n    y */,\n    "b": {} /* p */ /* x\n'
+            '    y */ /* z */\n}':
+            '{\n    "a": [ // t\n    ], /* x\n    y */\n    "b": {\n'
+            '    } /* p */ /* x\n    y */ /* z */\n}',
+            '{"a"// t\n: /* x\n\n y */true ,/* x\n y */"b"\n: 1}\n\n':
+            '{\n    "a": true,// t\n/* x\n\n y */\n/* x\n y */\n    "b": 1\n}',
+            # Byte order mark
+            '\ufeff{\n    "a": 1\n}': '\ufeff{\n    "a": 1\n}',
+            '\ufeff// c\n{"a": 1}': '\ufeff// c\n{\n    "a": 1\n}',
+            # Comments in front of the root
+            '/* c */ {"a": 1} // t': '/* c */\n{\n    "a": 1\n} // t',
+            '// c\n  /* d\n e */ [1]': '// c\n  /* d\n e */\n[\n    1\n]',
+        }
+        for text, expected in examples.items():
+            assembled_config = WindowsTerminalConfig.parse(text).assemble_config()
+            self.assertEqual(assembled_config, expected)
+            self.assertEqual(
+                WindowsTerminalConfig.parse(assembled_config).assemble_config(),
+                assembled_config)
+
+    def test_dumps_like_json(self):
+        value = {'a': [], 'b': {}, 'c': [[], {}, {'d': []}], '': [], 'ü': 'é\x00',
+                 'e': [1.5, -0.0, 1e100, float('nan'), 10 ** 30, True, None],
+                 'f': {'g': {'h': 'i'}}, 1: 2}
+        for value in (value, [value], [], {}, 'x', 1):
+            self.assertEqual(jsonc.dumps(value),
+                             fix_formatting(json.dumps(value, indent=4)))
+        # The regexes split this one in the middle of the key
+        self.assertEqual(jsonc.dumps({'x"y': []}), '{\n    "x\\"y": []\n}')
+        with self.assertRaises(TypeError):
+            jsonc.dumps({'a': {1, 2}})
+
+    def test_dump_in_chunks(self):
+        config = WindowsTerminalConfig.parse(self.JSONC_EXAMPLE)
+        with mock.patch.object(jsonc._JsoncWriter, 'CHUNK_LINES', 2):
+            file = io.StringIO()
+            jsonc.dump(config.config, file, config.comments, config.trailing_comments)
+        self.assertEqual(file.getvalue(), self.ASSEMBLED_EXAMPLE)
+
+    def test_trailing_comments_move_with_edits(self):
+        config = WindowsTerminalConfig.parse(self.JSONC_EXAMPLE)
+        config._set_key(key='b', value=[1, 2, 3])
+        lines = config.assemble_config().split('\n')
+        self.assertEqual(lines[8], '        3')
+        self.assertEqual(lines[14], '    "d": "x", /* multi')
+        self.assertEqual(lines[15], '    line */')
+
+    def test_errors(self):
+        for text in ('{"a": 1 "b": 2}', '{"a": /* 1}', '[1,,2]', '{"a": 1}}',
+                     '{a: 1}'):
+            with self.assertRaises(json.JSONDecodeError):
+                jsonc.parse(text)
+
+    def test_spans(self):
+        text = '{"a": {"b": [1, "x"], "c": 2, "c": 3}, "d": 4}'
+        spans = {}
+        jsonc.parse(text, spans=spans, track=lambda path: path[0] == 'a')
+        self.assertEqual(text[spans[('a', 'b', 1)][1]:spans[('a', 'b', 1)][2]], '"x"')
+        member_start, value_start, value_end = spans[('a', 'b')]
+        self.assertEqual(text[member_start:value_start], '"b": ')
+        self.assertEqual(text[value_start:value_end], '[1, "x"]')
+        self.assertIsNone(spans[('a', 'c')])
+        self.assertNotIn(('d',), spans)
@@ -0,0 +1,103 @@
+import unittest
+import os
+from windows_terminal_scheme_manager.terminal_config import WindowsTerminalConfigFile
+from windows_terminal_scheme_manager.colors import relative_luminance, contrast
+
+try:
+    import numpy as np
+    from windows_terminal_scheme_manager import scheme_stats
+except ImportError:
+    np = None
+
+
+@unittest.skipIf(np is None, 'numpy is not installed')
+class TestSchemeMatrix(unittest.TestCase):
+
+    TESTFILES_PATH = os.path.join('.', 'tests', 'windows_terminal_scheme_manager')
+    CONFIG_PATH = os.path.join(TESTFILES_PATH, 'profile_with_all_schemes.json')
+
+    def setUp(self):
+        self.schemes = WindowsTerminalConfigFile(
+            path=self.CONFIG_PATH).config.get('schemes')
+        self.matrix = scheme_stats.SchemeMatrix(self.schemes)
+
+    def test_decode(self):
+        self.assertEqual(self.matrix.rgb.shape, (len(self.schemes), 20, 3))
+        self.assertEqual(self.matrix.names[0], self.schemes[0]['name'])
+        for scheme, rgb in zip(self.schemes, self.matrix.rgb):
+            for slot, color in zip(scheme_stats.COLOR_SLOTS, rgb):
+                if slot in scheme:
+                    self.assertEqual('#{:02x}{:02x}{:02x}'.format(*color),
+                                     scheme[slot].lower())
+
+    def test_contrast_like_per_scheme(self):
+        expected = [[contrast(scheme[slot], scheme['background'])
+                     for slot in ('foreground',) + scheme_stats.ANSI_SLOTS]
+                    for scheme in self.schemes]
+        np.testing.assert_allclose(
+            np.column_stack([self.matrix.foreground_contrast(),
+                             self.matrix.ansi_contrast()]), expected)
+        self.assertEqual(
+            list(self.matrix.is_dark()),
+            [relative_luminance(scheme['background']) < 0.179
+             for scheme in self.schemes])
+
+    def test_missing_and_invalid_colors(self):
+        matrix = scheme_stats.SchemeMatrix([
+            {'name': 'Paper', 'background': '#FFFFFF', 'foreground': '#000000'},
+            {'name': 'Broken', 'background': '#000000', 'foreground': 'red'}])
+        self.assertEqual(list(matrix.present[:, :2].ravel()), [True] * 3 + [False])
+        np.testing.assert_allclose(matrix.foreground_contrast(), [21, np.nan])
+        self.assertEqual(list(matrix.is_dark()), [False, True])
+
+    def test_select(self):
+        mask = self.matrix.select(dark=False, min_contrast=10)
+        names = [name for name, selected in zip(self.matrix.names, mask) if selected]
+        self.assertIn('Builtin Light', names)
+        for scheme in self.schemes:
+            if scheme['name'] in names:
+                self.assertGreaterEqual(
+                    contrast(scheme['foreground'], scheme['background']), 10)
+        self.assertEqual(int(self.matrix.select().sum()), len(self.schemes))
+
+    def test_lab(self):
+        matrix = scheme_stats.SchemeMatrix([
+            {'name': 'Paper', 'background': '#FFFFFF', 'foreground': '#000000',
+             'red': '#FF0000'}])
+        lab = matrix.lab()[0]
+        np.testing.assert_allclose(lab[0], [100, 0, 0], atol=0.01)
+        np.testing.assert_allclose(lab[1], [0, 0, 0], atol=0.01)
+        np.testing.assert_allclose(lab[scheme_stats.COLOR_SLOTS.index('red')],
+                                   [53.24, 80.09, 67.20], atol=0.05)
+        # Missing colors count as white
+        np.testing.assert_allclose(lab[2], [100, 0, 0], atol=0.01)
+
+    def test_similar(self):
+        index = self.matrix.names.index('Monokai Soda')
+        indices, distances = self.matrix.similar(index, k=3)
+        self.assertEqual(self.matrix.names[indices[0]], 'Monokai Remastered')
+        self.assertNotIn(index, indices)
+        self.assertEqual(list(distances), sorted(distances))
+        lab = self.matrix.lab()
+        expected = np.sqrt((np.linalg.norm(lab[index] - lab, axis=-1) ** 2).mean(
+            axis=1))
+        np.testing.assert_allclose(distances, expected[indices])
+        self.assertEqual(len(self.matrix.similar(index, k=10 ** 6)[0]),
+                         len(self.schemes) - 1)
+
+    def test_duplicates(self):
+        paraiso = self.matrix.names.index('Paraiso Dark')
+        parasio = self.matrix.names.index('Parasio Dark')
+        duplicates = self.matrix.duplicates(1)
+        self.assertEqual(duplicates, [(max(paraiso, parasio), min(paraiso, parasio),
+                                       0.0)])
+        duplicates = self.matrix.duplicates(1, keep=[max(paraiso, parasio)])
+        self.assertEqual(duplicates, [(min(paraiso, parasio), max(paraiso, parasio),
+                                       0.0)])
+        # A chain a - b - c keeps a and c if only b is close to both
+        matrix = scheme_stats.SchemeMatrix([
+            {'name': name, 'background': color}
+            for name, color in (('a', '#000000'), ('b', '#060606'),
+                                ('c', '#0c0c0c'))])
+        self.assertEqual([(i, j) for i, j, _ in matrix.duplicates(0.6)], [(1, 0)])
+        self.assertEqual(matrix.duplicates(0), [])
@@ -0,0 +1,14 @@
+import unittest
+from windows_terminal_scheme_manager.screen import nearest_terminal_color
+
+
+class TestScreen(unittest.TestCase):
+
+    def test_nearest_terminal_color(self):
+        self.assertEqual(nearest_terminal_color((0, 0, 0)), 16)
+        self.assertEqual(nearest_terminal_color((255, 255, 255)), 231)
+        self.assertEqual(nearest_terminal_color((255, 0, 0)), 196)
+        self.assertEqual(nearest_terminal_color((0x30, 0x30, 0x30)), 236)
+        self.assertEqual(nearest_terminal_color((0x87, 0xaf, 0xd7)), 110)
+        self.assertEqual(nearest_terminal_color((250, 10, 0), colors=8), 1)
+        self.assertEqual(nearest_terminal_color((40, 40, 40), colors=8), 0)
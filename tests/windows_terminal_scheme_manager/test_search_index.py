@@ -0,0 +1,62 @@
+import unittest
+import os
+import shutil
+import tempfile
+from unittest import mock
+from windows_terminal_scheme_manager.terminal_config import WindowsTerminalConfig
+from windows_terminal_scheme_manager.search_index import (
+    SchemeSearchIndex, dominant_hue)
+
+
+class TestSchemeSearchIndex(unittest.TestCase):
+
+    TESTFILES_PATH = os.path.join('.', 'tests', 'windows_terminal_scheme_manager')
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'profiles.json')
+        self.catalog_path = os.path.join(self.tmpdir.name, 'catalog.json')
+        shutil.copy(os.path.join(self.TESTFILES_PATH, 'profile_with_all_schemes.json'),
+                    self.path)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _index(self):
+        return SchemeSearchIndex.for_config(self.path, catalog_path=self.catalog_path)
+
+    def test_search(self):
+        index = self._index()
+        self.assertEqual(index.search('monsod')[0]['name'], 'Monokai Soda')
+        light = index.search(dark=False, min_contrast=7)
+        self.assertIn('Builtin Light', [entry['name'] for entry in light])
+        for entry in light:
+            self.assertFalse(entry['dark'])
+            self.assertGreaterEqual(entry['contrast'], 7)
+        self.assertEqual({entry['hue'] for entry in index.search(hue='blue')},
+                         {'blue'})
+        self.assertEqual({entry['source'] for entry in index.entries}, {'custom'})
+
+    def test_fresh_index_does_not_parse_config(self):
+        entries = self._index().entries
+        os.utime(self.path, ns=(1, 1))
+        with mock.patch.object(WindowsTerminalConfig, 'parse',
+                               side_effect=AssertionError('parsed')):
+            self.assertEqual(self._index().entries, entries)
+            # The new mtime was saved
+            self.assertEqual(self._index().entries, entries)
+        with open(self.path, 'r') as file:
+            text = file.read()
+        with open(self.path, 'w') as file:
+            file.write(text.replace('"Monokai Soda"', '"Monokai Cola"'))
+        names = [entry['name'] for entry in self._index().entries]
+        self.assertIn('Monokai Cola', names)
+        self.assertNotIn('Monokai Soda', names)
+
+    def test_dominant_hue(self):
+        self.assertEqual(dominant_hue({'name': 'x', 'background': '#002b36',
+                                       'foreground': '#839496'}), 'cyan')
+        self.assertEqual(dominant_hue({'name': 'x', 'background': '#000000',
+                                       'foreground': '#ffffff', 'red': '#ff0000'}),
+                         'gray')
+        self.assertEqual(dominant_hue({'name': 'x', 'background': '#3b0000'}), 'red')
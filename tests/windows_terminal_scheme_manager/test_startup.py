@@ -0,0 +1,95 @@
+import unittest
+import os
+import sys
+import json
+import subprocess
+
+# Modules that the hot commands must not import (they are only needed for
+# downloading schemes, the UI or scheme statistics)
+HEAVY_MODULES = ('npyscreen', 'curses', 'urllib.request', 'zipfile', 'orjson',
+                 'numpy', 'windows_terminal_scheme_manager.downloader',
+                 'windows_terminal_scheme_manager.screen')
+HOT_COMMANDS = ('next-scheme', 'previous-scheme', 'set')
+
+# Runs wtsm in a fresh interpreter and records every process it starts
+STARTUP_SCRIPT = '''
+import sys
+import json
+import time
+
+started_processes = []
+
+
+def audit(event, args):
+    if event in ('subprocess.Popen', 'os.system', 'os.posix_spawn', 'os.exec',
+                 'os.spawn', 'os.fork', 'os.startfile'):
+        started_processes.append(event)
+
+
+sys.addaudithook(audit)
+start = time.perf_counter()
+from windows_terminal_scheme_manager.scheme_manager import cli
+try:
+    cli(sys.argv[1:], standalone_mode=False)
+finally:
+    sys.stderr.write(json.dumps({
+        'started_processes': started_processes,
+        'seconds': time.perf_counter() - start}))
+'''
+
+
+def import_time_report(command):
+    """Imports the implementation of command with -X importtime and returns
+    {module: (self_us, cumulative_us, depth)} for every imported module."""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c',
+         'from windows_terminal_scheme_manager.scheme_manager import cli; '
+         'cli.get_command(None, {!r})'.format(command)],
+        capture_output=True, encoding='utf-8', check=True)
+    report = {}
+    for line in result.stderr.split('\n'):
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        report[name.strip()] = (int(self_us), int(cumulative_us), depth)
+    return report
+
+
+class TestStartup(unittest.TestCase):
+
+    TESTFILES_PATH = os.path.join('.', 'tests', 'windows_terminal_scheme_manager')
+    CONFIG_PATH = os.path.join(TESTFILES_PATH, 'profile_with_all_schemes.json')
+    # Generous, this is meant to catch things like subprocesses or network
+    # access sneaking into the startup, not to measure small differences
+    STARTUP_BUDGET_SECONDS = 2
+    # Cumulative import time of the wtsm modules for the hot commands,
+    # about 70ms (mostly click) when this was written
+    IMPORT_BUDGET_US = 200000
+
+    def run_wtsm(self, *arguments):
+        env = dict(os.environ)
+        env.pop('WTSM_CONFIG_DIR', None)
+        result = subprocess.run(
+            [sys.executable, '-c', STARTUP_SCRIPT, *arguments],
+            capture_output=True, encoding='utf-8', env=env)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        return result.stdout, json.loads(result.stderr.strip().split('\n')[-1])
+
+    def test_list_starts_no_processes(self):
+        output, report = self.run_wtsm('list', '--config_file', self.CONFIG_PATH)
+        self.assertIn('Available Schemes: 3024 Day', output)
+        self.assertEqual(report['started_processes'], [])
+        self.assertLess(report['seconds'], self.STARTUP_BUDGET_SECONDS)
+
+    def test_hot_commands_import_time(self):
+        for command in HOT_COMMANDS:
+            report = import_time_report(command)
+            heavy_modules = [module for module in HEAVY_MODULES if module in report]
+            self.assertEqual(heavy_modules, [], command)
+            import_time = sum(
+                cumulative_us for module, (_, cumulative_us, depth) in report.items()
+                if depth == 0 and module.startswith('windows_terminal_scheme_manager'))
+            slowest = sorted(report.items(), key=lambda item: -item[1][0])[:10]
+            self.assertLess(import_time, self.IMPORT_BUDGET_US,
+                            '{}: {}'.format(command, slowest))
@@ -1,7 +1,11 @@
 import unittest
 import os
 import tempfile
-from windows_terminal_scheme_manager.terminal_config import WindowsTerminalConfigFile
+from unittest import mock
+from windows_terminal_scheme_manager import jsonc, terminal_config
+from windows_terminal_scheme_manager.terminal_config import (
+    WindowsTerminalConfig, WindowsTerminalConfigFile, ProfileNotFoundError,
+    InvalidOperationError)
 
 
 class TestWindowsTerminalConfigFile(unittest.TestCase):
@@ -60,6 +64,9 @@ class TestWindowsTerminalConfigFile(unittest.TestCase):
     def _switch_to_profile_with_set_schemes(self):
         return self._choose_config_file('schemes_with_set_scheme.json')
 
+    def _strip_lines(self, lines):
+        return [line.strip() for line in lines]
+
     def assertFileEqualString(self, filename, text):
         with open(filename) as file:
             written_text = file.read()
@@ -79,7 +86,7 @@ class TestWindowsTerminalConfigFile(unittest.TestCase):
         self.assertEqual(gcs(profile=None), scheme)
 
     def test_fix_formatting(self):
-        fixed_text = self.obj.fix_formatting(self.config_text)
+        fixed_text = self.config.assemble_config()
         self.assertNotRegex(fixed_text, r':\s*\[ *\]')
         self.assertNotRegex(fixed_text, r':\s*\{ *\}')
         self.assertNotRegex(fixed_text, r":\s*\n\s*([\[\{])")
@@ -203,3 +210,376 @@ class TestWindowsTerminalConfigFile(unittest.TestCase):
             test_path = os.path.join(tmpdir, 'test_cycle_scheme.json')
             self.obj.test_write(path=test_path)
             self.assertFileEqualString(test_path, add_schemes_testfile)
+
+    def test_line_index(self):
+        self._switch_to_profile_with_schemes()
+        index = self.config._line_index
+        lines = jsonc.dumps(self.config.config).split('\n')
+        self.assertEqual(index.node_size(), len(lines))
+        self.assertEqual(lines[index.start('profiles', 'defaults')].strip(),
+                         '"defaults": {')
+        self.assertEqual(lines[index.end('profiles', 'defaults')].strip(), '},')
+        self.assertIn('"name": "3024 Day",', self._strip_lines(
+            lines[index.start('schemes', 1):index.end('schemes', 1)]))
+        self.assertEqual(lines[index.end('schemes')].strip(), '],')
+
+        self.config.remove_scheme('Monokai Soda')
+        self.config.set_scheme('AlienBlood', profile='cmd')
+        lines = jsonc.dumps(self.config.config).split('\n')
+        self.assertEqual(index.node_size(), len(lines))
+        self.assertIn('"name": "AlienBlood",', self._strip_lines(
+            lines[index.start('schemes', 1):index.end('schemes', 1)]))
+
+    def test_add_schemes_and_write(self):
+        all_schemes_text = self._switch_to_profile_with_all_schemes()
+        all_schemes = self.config.get('schemes')
+        self.setUp()
+        added_names = self.config.add_schemes(all_schemes + all_schemes)
+        self.assertEqual(added_names, [scheme['name'] for scheme in all_schemes])
+        with tempfile.TemporaryDirectory() as tmpdir:
+            test_path = os.path.join(tmpdir, 'test_add_schemes.json')
+            self.obj.test_write(path=test_path)
+            self.assertFileEqualString(test_path, all_schemes_text)
+
+    def test_remove_schemes_and_write(self):
+        self._switch_to_profile_with_all_schemes()
+        removed_names = self.config.remove_schemes(['synthwave', 'SeaShells'],
+                                                   pattern='3024 D*')
+        self.assertEqual(removed_names, ['3024 Day', 'SeaShells', 'synthwave'])
+        self.assertEqual(self.config.remove_schemes(pattern='3024 D*'), [])
+
+        add_schemes_testfile = TestWindowsTerminalConfigFile\
+            ._read_test_file('profile_with_almost_all_schemes.json')
+        with tempfile.TemporaryDirectory() as tmpdir:
+            test_path = os.path.join(tmpdir, 'test_remove_schemes.json')
+            self.obj.test_write(path=test_path)
+            self.assertFileEqualString(test_path, add_schemes_testfile)
+
+    def test_remove_schemes_by_position(self):
+        config = WindowsTerminalConfig.parse(
+            '{"schemes": [{"name": "Twin", "background": "#000000"},\n'
+            '             {"name": "Twin", "background": "#FFFFFF"},\n'
+            '             {"name": "Other"}]}')
+        self.assertEqual(config.remove_schemes(positions=[1]), ['Twin'])
+        self.assertEqual(config.get('schemes'),
+                         [{'name': 'Twin', 'background': '#000000'},
+                          {'name': 'Other'}])
+
+    def test_sync_schemes(self):
+        self._switch_to_profile_with_schemes()
+        self.config.set_scheme('AlienBlood', profile='cmd')
+        comments = dict(self.config.comments)
+        new_day = {**self.SCHEME_EXAMPLE, 'red': '#DB2D21', 'cursorColor': '#ffffff'}
+        new_scheme = {**self.SCHEME_EXAMPLE, 'name': 'New'}
+        schemes = [new_day, new_scheme,
+                   {**self.config.get('schemes')[2], 'red': '#FFFFFF'}]
+        self.assertEqual(self.config.sync_schemes(schemes),
+                         (['New'], ['3024 Day', 'AlienBlood'], []))
+        self.assertEqual(self.config.sync_schemes(schemes), ([], [], []))
+        self.assertEqual(self.config.get('schemes')[1], new_day)
+        # Only schemes removed upstream go, Monokai Soda was never upstream and
+        # AlienBlood is in use
+        self.assertEqual(self.config.sync_schemes(
+            [{**new_day, 'red': '#db2d21'}],
+            previous_names=['3024 Day', 'AlienBlood', 'New', 'Gone']),
+            ([], [], ['New']))
+        self.assertEqual(self.config.schemes(),
+                         ['Monokai Soda', '3024 Day', 'AlienBlood'])
+        written_config = WindowsTerminalConfig.parse(self._write_and_read())
+        self.assertEqual(written_config.config, self.config.config)
+        self.assertEqual(sorted(written_config.comments.values()),
+                         sorted(comments.values()))
+
+    def test_cycle_schemes_with_candidates(self):
+        self._switch_to_profile_with_schemes()
+        candidates = {'Monokai Soda', 'AlienBlood'}
+        self.config.cycle_schemes(candidates=candidates)
+        self.assertDefaultScheme('Monokai Soda')
+        self.config.cycle_schemes(candidates=candidates)
+        self.assertDefaultScheme('AlienBlood')
+        self.config.cycle_schemes(candidates=candidates)
+        self.assertDefaultScheme('Monokai Soda')
+        self.config.cycle_schemes(backwards=True, candidates={'3024 Day'})
+        self.assertDefaultScheme('3024 Day')
+
+    def test_has_scheme(self):
+        self._switch_to_profile_with_schemes()
+        self.assertTrue(self.config.has_scheme('3024 Day'))
+        self.assertFalse(self.config.has_scheme('Monokai Remastered'))
+
+        self.config.add_scheme(dict(self.SCHEME_EXAMPLE, name='Monokai Remastered'))
+        self.assertTrue(self.config.has_scheme('Monokai Remastered'))
+        self.config.set_scheme('Monokai Remastered')
+        self.assertEqual(self.config._next_scheme(), 'Monokai Soda')
+        self.assertEqual(self.config._next_scheme(backwards=True), 'AlienBlood')
+
+        self.config.remove_scheme('3024 Day')
+        self.assertFalse(self.config.has_scheme('3024 Day'))
+        self.config.set_scheme('Monokai Soda')
+        self.assertEqual(self.config._next_scheme(), 'AlienBlood')
+
+    def test_get_profile(self):
+        cmd_guid = '{0caa0dad-35be-5f56-a8ff-afceeeaa6101}'
+        self.assertEqual(self.config.get_profile('cmd')['guid'], cmd_guid)
+        self.assertEqual(self.config.get_profile(cmd_guid)['name'], 'cmd')
+        self.assertEqual(self.config.get_default_config()['name'],
+                         'Windows PowerShell')
+        with self.assertRaises(ProfileNotFoundError):
+            self.config.get_profile('zsh')
+
+        self.config.set_attribute_for_profile(cmd_guid, 'name', 'zsh')
+        self.assertEqual(self.config.get_profile('zsh')['guid'], cmd_guid)
+        with self.assertRaises(ProfileNotFoundError):
+            self.config.get_current_scheme(profile='cmd')
+
+    @mock.patch('platform.system', return_value='Linux')
+    @mock.patch.object(terminal_config, '_find_local_app_data_from_wsl')
+    def test_default_config_dir(self, find_local_app_data, _):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            find_local_app_data.return_value = tmpdir
+            environ = {'XDG_CACHE_HOME': tmpdir,
+                       terminal_config.CONFIG_DIR_ENV_VARIABLE: ''}
+            with mock.patch.dict(os.environ, environ):
+                config_dir = os.path.join(tmpdir, terminal_config.TERMINAL_PACKAGE_DIR)
+                for _ in range(2):
+                    terminal_config.default_config_dir.cache_clear()
+                    self.assertEqual(terminal_config.default_config_dir(), config_dir)
+                # The cached directory does not exist, so it was looked up again
+                self.assertEqual(find_local_app_data.call_count, 2)
+                os.makedirs(config_dir)
+                for _ in range(2):
+                    terminal_config.default_config_dir.cache_clear()
+                    self.assertEqual(terminal_config.default_config_dir(), config_dir)
+                self.assertEqual(find_local_app_data.call_count, 2)
+
+                os.environ[terminal_config.CONFIG_DIR_ENV_VARIABLE] =\
+                    self.TESTFILES_PATH
+                terminal_config.default_config_dir.cache_clear()
+                self.assertEqual(WindowsTerminalConfigFile.default_config_path(),
+                                 os.path.join(self.TESTFILES_PATH, 'profiles.json'))
+        terminal_config.default_config_dir.cache_clear()
+
+    def _write_and_read(self, filename='test_patch.json'):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            test_path = os.path.join(tmpdir, filename)
+            self.obj.test_write(path=test_path)
+            with open(test_path, 'r') as file:
+                return file.read()
+
+    def test_patch_scheme_in_place(self):
+        text = self._switch_to_profile_with_set_schemes()
+        self.obj.cycle_schemes()
+        self.assertDefaultScheme('3024 Day')
+        self.obj.set_scheme('AlienBlood', profile='cmd')
+        self.assertEqual(self._write_and_read(), text.replace(
+            '"colorScheme": "3024 Day"', '"colorScheme": "AlienBlood"').replace(
+            '"colorScheme": "Monokai Soda"', '"colorScheme": "3024 Day"'))
+
+    def test_patch_new_attribute_in_place(self):
+        text = self._choose_config_file('schemes_without_set_scheme.json')
+        self.obj.set_scheme('AlienBlood', profile='Arch')
+        self.obj.set_scheme('3024 Day', profile='Arch')
+        self.obj.set_scheme('Monokai Soda')
+        written_text = self._write_and_read()
+        self.assertEqual(written_text, text.replace(
+            '"defaults": {',
+            '"defaults": {\n            "colorScheme": "Monokai Soda"'
+        ).replace(
+            '"guid": "{a5a97cb8',
+            '"colorScheme": "3024 Day",\n                "guid": "{a5a97cb8'))
+        config = WindowsTerminalConfig.parse(written_text)
+        self.assertEqual(config.config, self.config.config)
+
+    def test_patch_attribute_into_empty_object(self):
+        text = self._read_test_file('schemes_without_set_scheme.json').replace(
+            '"defaults": {\n'
+            '            // Put settings here that you want to apply to all profiles\n'
+            '        },', '"defaults": {},')
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'profiles.json')
+            with open(path, 'w') as file:
+                file.write(text)
+            config_file = WindowsTerminalConfigFile(path=path)
+            config_file.set_scheme('Monokai Soda')
+            config_file.write()
+            self.assertTrue(config_file._text_patched)
+            self.assertFileEqualString(path, text.replace(
+                '"defaults": {},', '"defaults": {\n'
+                '            "colorScheme": "Monokai Soda"\n'
+                '        },'))
+
+    def test_patch_falls_back_to_full_write(self):
+        self._switch_to_profile_with_set_schemes()
+        self.config.remove_scheme('AlienBlood')
+        self.obj.cycle_schemes()
+        self.assertIsNone(self.obj.text)
+        written_text = self._write_and_read()
+        self.assertEqual(written_text, self.config.assemble_config())
+
+    def _copy_test_file(self, tmpdir, filename):
+        path = os.path.join(tmpdir, 'profiles.json')
+        with open(path, 'w') as file:
+            file.write(self._read_test_file(filename))
+        return path
+
+    def test_write_skips_unchanged_config(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = self._copy_test_file(tmpdir, 'schemes_with_set_scheme.json')
+            inode = os.stat(path).st_ino
+            config_file = WindowsTerminalConfigFile(path=path)
+            config_file.write()
+            config_file.set_scheme('3024 Day', profile='cmd')
+            config_file.write()
+            self.assertEqual(os.stat(path).st_ino, inode)
+            self.assertEqual(os.listdir(tmpdir), ['profiles.json'])
+
+    def test_write_keeps_crlf(self):
+        text = self._read_test_file('schemes_with_set_scheme.json').replace(
+            '\n', '\r\n')
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'profiles.json')
+            with open(path, 'wb') as file:
+                file.write(text.encode('utf-8'))
+            inode = os.stat(path).st_ino
+            config_file = WindowsTerminalConfigFile(path=path)
+            config_file.write()
+            self.assertEqual(os.stat(path).st_ino, inode)
+            self.assertEqual(os.listdir(tmpdir), ['profiles.json'])
+            config_file.config.remove_scheme('AlienBlood')
+            config_file.write()
+            with open(path, 'rb') as file:
+                written = file.read().decode('utf-8')
+            self.assertEqual(written.count('\r\n'), written.count('\n'))
+            self.assertEqual(written.replace('\r\n', '\n'),
+                             config_file.config.assemble_config())
+
+    def test_write_replaces_file_and_backs_up(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = self._copy_test_file(tmpdir, 'schemes_with_set_scheme.json')
+            text = self._read_test_file('schemes_with_set_scheme.json')
+            config_file = WindowsTerminalConfigFile(path=path)
+            config_file.set_scheme('AlienBlood', profile='cmd')
+            config_file.write()
+            config_file.set_scheme('3024 Day', profile='cmd')
+            config_file.write()
+            self.assertEqual(sorted(os.listdir(tmpdir)),
+                             ['profiles.json', 'wtsm_backups'])
+            self.assertFileEqualString(path, text)
+            store = config_file.backup_store()
+            backups = store.backups()
+            self.assertEqual([backup['id'] for backup in backups], [1, 2])
+            # The original and the current version are the same, stored once
+            self.assertEqual(backups[0]['object'], backups[1]['object'].replace(
+                backups[1]['hash'], backups[0]['hash']))
+            self.assertEqual(len(os.listdir(store.directory)), 3)
+            self.assertEqual(store.read(backups[0]).decode('utf-8'), text)
+
+    def test_patch_keeps_non_ascii_bytes(self):
+        text = '\ufeff' + self._read_test_file('schemes_with_set_scheme.json').replace(
+            '"name": "cmd",', '"name": "Eingabeaufforderung \u00fc \U0001f41a",')
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'profiles.json')
+            with open(path, 'wb') as file:
+                file.write(text.encode('utf-8'))
+            config_file = WindowsTerminalConfigFile(path=path)
+            config_file.set_scheme(
+                'AlienBlood', profile='Eingabeaufforderung \u00fc \U0001f41a')
+            config_file.write()
+            self.assertTrue(config_file._text_patched)
+            with open(path, 'rb') as file:
+                self.assertEqual(file.read(), text.replace(
+                    '"colorScheme": "3024 Day"', '"colorScheme": "AlienBlood"'
+                ).encode('utf-8'))
+
+    def test_patch_keeps_crlf(self):
+        text = self._read_test_file('schemes_without_set_scheme.json')
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'profiles.json')
+            with open(path, 'wb') as file:
+                file.write(text.replace('\n', '\r\n').encode('utf-8'))
+            config_file = WindowsTerminalConfigFile(path=path)
+            config_file.set_scheme('3024 Day', profile='Arch')
+            config_file.set_scheme('Monokai Soda')
+            config_file.write()
+            self.assertTrue(config_file._text_patched)
+            with open(path, 'rb') as file:
+                self.assertEqual(file.read(), text.replace(
+                    '"defaults": {',
+                    '"defaults": {\n            "colorScheme": "Monokai Soda"'
+                ).replace(
+                    '"guid": "{a5a97cb8',
+                    '"colorScheme": "3024 Day",\n                "guid": "{a5a97cb8'
+                ).replace('\n', '\r\n').encode('utf-8'))
+
+    def test_restore_backup(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = self._copy_test_file(tmpdir, 'schemes_with_set_scheme.json')
+            text = self._read_test_file('schemes_with_set_scheme.json')
+            config_file = WindowsTerminalConfigFile(path=path)
+            config_file.set_scheme('AlienBlood', profile='cmd')
+            config_file.write()
+            config_file.restore_backup(1)
+            self.assertFileEqualString(path, text)
+            self.assertEqual(config_file.config.get_current_scheme('cmd'), '3024 Day')
+            self.assertEqual(len(config_file.backup_store().backups()), 2)
+            config_file.remove_backups()
+            self.assertEqual(config_file.backup_store().backups(), [])
+
+    def test_failed_write_keeps_config(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = self._copy_test_file(tmpdir, 'schemes_with_set_scheme.json')
+            config_file = WindowsTerminalConfigFile(path=path)
+            config_file.set_scheme('AlienBlood', profile='cmd')
+            with mock.patch('os.replace', side_effect=OSError('disk full')):
+                with self.assertRaises(OSError):
+                    config_file.write()
+            self.assertFileEqualString(
+                path, self._read_test_file('schemes_with_set_scheme.json'))
+            self.assertFalse(any(name.endswith('.tmp') for name in os.listdir(tmpdir)))
+
+    def test_apply(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = self._copy_test_file(tmpdir, 'schemes_with_set_scheme.json')
+            config_file = WindowsTerminalConfigFile(path=path)
+            self.assertEqual(config_file.apply([
+                {'op': 'set_scheme', 'scheme': 'AlienBlood', 'profile': 'cmd'},
+                {'op': 'set_attribute', 'key': 'fontSize', 'value': 12},
+                {'op': 'add_schemes', 'schemes': [{'name': 'Mine'}]},
+                {'op': 'remove_schemes', 'names': ['3024 Day']},
+                {'op': 'cycle_schemes', 'backwards': True}]), 5)
+            config = WindowsTerminalConfigFile(path=path).config
+            self.assertEqual(config.get_current_scheme('cmd'), 'AlienBlood')
+            self.assertEqual(config.get_defaults()['fontSize'], 12)
+            self.assertEqual(config.schemes()[-1], 'Mine')
+            self.assertFalse(config.has_scheme('3024 Day'))
+            self.assertEqual(config.get_current_scheme(), 'Mine')
+            # One write, so one backup of the original file
+            self.assertEqual(len(config_file.backup_store().backups()), 1)
+
+    def test_apply_rolls_back(self):
+        operations = [
+            {'op': 'set_scheme', 'scheme': 'AlienBlood', 'profile': 'cmd'},
+            {'op': 'remove_schemes', 'names': ['3024 Day']},
+            {'op': 'set_scheme', 'scheme': 'Missing'}]
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = self._copy_test_file(tmpdir, 'schemes_with_set_scheme.json')
+            text = self._read_test_file('schemes_with_set_scheme.json')
+            config_file = WindowsTerminalConfigFile(path=path)
+            for edited_before in (False, True):
+                if edited_before:
+                    # Without the text of the config it is rolled back to a copy
+                    config_file.config.set_attribute_in_defaults('fontSize', 12)
+                assembled_config = config_file.config.assemble_config()
+                with self.assertRaisesRegex(InvalidOperationError, 'Operation 3'):
+                    config_file.apply(operations)
+                self.assertEqual(config_file.config.assemble_config(),
+                                 assembled_config)
+                self.assertTrue(config_file.config.has_scheme('3024 Day'))
+                self.assertFileEqualString(path, text)
+            for operation in ({'op': 'rename'}, {'op': 'set_scheme', 'name': 'x'},
+                              {'op': 'remove_schemes', 'names': '3024 Day'}, 'x'):
+                with self.assertRaises(InvalidOperationError):
+                    config_file.apply([operation])
+            config_file.write()
+            config = WindowsTerminalConfigFile(path=path).config
+            self.assertEqual(config.get_defaults()['fontSize'], 12)
@@ -0,0 +1,93 @@
+import os
+import sys
+import json
+import unittest
+import threading
+import subprocess
+from windows_terminal_scheme_manager import timing
+
+
+class TestTiming(unittest.TestCase):
+
+    def tearDown(self):
+        timing.disable()
+
+    def test_disabled(self):
+        @timing.timed('phase')
+        def phase():
+            return 42
+
+        with timing.span('outer'):
+            self.assertEqual(phase(), 42)
+        self.assertFalse(timing.enabled())
+        self.assertEqual(timing.phases(), [])
+
+    def test_nested_phases(self):
+        @timing.timed('inner')
+        def inner():
+            pass
+
+        timing.enable()
+        with timing.span('outer'):
+            inner()
+            inner()
+        inner()
+        self.assertEqual(
+            [(phase['path'], phase['calls']) for phase in timing.phases()],
+            [(['outer'], 1), (['outer', 'inner'], 2), (['inner'], 1)])
+        outer, nested, _ = timing.phases()
+        self.assertGreaterEqual(outer['seconds'], nested['seconds'])
+
+    def test_threads_nest_their_own_spans(self):
+        timing.enable()
+        entered, done = threading.Event(), threading.Event()
+
+        def other_thread():
+            entered.wait()
+            with timing.span('writer'):
+                pass
+            done.set()
+
+        thread = threading.Thread(target=other_thread)
+        thread.start()
+        with timing.span('outer'):
+            entered.set()
+            done.wait()
+        thread.join()
+        self.assertEqual(sorted(phase['path'] for phase in timing.phases()),
+                         [['outer'], ['writer']])
+
+    def test_span_after_error(self):
+        timing.enable()
+        with self.assertRaises(ValueError):
+            with timing.span('failing'):
+                raise ValueError()
+        with timing.span('next'):
+            pass
+        self.assertEqual([phase['path'] for phase in timing.phases()],
+                         [['failing'], ['next']])
+
+    def test_report(self):
+        timing.enable()
+        with timing.span('outer'):
+            with timing.span('inner'):
+                pass
+        lines = timing.report().split('\n')
+        self.assertEqual([line.split()[0] for line in lines],
+                         ['Phase', 'outer', 'inner', 'total'])
+        self.assertTrue(lines[2].startswith('  inner'))
+        report = json.loads(timing.report(as_json=True))
+        self.assertEqual(len(report['phases']), 2)
+        self.assertGreaterEqual(report['seconds'], report['phases'][0]['seconds'])
+
+    def test_profile_option(self):
+        config_path = os.path.join('.', 'tests', 'windows_terminal_scheme_manager',
+                                   'profile_with_all_schemes.json')
+        result = subprocess.run(
+            [sys.executable, '-m', 'windows_terminal_scheme_manager.scheme_manager',
+             '--profile_json', 'list', '--config_file', config_path],
+            capture_output=True, encoding='utf-8')
+        self.assertEqual(result.returncode, 0, result.stderr)
+        paths = [phase['path'] for phase in json.loads(result.stderr)['phases']]
+        self.assertIn(['import list'], paths)
+        self.assertIn(['config.parse'], paths)
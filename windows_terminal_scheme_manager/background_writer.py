@@ -0,0 +1,80 @@
+import time
+import logging
+import threading
+
+# Writes a config file from a thread, so the TUI does not wait for the disk.
+#
+# Changes are made to the config in memory and reported with changed(). The
+# writer waits until no change came for `delay` seconds (but at most
+# `max_delay` seconds after the first one) and writes the latest state once,
+# so scrolling through many schemes leads to one write and one backup.
+
+
+class BackgroundWriter(object):
+    DELAY_SECONDS = 0.5
+    MAX_DELAY_SECONDS = 3
+
+    def __init__(self, config_file, delay=DELAY_SECONDS, max_delay=MAX_DELAY_SECONDS):
+        self.config_file = config_file
+        self.delay = delay
+        self.max_delay = max_delay
+        # Hold this while changing the config, it is serialized under it
+        self.lock = threading.RLock()
+        # Last error of a write, raised again by close
+        self.error = None
+        self._condition = threading.Condition()
+        self._first_change = None
+        self._last_change = None
+        self._closed = False
+        self._thread = threading.Thread(
+            target=self._run, name='wtsm-writer', daemon=True)
+        self._thread.start()
+
+    def changed(self):
+        with self._condition:
+            now = time.monotonic()
+            if self._first_change is None:
+                self._first_change = now
+            self._last_change = now
+            self._condition.notify()
+
+    def close(self):
+        """Writes pending changes and stops the thread."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join()
+        if self.error is not None:
+            raise self.error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _due(self):
+        return min(self._last_change + self.delay,
+                   self._first_change + self.max_delay)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._first_change is None and not self._closed:
+                    self._condition.wait()
+                if self._first_change is None:
+                    return
+                while not self._closed and time.monotonic() < self._due():
+                    self._condition.wait(self._due() - time.monotonic())
+                self._first_change = self._last_change = None
+            self._write()
+
+    def _write(self):
+        try:
+            with self.lock:
+                data = self.config_file.serialize()
+            self.config_file.write(data)
+            self.error = None
+        except Exception as error:
+            logging.exception("Writing the Terminal config failed")
+            self.error = error
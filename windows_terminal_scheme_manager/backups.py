@@ -0,0 +1,179 @@
+import os
+import json
+import gzip
+import hashlib
+import logging
+from datetime import datetime, timedelta
+
+# Content addressed store for backups of the Terminal config.
+#
+# Every distinct version of the config is saved once, compressed with zstd if
+# the zstandard package is installed and with gzip otherwise, in a file named
+# after its SHA-256. index.json lists the backups in the order they were made,
+# so listing and pruning them does not have to look at the objects.
+
+
+class BackupNotFoundError(LookupError):
+    pass
+
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        return None
+    return zstandard
+
+
+def _replace_file(path, data):
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as file:
+        file.write(data)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp_path, path)
+
+
+class BackupStore(object):
+    DIRECTORY_NAME = 'wtsm_backups'
+    INDEX_FILENAME = 'index.json'
+    INDEX_VERSION = 1
+    DATE_FORMAT = '%Y-%m-%dT%H:%M:%S'
+    # Default retention policy, see prune
+    KEEP_LAST = 20
+    KEEP_HOURLY = 24
+    KEEP_DAILY = 30
+    # A backup is made before every write, hotkeys included, so the levels are
+    # the fast ones rather than the smallest output
+    ZSTD_LEVEL = 3
+    GZIP_LEVEL = 6
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.index_path = os.path.join(directory, self.INDEX_FILENAME)
+        self._backups = None
+
+    def backups(self):
+        """Returns the backups in the index, oldest first. Each backup is a
+        dict with id, time, hash, size and object (the file it is stored in)."""
+        if self._backups is None:
+            try:
+                with open(self.index_path, 'r') as file:
+                    index = json.load(file)
+            except FileNotFoundError:
+                index = {'backups': []}
+            self._backups = index['backups']
+        return self._backups
+
+    def _save_index(self):
+        os.makedirs(self.directory, exist_ok=True)
+        index = {'version': self.INDEX_VERSION, 'backups': self.backups()}
+        _replace_file(self.index_path, json.dumps(index, indent=4).encode('utf-8'))
+
+    def _object_path(self, object_name):
+        return os.path.join(self.directory, object_name)
+
+    def _find_object(self, digest):
+        for extension in ('.json.zst', '.json.gz'):
+            if os.path.exists(self._object_path(digest + extension)):
+                return digest + extension
+        return None
+
+    def _write_object(self, digest, data):
+        zstandard = _zstandard()
+        if zstandard is not None:
+            object_name = digest + '.json.zst'
+            compressed = zstandard.ZstdCompressor(level=self.ZSTD_LEVEL).compress(data)
+        else:
+            object_name = digest + '.json.gz'
+            compressed = gzip.compress(data, compresslevel=self.GZIP_LEVEL, mtime=0)
+        os.makedirs(self.directory, exist_ok=True)
+        _replace_file(self._object_path(object_name), compressed)
+        return object_name
+
+    def add(self, data, time=None):
+        """Adds a backup of data (bytes) made at time (defaults to now) and
+        returns it. Nothing is added if the latest backup has the same content,
+        content that was backed up before is not stored again."""
+        if time is None:
+            time = datetime.now()
+        digest = hashlib.sha256(data).hexdigest()
+        backups = self.backups()
+        if backups and backups[-1]['hash'] == digest:
+            logging.info("Backup {} is up to date".format(backups[-1]['id']))
+            return backups[-1]
+        object_name = self._find_object(digest)
+        if object_name is None:
+            object_name = self._write_object(digest, data)
+        backup = {
+            'id': backups[-1]['id'] + 1 if backups else 1,
+            'time': time.strftime(self.DATE_FORMAT),
+            'hash': digest,
+            'size': len(data),
+            'object': object_name}
+        backups.append(backup)
+        self._save_index()
+        logging.info("Added backup {} ({})".format(backup['id'], object_name))
+        return backup
+
+    def find(self, backup_id):
+        """Returns the backup with the given id or hash (prefix)."""
+        backup_id = str(backup_id)
+        if backup_id.isdigit():
+            matches = [backup for backup in self.backups()
+                       if backup['id'] == int(backup_id)]
+        else:
+            matches = [backup for backup in self.backups()
+                       if backup['hash'].startswith(backup_id.lower())]
+        if len({backup['hash'] for backup in matches}) != 1:
+            raise BackupNotFoundError('No unique backup with id or hash "{}"'.format(
+                backup_id))
+        return matches[-1]
+
+    def read(self, backup):
+        with open(self._object_path(backup['object']), 'rb') as file:
+            compressed = file.read()
+        if backup['object'].endswith('.zst'):
+            zstandard = _zstandard()
+            if zstandard is None:
+                raise BackupNotFoundError(
+                    'Backup {} is compressed with zstd, install zstandard to read '
+                    'it'.format(backup['id']))
+            return zstandard.ZstdDecompressor().decompress(compressed)
+        return gzip.decompress(compressed)
+
+    def prune(self, keep_last=KEEP_LAST, hourly=KEEP_HOURLY, daily=KEEP_DAILY,
+              now=None):
+        """Removes backups, keeping the keep_last newest ones plus the newest
+        backup of each of the last `hourly` hours and `daily` days. Returns the
+        removed backups."""
+        if now is None:
+            now = datetime.now()
+        backups = self.backups()
+        keep = set()
+        if keep_last:
+            keep.update(backup['id'] for backup in backups[-keep_last:])
+        for count, unit, bucket_format in ((hourly, 'hours', '%Y%m%d%H'),
+                                           (daily, 'days', '%Y%m%d')):
+            oldest = now - timedelta(**{unit: count})
+            buckets = set()
+            for backup in reversed(backups):
+                time = datetime.strptime(backup['time'], self.DATE_FORMAT)
+                bucket = time.strftime(bucket_format)
+                if time > oldest and bucket not in buckets:
+                    buckets.add(bucket)
+                    keep.add(backup['id'])
+        removed = [backup for backup in backups if backup['id'] not in keep]
+        if not removed:
+            return removed
+        self._backups = [backup for backup in backups if backup['id'] in keep]
+        self._save_index()
+        used_objects = {backup['object'] for backup in self._backups}
+        for object_name in {backup['object'] for backup in removed} - used_objects:
+            os.remove(self._object_path(object_name))
+        logging.info("Pruned {} backups".format(len(removed)))
+        return removed
+
+    def clear(self):
+        for backup in self.prune(keep_last=0, hourly=0, daily=0):
+            logging.debug("Deleted backup {}".format(backup['id']))
@@ -0,0 +1,70 @@
+import os
+import logging
+import orjson
+from windows_terminal_scheme_manager.terminal_config import cache_dir
+
+# On-disk cache of the schemes WindowsTerminalSchemeDownloader downloaded.
+# The parsed schemes are kept together with the URL they came from, the
+# ETag/Last-Modified headers of the response and the SHA-256 of the archive,
+# so later downloads can be conditional requests and still work offline.
+
+
+class SchemeCatalog(object):
+    FILENAME = 'catalog.json'
+    VERSION = 1
+
+    def __init__(self, path, url=None, etag=None, last_modified=None, sha256=None,
+                 schemes=None):
+        self.path = path
+        self.url = url
+        self.etag = etag
+        self.last_modified = last_modified
+        self.sha256 = sha256
+        self.schemes = schemes
+
+    @classmethod
+    def default_path(cls):
+        return os.path.join(cache_dir(), cls.FILENAME)
+
+    @classmethod
+    def load(cls, path=None):
+        """Returns the catalog at path, or an empty one if there is none."""
+        if path is None:
+            path = cls.default_path()
+        try:
+            with open(path, 'rb') as file:
+                data = orjson.loads(file.read())
+        except FileNotFoundError:
+            return cls(path)
+        except ValueError:
+            logging.warning("Ignoring broken scheme catalog {}".format(path))
+            return cls(path)
+        if data.get('version') != cls.VERSION:
+            logging.info("Ignoring scheme catalog {} with version {}".format(
+                path, data.get('version')))
+            return cls(path)
+        return cls(path, data['url'], data['etag'], data['last_modified'],
+                   data['sha256'], data['schemes'])
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'wb') as file:
+            file.write(orjson.dumps({
+                'version': self.VERSION, 'url': self.url, 'etag': self.etag,
+                'last_modified': self.last_modified, 'sha256': self.sha256,
+                'schemes': self.schemes}))
+        os.replace(temp_path, self.path)
+        logging.info("Saved {} schemes to the catalog {}".format(
+            len(self.schemes), self.path))
+
+    def has_schemes_from(self, url):
+        return self.schemes is not None and self.url == url
+
+    def conditional_headers(self):
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
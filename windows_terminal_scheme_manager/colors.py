@@ -0,0 +1,30 @@
+# Color slots of a Terminal scheme and helpers for single #rrggbb colors.
+# Nothing here needs numpy, scheme_stats computes the same metrics for many
+# schemes at once.
+
+ANSI_SLOTS = (
+    'black', 'red', 'green', 'yellow', 'blue', 'purple', 'cyan', 'white',
+    'brightBlack', 'brightRed', 'brightGreen', 'brightYellow', 'brightBlue',
+    'brightPurple', 'brightCyan', 'brightWhite')
+# Colors every scheme has to have, and the ones it can have
+SCHEME_COLOR_KEYS = ('background', 'foreground') + ANSI_SLOTS
+OPTIONAL_SCHEME_COLOR_KEYS = ('cursorColor', 'selectionBackground')
+# Luminance at which a color has the same contrast to black and to white
+DARK_LUMINANCE = 0.179
+
+
+def hex_to_rgb(color):
+    return tuple(int(color[i:i + 2], 16) for i in (1, 3, 5))
+
+
+def relative_luminance(color):
+    """Relative luminance (WCAG 2) of a #rrggbb color."""
+    linear = [c / 12.92 if c <= 0.03928 else ((c + 0.055) / 1.055) ** 2.4
+              for c in (channel / 255 for channel in hex_to_rgb(color))]
+    return 0.2126 * linear[0] + 0.7152 * linear[1] + 0.0722 * linear[2]
+
+
+def contrast(color, background):
+    lighter, darker = sorted(
+        (relative_luminance(color), relative_luminance(background)), reverse=True)
+    return (lighter + 0.05) / (darker + 0.05)
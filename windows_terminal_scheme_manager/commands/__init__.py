@@ -0,0 +1,2 @@
+# Implementations of the wtsm subcommands. Every module is only imported when
+# one of its commands is called, see LazyGroup in scheme_manager.py
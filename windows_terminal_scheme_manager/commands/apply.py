@@ -0,0 +1,33 @@
+import json
+import click
+from windows_terminal_scheme_manager.terminal_config import (
+    WindowsTerminalConfigFile, InvalidOperationError)
+
+
+@click.command()
+@click.argument('operations', type=click.File('r'), default='-')
+@click.option('--dry_run', is_flag=True,
+              help='only check that all operations work, write nothing')
+@click.option("--config_file", default=None,
+              help='use a different file as Terminal config')
+def apply(operations, dry_run, config_file):
+    """Makes all changes in OPERATIONS (a JSON file, - for stdin) at once, with
+    one write of the config. If one of them fails nothing is changed.
+
+    OPERATIONS is a list of objects like {"op": "set_scheme", "scheme":
+    "Dracula", "profile": "cmd"}. The operations are set_scheme, cycle_schemes
+    (profile, backwards), set_attribute (key, value, profile), add_schemes
+    (schemes) and remove_schemes (names, pattern). Without a profile the
+    defaults of all profiles are changed."""
+    try:
+        operations = json.load(operations)
+    except ValueError as error:
+        raise click.ClickException('Operations are not valid JSON: {}'.format(error))
+    if not isinstance(operations, list):
+        raise click.ClickException('Operations have to be a JSON list')
+    config_file = WindowsTerminalConfigFile(path=config_file)
+    try:
+        count = config_file.apply(operations, write=not dry_run)
+    except InvalidOperationError as error:
+        raise click.ClickException('{}. Nothing was changed'.format(error))
+    click.echo('{} {} operations'.format('Checked' if dry_run else 'Applied', count))
@@ -0,0 +1,58 @@
+import click
+from windows_terminal_scheme_manager.terminal_config import WindowsTerminalConfigFile
+from windows_terminal_scheme_manager.backups import BackupStore, BackupNotFoundError
+
+
+@click.group()
+def backups():
+    """List, restore and prune backups of the Terminal config."""
+
+
+@backups.command(name='list')
+@click.option("--config_file", default=None,
+              help='use a different file as Terminal config')
+@click.option("--backup_dir", default=None,
+              help='directory the backups are in. Defaults to the config directory')
+def list_backups(config_file, backup_dir):
+    config_file = WindowsTerminalConfigFile(path=config_file)
+    current_hash = config_file._file_digest().hex()
+    for backup in config_file.backup_store(backup_dir).backups():
+        click.echo('{:>5}  {}  {:>8}  {}{}'.format(
+            backup['id'], backup['time'].replace('T', ' '), backup['size'],
+            backup['hash'][:12],
+            '  (current)' if backup['hash'] == current_hash else ''))
+
+
+@backups.command()
+@click.argument('backup')
+@click.option("--config_file", default=None,
+              help='use a different file as Terminal config')
+@click.option("--backup_dir", default=None,
+              help='directory the backups are in. Defaults to the config directory')
+def restore(backup, config_file, backup_dir):
+    """Restores BACKUP (id or hash from `wtsm backups list`)."""
+    config_file = WindowsTerminalConfigFile(path=config_file)
+    try:
+        restored = config_file.restore_backup(backup, dest=backup_dir)
+    except BackupNotFoundError as error:
+        raise click.ClickException(str(error))
+    click.echo('Restored backup {} from {}'.format(
+        restored['id'], restored['time'].replace('T', ' ')))
+
+
+@backups.command()
+@click.option('--keep_last', default=BackupStore.KEEP_LAST,
+              help='number of newest backups to keep')
+@click.option('--hourly', default=BackupStore.KEEP_HOURLY,
+              help='keep the newest backup of each of this many hours')
+@click.option('--daily', default=BackupStore.KEEP_DAILY,
+              help='keep the newest backup of each of this many days')
+@click.option("--config_file", default=None,
+              help='use a different file as Terminal config')
+@click.option("--backup_dir", default=None,
+              help='directory the backups are in. Defaults to the config directory')
+def prune(keep_last, hourly, daily, config_file, backup_dir):
+    config_file = WindowsTerminalConfigFile(path=config_file)
+    removed = config_file.backup_store(backup_dir).prune(
+        keep_last=keep_last, hourly=hourly, daily=daily)
+    click.echo('Removed {} backups'.format(len(removed)))
@@ -0,0 +1,32 @@
+import signal
+import socket
+import sys
+import click
+from windows_terminal_scheme_manager.daemon import SchemeDaemon, DaemonError
+
+
+@click.command()
+@click.option("--config_file", default=None,
+              help='use a different file as Terminal config')
+@click.option('--socket', 'socket_path', default=None,
+              help='path of the Unix socket. Defaults to $WTSM_SOCKET or '
+                   'wtsm.sock in $XDG_RUNTIME_DIR')
+def daemon(config_file, socket_path):
+    """Keeps the config in memory and runs next-scheme, previous-scheme, set
+    and list for the other wtsm commands, which makes them a lot faster."""
+    if not hasattr(socket, 'AF_UNIX'):
+        raise click.ClickException('The daemon needs Unix sockets')
+    try:
+        scheme_daemon = SchemeDaemon(config_file, socket_path=socket_path).start()
+    except DaemonError as error:
+        raise click.ClickException(str(error))
+    # Leave through the finally below on kill, so the socket is removed
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    click.echo('Serving {} on {}'.format(
+        scheme_daemon.config_path, scheme_daemon.socket_path))
+    try:
+        scheme_daemon.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        scheme_daemon.close()
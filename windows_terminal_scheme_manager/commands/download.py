@@ -0,0 +1,50 @@
+import click
+from functools import partial
+from windows_terminal_scheme_manager.downloader import WindowsTerminalSchemeDownloader
+from windows_terminal_scheme_manager.commands.filters import (
+    scheme_filter_options, filter_schemes)
+
+
+def show_progress(downloaded, total):
+    if total:
+        message = 'Downloading schemes: {:.1f} of {:.1f} MB'.format(
+            downloaded / 1e6, total / 1e6)
+    else:
+        message = 'Downloading schemes: {:.1f} MB'.format(downloaded / 1e6)
+    click.echo('\r' + message, nl=total is not None and downloaded >= total, err=True)
+
+
+@click.command()
+@click.option("--config_file", default=None,
+              help='use a different file as Terminal config')
+@click.option("--timeout", default=WindowsTerminalSchemeDownloader.TIMEOUT_SECONDS,
+              help='seconds to wait for the server before retrying')
+@click.option("--retries", default=WindowsTerminalSchemeDownloader.RETRIES,
+              help='how often to retry (and resume) a failed download')
+@scheme_filter_options
+def add_all_schemes(config_file, timeout, retries, dark, min_contrast):
+    downloader = WindowsTerminalSchemeDownloader(
+        timeout=timeout, retries=retries, progress=show_progress)
+    downloader.download_and_add_schemes_to_config(
+        config_file=config_file, scheme_filter=partial(
+            filter_schemes, dark=dark, min_contrast=min_contrast))
+
+
+@click.command()
+@click.option("--config_file", default=None,
+              help='use a different file as Terminal config')
+@click.option('--prune', is_flag=True,
+              help='also remove schemes that were removed upstream since the last '
+                   'download (your own schemes and those used by a profile are '
+                   'kept)')
+def sync_schemes(config_file, prune):
+    downloader = WindowsTerminalSchemeDownloader(progress=show_progress)
+    added, updated, removed = downloader.sync_schemes_to_config(
+        prune=prune, config_file=config_file)
+    if not any((added, updated, removed)):
+        click.echo('Schemes are up to date')
+    for names, action in ((added, 'Added'), (updated, 'Updated'),
+                          (removed, 'Removed')):
+        if names:
+            click.echo('{} {} schemes: {}'.format(
+                action, len(names), ', '.join(names)))
@@ -0,0 +1,35 @@
+import click
+
+# Options to select schemes by their colors. Only filtering imports numpy,
+# so commands without filters stay fast.
+
+
+def scheme_filter_options(command):
+    command = click.option(
+        '--min_contrast', type=float, default=None,
+        help='only schemes whose foreground has at least this WCAG contrast '
+             'to the background (4.5 is WCAG AA)')(command)
+    return click.option('--dark/--light', default=None,
+                        help='only dark or only light schemes')(command)
+
+
+def filter_schemes(schemes, dark=None, min_contrast=None):
+    """Returns the scheme dicts that pass the filters."""
+    if dark is None and min_contrast is None:
+        return schemes
+    try:
+        from windows_terminal_scheme_manager.scheme_stats import SchemeMatrix
+    except ImportError:
+        raise click.ClickException('Filtering schemes needs numpy (pip install numpy)')
+    mask = SchemeMatrix(schemes).select(dark, min_contrast)
+    return [scheme for scheme, selected in zip(schemes, mask) if selected]
+
+
+def filtered_scheme_names(schemes, dark=None, min_contrast=None):
+    """Names of the schemes that pass the filters, None without filters."""
+    if dark is None and min_contrast is None:
+        return None
+    names = {scheme['name'] for scheme in filter_schemes(schemes, dark, min_contrast)}
+    if not names:
+        raise click.ClickException('No scheme matches the filters')
+    return names
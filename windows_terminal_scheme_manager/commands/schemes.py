@@ -0,0 +1,122 @@
+import os
+import click
+from windows_terminal_scheme_manager.terminal_config import (
+    WindowsTerminalConfigFile, ProfileNotFoundError)
+from windows_terminal_scheme_manager.commands.filters import (
+    scheme_filter_options, filter_schemes, filtered_scheme_names)
+from windows_terminal_scheme_manager.daemon import forward, DaemonError
+
+
+def forward_to_daemon(command, config_file, **arguments):
+    """Runs command in `wtsm daemon` if one is running for the config and
+    returns its response, otherwise None."""
+    if config_file is None:
+        config_file = WindowsTerminalConfigFile.default_config_path()
+    try:
+        return forward(command, os.path.expandvars(config_file), **arguments)
+    except DaemonError as error:
+        raise click.ClickException(str(error))
+
+
+@click.command(name='list')
+@click.option("--config_file", default=None,
+              help='use a different file as Terminal config')
+@scheme_filter_options
+def list_schemes(config_file, dark, min_contrast):
+    if dark is None and min_contrast is None:
+        response = forward_to_daemon('list', config_file)
+        if response is not None:
+            click.echo('Current Scheme: {}'.format(response['scheme']))
+            click.echo('Available Schemes: {}'.format(', '.join(response['schemes'])))
+            return
+    config_file = WindowsTerminalConfigFile(path=config_file)
+    schemes = [scheme['name'] for scheme in filter_schemes(
+        config_file.config.get('schemes'), dark, min_contrast)]
+    current_scheme = config_file.config.get_current_scheme()
+    click.echo('Current Scheme: {}'.format(current_scheme))
+    click.echo('Available Schemes: {}'.format(', '.join(schemes)))
+
+
+@click.command()
+@click.option("--config_file", default=None,
+              help='use a different file as Terminal config')
+@click.option('--profile', default=None,
+              help='name of profile to change scheme for. Defaults to all profiles')
+@scheme_filter_options
+def next_scheme(profile, config_file, dark, min_contrast):
+    if dark is None and min_contrast is None:
+        response = forward_to_daemon('next', config_file, profile=profile)
+        if response is not None:
+            click.echo('New scheme: {}'.format(response['scheme']))
+            return
+    config_file = WindowsTerminalConfigFile(path=config_file)
+    candidates = filtered_scheme_names(
+        config_file.config.get('schemes'), dark, min_contrast)
+    try:
+        config_file.cycle_schemes(profile, candidates=candidates)
+    except ProfileNotFoundError as error:
+        raise click.ClickException(str(error))
+    config_file.write()
+    current_scheme = config_file.config.get_current_scheme(profile)
+    click.echo('New scheme: {}'.format(current_scheme))
+
+
+@click.command()
+@click.option("--config_file", default=None,
+              help='use a different file as Terminal config')
+@click.option('--profile', default=None,
+              help='name of profile to change scheme for. Defaults to all profiles')
+@scheme_filter_options
+def previous_scheme(profile, config_file, dark, min_contrast):
+    if dark is None and min_contrast is None:
+        response = forward_to_daemon('previous', config_file, profile=profile)
+        if response is not None:
+            click.echo('New scheme: {}'.format(response['scheme']))
+            return
+    config_file = WindowsTerminalConfigFile(path=config_file)
+    candidates = filtered_scheme_names(
+        config_file.config.get('schemes'), dark, min_contrast)
+    try:
+        config_file.cycle_schemes(profile, backwards=True, candidates=candidates)
+    except ProfileNotFoundError as error:
+        raise click.ClickException(str(error))
+    config_file.write()
+    current_scheme = config_file.config.get_current_scheme(profile)
+    click.echo('New scheme: {}'.format(current_scheme))
+
+
+@click.command(name='set')
+@click.option("--config_file", default=None,
+              help='use a different file as Terminal config')
+@click.argument("scheme")
+def set_scheme(scheme, config_file):
+    response = forward_to_daemon('set', config_file, scheme=scheme)
+    if response is not None:
+        click.echo('New scheme: {}'.format(response['scheme']))
+        return
+    config_file = WindowsTerminalConfigFile(path=config_file)
+    config_file.set_scheme(scheme)
+    config_file.write()
+    current_scheme = config_file.config.get_current_scheme()
+    click.echo('New scheme: {}'.format(current_scheme))
+
+
+@click.command()
+@click.argument('names', nargs=-1)
+@click.option('--pattern', default=None,
+              help='remove all schemes with names matching this glob pattern')
+@click.option("--config_file", default=None,
+              help='use a different file as Terminal config')
+def remove_scheme(names, pattern, config_file):
+    if not names and pattern is None:
+        raise click.UsageError('Give the names of the schemes to remove or --pattern')
+    config_file = WindowsTerminalConfigFile(path=config_file)
+    current_scheme = config_file.config.get_current_scheme()
+    removed_names = config_file.config.remove_schemes(names, pattern=pattern)
+    click.echo('Removed schemes: {}'.format(', '.join(removed_names)))
+    if current_scheme in removed_names:
+        config_file.config.cycle_schemes()
+        current_scheme = config_file.config.get_current_scheme()
+        click.echo('Deleted Scheme was active, switched to next scheme: {}'.format(
+            current_scheme))
+    config_file.write()
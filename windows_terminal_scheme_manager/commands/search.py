@@ -0,0 +1,41 @@
+import os
+import json
+import click
+from windows_terminal_scheme_manager.terminal_config import WindowsTerminalConfigFile
+from windows_terminal_scheme_manager.commands.filters import scheme_filter_options
+from windows_terminal_scheme_manager.search_index import (
+    SchemeSearchIndex, HUES, GRAY, SOURCES)
+
+
+@click.command()
+@click.argument('query', default='')
+@scheme_filter_options
+@click.option('--hue', type=click.Choice(sorted({name for _, name in HUES}) + [GRAY]),
+              default=None, help='only schemes with this dominant hue')
+@click.option('--source', type=click.Choice(SOURCES), default=None,
+              help='only schemes that come with Terminal, were downloaded or '
+                   'neither')
+@click.option('--limit', type=int, default=None, help='show at most this many')
+@click.option('--json', 'as_json', is_flag=True, help='print the results as JSON')
+@click.option("--config_file", default=None,
+              help='use a different file as Terminal config')
+def search(query, dark, min_contrast, hue, source, limit, as_json, config_file):
+    """Searches the schemes of the config by (fuzzy) name, best match first."""
+    if config_file is None:
+        config_file = WindowsTerminalConfigFile.default_config_path()
+    config_file = os.path.expandvars(config_file)
+    if not os.path.exists(config_file):
+        raise click.ClickException('Config file not found ({})'.format(config_file))
+    index = SchemeSearchIndex.for_config(config_file)
+    results = index.search(query, dark=dark, min_contrast=min_contrast, hue=hue,
+                           source=source)[:limit]
+    if as_json:
+        click.echo(json.dumps(results, indent=2))
+        return
+    for entry in results:
+        click.echo('{:<32} {:<5} {:<6} {:>5} {}'.format(
+            entry['name'][:32],
+            {True: 'dark', False: 'light', None: '?'}[entry['dark']],
+            entry['hue'],
+            '?' if entry['contrast'] is None else '{:.1f}'.format(entry['contrast']),
+            entry['source']))
@@ -0,0 +1,99 @@
+import warnings
+import click
+from windows_terminal_scheme_manager.terminal_config import WindowsTerminalConfigFile
+from windows_terminal_scheme_manager.commands.filters import scheme_filter_options
+
+try:
+    import numpy as np
+    from windows_terminal_scheme_manager.scheme_stats import SchemeMatrix
+except ImportError:
+    np = None
+
+
+def load_schemes(config_file, catalog):
+    if np is None:
+        raise click.ClickException('This command needs numpy (pip install numpy)')
+    if catalog:
+        from windows_terminal_scheme_manager.catalog import SchemeCatalog
+        schemes = SchemeCatalog.load().schemes
+        if schemes is None:
+            raise click.ClickException('No schemes downloaded yet')
+        return schemes
+    return WindowsTerminalConfigFile(path=config_file).config.get('schemes')
+
+
+@click.command()
+@click.option("--config_file", default=None,
+              help='use a different file as Terminal config')
+@click.option('--catalog', is_flag=True,
+              help='show the downloaded schemes instead of the ones in the config')
+@scheme_filter_options
+def stats(config_file, catalog, dark, min_contrast):
+    matrix = SchemeMatrix(load_schemes(config_file, catalog))
+    selected = matrix.select(dark, min_contrast)
+    is_dark = matrix.is_dark()
+    luminance = matrix.background_luminance()
+    foreground_contrast = matrix.foreground_contrast()
+    with warnings.catch_warnings():
+        # Schemes without valid ANSI colors have no lowest contrast (NaN)
+        warnings.simplefilter('ignore', RuntimeWarning)
+        ansi_contrast = np.nanmin(matrix.ansi_contrast(), axis=1)
+
+    click.echo('{:<32} {:<5} {:>9} {:>11} {:>13}'.format(
+        'Scheme', 'Type', 'Lum. bg', 'Contrast fg', 'Lowest ANSI'))
+    for i in np.flatnonzero(selected):
+        click.echo('{:<32} {:<5} {:>9.3f} {:>11.2f} {:>13.2f}'.format(
+            matrix.names[i][:32], 'dark' if is_dark[i] else 'light', luminance[i],
+            foreground_contrast[i], ansi_contrast[i]))
+    click.echo('{} schemes: {} dark, {} light, {} with foreground contrast of at '
+               'least 4.5'.format(
+                   int(selected.sum()), int((is_dark & selected).sum()),
+                   int((~is_dark & selected).sum()),
+                   int((selected & (foreground_contrast >= 4.5)).sum())))
+
+
+@click.command()
+@click.argument('name')
+@click.option('-k', default=10, help='number of schemes to show')
+@click.option("--config_file", default=None,
+              help='use a different file as Terminal config')
+@click.option('--catalog', is_flag=True,
+              help='search the downloaded schemes instead of the ones in the config')
+def similar(name, k, config_file, catalog):
+    """Shows the schemes that look most like NAME (by CIELAB delta E)."""
+    matrix = SchemeMatrix(load_schemes(config_file, catalog))
+    if name not in matrix.names:
+        raise click.ClickException('No scheme named "{}"'.format(name))
+    indices, distances = matrix.similar(matrix.names.index(name), k)
+    for i, distance in zip(indices, distances):
+        click.echo('{:>6.2f}  {}'.format(distance, matrix.names[i]))
+
+
+@click.command()
+@click.option('--threshold', default=5.0,
+              help='schemes whose colors differ by less than this delta E (on '
+                   'average) are duplicates')
+@click.option('--dry_run', is_flag=True, help='only show the duplicates')
+@click.option("--config_file", default=None,
+              help='use a different file as Terminal config')
+def dedupe(threshold, dry_run, config_file):
+    """Removes schemes that look (almost) the same as another one. The first
+    of them is kept, or the one a profile uses."""
+    if np is None:
+        raise click.ClickException('This command needs numpy (pip install numpy)')
+    config_file = WindowsTerminalConfigFile(path=config_file)
+    matrix = SchemeMatrix(config_file.config.get('schemes'))
+    in_use = config_file.config.schemes_in_use()
+    duplicates = matrix.duplicates(threshold, keep=[
+        i for i, name in enumerate(matrix.names) if name in in_use])
+    for duplicate, original, distance in duplicates:
+        click.echo('{} is like {} (delta E {:.2f})'.format(
+            matrix.names[duplicate], matrix.names[original], distance))
+    if not duplicates:
+        click.echo('No duplicates found')
+    elif not dry_run:
+        # By position, schemes may share a name with the one that is kept
+        removed_names = config_file.config.remove_schemes(
+            positions=[duplicate for duplicate, _, _ in duplicates])
+        config_file.write()
+        click.echo('Removed {} schemes'.format(len(removed_names)))
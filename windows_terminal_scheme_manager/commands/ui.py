@@ -0,0 +1,15 @@
+import click
+from windows_terminal_scheme_manager.screen import SchemeManager
+from windows_terminal_scheme_manager.terminal_config import WindowsTerminalConfigFile
+
+
+@click.command()
+@click.option("--config_file", default=None,
+              help='use a different file as Terminal config')
+def ui(config_file):
+    ui = SchemeManager(WindowsTerminalConfigFile(path=config_file))
+    try:
+        ui.run()
+    except OSError as error:
+        raise click.ClickException(
+            'Could not write the Terminal config: {}'.format(error))
@@ -0,0 +1,294 @@
+import os
+import json
+import logging
+from windows_terminal_scheme_manager.terminal_config import cache_dir
+
+# Resident process for the hot commands.
+#
+# `wtsm daemon` keeps the parsed config in memory and answers next, previous,
+# set and list over a Unix socket, one JSON object per line each way. The CLI
+# forwards these commands to it when its socket exists, so a hotkey costs a
+# round trip and the write instead of an interpreter start and a parse.
+#
+# The config is reloaded when it changes on disk. A FileWatcher reloads it
+# right away (inotify, or polling where inotify is missing), and every request
+# compares size and mtime first, because inotify misses changes made through
+# some file systems (like Windows programs changing files under /mnt in WSL).
+
+SOCKET_ENV_VARIABLE = 'WTSM_SOCKET'
+SOCKET_FILENAME = 'wtsm.sock'
+COMMANDS = ('next', 'previous', 'set', 'list')
+CLIENT_TIMEOUT_SECONDS = 10
+
+
+class DaemonError(Exception):
+    pass
+
+
+def default_socket_path():
+    path = os.environ.get(SOCKET_ENV_VARIABLE)
+    if path:
+        return path
+    return os.path.join(os.environ.get('XDG_RUNTIME_DIR') or cache_dir(),
+                        SOCKET_FILENAME)
+
+
+def _read_message(connection):
+    data = b''
+    while not data.endswith(b'\n'):
+        chunk = connection.recv(65536)
+        if not chunk:
+            break
+        data += chunk
+    return json.loads(data.decode('utf-8'))
+
+
+def forward(command, config_path, **arguments):
+    """Runs command in the daemon and returns its response, or None if no
+    daemon is running for the config at config_path. Raises DaemonError if
+    the daemon failed to run the command."""
+    path = default_socket_path()
+    if not os.path.exists(path):
+        return None
+    import socket
+    request = dict(arguments, command=command,
+                   config_file=os.path.realpath(config_path))
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.settimeout(CLIENT_TIMEOUT_SECONDS)
+        try:
+            connection.connect(path)
+        except OSError as error:
+            logging.info("No daemon at {} ({})".format(path, error))
+            return None
+        # Once the request is sent the daemon may have run it, so from here on
+        # errors are not a reason to run the command again without it
+        try:
+            connection.sendall(json.dumps(request).encode('utf-8') + b'\n')
+            response = _read_message(connection)
+        except (OSError, ValueError) as error:
+            raise DaemonError('No answer from the wtsm daemon: {}'.format(error))
+    if response.get('other_config'):
+        logging.info("The daemon serves {}, not {}".format(
+            response['other_config'], request['config_file']))
+        return None
+    if 'error' in response:
+        raise DaemonError(response['error'])
+    logging.info("Command {} ran in the daemon".format(command))
+    return response
+
+
+class FileWatcher(object):
+    """Calls callback (from a thread) whenever the file at path may have
+    changed. The directory is watched, as the file is usually replaced rather
+    than written to."""
+    POLL_SECONDS = 1
+    # inotify_event is int wd, uint32 mask, cookie and len, then the name
+    EVENT_HEADER_SIZE = 16
+    # IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    INOTIFY_MASK = 0x008 | 0x080 | 0x100 | 0x200
+
+    def __init__(self, path, callback, poll_seconds=POLL_SECONDS, use_inotify=True):
+        import threading
+        self.path = path
+        self.callback = callback
+        self.poll_seconds = poll_seconds
+        self._stopped = threading.Event()
+        self._inotify_fd = self._start_inotify() if use_inotify else None
+        self._stop_pipe = os.pipe() if self._inotify_fd is not None else None
+        self._thread = threading.Thread(
+            target=self._watch if self._inotify_fd is not None else self._poll,
+            name='wtsm-watcher', daemon=True)
+
+    @property
+    def uses_inotify(self):
+        return self._inotify_fd is not None
+
+    def _start_inotify(self):
+        import ctypes
+        import ctypes.util
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+            inotify_fd = libc.inotify_init1(os.O_CLOEXEC)
+        except (OSError, AttributeError) as error:
+            logging.info("No inotify ({}), polling instead".format(error))
+            return None
+        if inotify_fd < 0:
+            return None
+        directory = os.path.dirname(os.path.abspath(self.path)).encode()
+        if libc.inotify_add_watch(inotify_fd, directory, self.INOTIFY_MASK) < 0:
+            logging.info("Can not watch {} with inotify, polling instead".format(
+                directory))
+            os.close(inotify_fd)
+            return None
+        return inotify_fd
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        if self._stop_pipe is not None:
+            os.write(self._stop_pipe[1], b'x')
+        self._thread.join()
+        if self._inotify_fd is not None:
+            for fd in (self._inotify_fd, *self._stop_pipe):
+                os.close(fd)
+
+    def _watch(self):
+        import select
+        import struct
+        filename = os.path.basename(self.path).encode()
+        while not self._stopped.is_set():
+            readable, _, _ = select.select(
+                [self._inotify_fd, self._stop_pipe[0]], [], [])
+            if self._inotify_fd not in readable:
+                continue
+            data = os.read(self._inotify_fd, 65536)
+            changed = False
+            offset = 0
+            while offset < len(data):
+                _, _, _, length = struct.unpack_from('iIII', data, offset)
+                start = offset + self.EVENT_HEADER_SIZE
+                changed |= data[start:start + length].rstrip(b'\0') == filename
+                offset = start + length
+            if changed:
+                self.callback()
+
+    def _poll(self):
+        while not self._stopped.wait(self.poll_seconds):
+            self.callback()
+
+
+class SchemeDaemon(object):
+    """Serves the commands for one config on the socket at socket_path."""
+
+    def __init__(self, config_path, socket_path=None, poll_seconds=None):
+        import threading
+        from windows_terminal_scheme_manager.terminal_config import (
+            WindowsTerminalConfigFile)
+        self.config_file = WindowsTerminalConfigFile(path=config_path)
+        self.config_path = os.path.realpath(self.config_file.path)
+        self.socket_path = socket_path or default_socket_path()
+        self.poll_seconds = poll_seconds or FileWatcher.POLL_SECONDS
+        # Held while the config is reloaded or a command runs
+        self.lock = threading.Lock()
+        # SHA-256 of the file the config in memory matches, None if the file
+        # could not be read
+        self._digest = self.config_file._file_digest()
+        self._load_error = None
+        self._server = None
+        self._watcher = None
+
+    def reload_if_changed(self):
+        with self.lock:
+            try:
+                digest = self.config_file._file_digest()
+                if digest is None:
+                    raise FileNotFoundError('{} does not exist'.format(
+                        self.config_file.path))
+            except OSError as error:
+                self._digest, self._load_error = None, error
+                return
+            if digest == self._digest:
+                return
+            logging.info("Config changed on disk, reloading it")
+            try:
+                self.config_file.reload()
+            except (OSError, ValueError) as error:
+                logging.warning("Could not reload the config: {}".format(error))
+                self._digest, self._load_error = None, error
+                return
+            self._digest, self._load_error = digest, None
+
+    def handle(self, request):
+        """Runs a request (dict) and returns the response (dict)."""
+        from windows_terminal_scheme_manager.terminal_config import (
+            ProfileNotFoundError)
+        if request.get('config_file') != self.config_path:
+            return {'other_config': self.config_path}
+        command = request.get('command')
+        if command not in COMMANDS:
+            return {'error': 'Unknown command {}'.format(command)}
+        self.reload_if_changed()
+        with self.lock:
+            if self._load_error is not None:
+                return {'error': 'Could not read the config: {}'.format(
+                    self._load_error)}
+            try:
+                return self._run(command, request.get('profile'),
+                                 request.get('scheme'))
+            except ProfileNotFoundError as error:
+                return {'error': str(error)}
+            except Exception as error:
+                logging.exception("Command {} failed".format(command))
+                # The config in memory may be half changed now
+                self._digest = None
+                return {'error': '{} failed: {}'.format(command, error)}
+
+    def _run(self, command, profile, scheme):
+        config_file = self.config_file
+        if command == 'list':
+            return {'scheme': config_file.config.get_current_scheme(),
+                    'schemes': config_file.config.schemes()}
+        if command == 'set':
+            config_file.set_scheme(scheme, profile)
+        else:
+            config_file.cycle_schemes(profile, backwards=command == 'previous')
+        config_file.write()
+        self._digest = config_file._file_digest()
+        return {'scheme': config_file.config.get_current_scheme(profile)}
+
+    def start(self):
+        """Binds the socket and starts watching the config. Raises DaemonError
+        if another daemon is using the socket."""
+        import socket
+        import socketserver
+        daemon = self
+
+        class RequestHandler(socketserver.StreamRequestHandler):
+            def handle(self):
+                try:
+                    request = json.loads(self.rfile.readline().decode('utf-8'))
+                    response = daemon.handle(request)
+                except ValueError as error:
+                    response = {'error': 'Invalid request: {}'.format(error)}
+                self.wfile.write(json.dumps(response).encode('utf-8') + b'\n')
+
+        if os.path.exists(self.socket_path):
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+                try:
+                    connection.connect(self.socket_path)
+                except OSError:
+                    logging.info("Removing stale socket {}".format(self.socket_path))
+                    os.remove(self.socket_path)
+                else:
+                    raise DaemonError('A wtsm daemon is already running at {}'.format(
+                        self.socket_path))
+        os.makedirs(os.path.dirname(self.socket_path) or '.', exist_ok=True)
+        old_umask = os.umask(0o177)
+        try:
+            self._server = socketserver.UnixStreamServer(
+                self.socket_path, RequestHandler)
+        finally:
+            os.umask(old_umask)
+        self._watcher = FileWatcher(self.config_path, self.reload_if_changed,
+                                    poll_seconds=self.poll_seconds).start()
+        logging.info("Serving {} on {} ({})".format(
+            self.config_path, self.socket_path,
+            'inotify' if self._watcher.uses_inotify else 'polling'))
+        return self
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def shutdown(self):
+        """Stops serve_forever (call from another thread) and cleans up."""
+        self._server.shutdown()
+        self.close()
+
+    def close(self):
+        self._watcher.stop()
+        self._server.server_close()
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
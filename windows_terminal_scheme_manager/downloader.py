@@ -1,91 +1,367 @@
+import re
+import time
 import logging
+import http.client
 import shutil
 import tempfile
+import urllib.error
 import urllib.request
-import json
+import hashlib
 import os
 import zipfile
+import orjson
 from windows_terminal_scheme_manager.terminal_config import WindowsTerminalConfigFile
+from windows_terminal_scheme_manager.catalog import SchemeCatalog
+from windows_terminal_scheme_manager.colors import (
+    SCHEME_COLOR_KEYS, OPTIONAL_SCHEME_COLOR_KEYS)
+from windows_terminal_scheme_manager import timing
+
+HEX_COLOR_REGEX = re.compile(r'#[0-9a-fA-F]{6}')
+
+
+class InvalidSchemeError(ValueError):
+    pass
+
+
+def validate_scheme(scheme):
+    """Returns scheme if it has a name and all colors in #rrggbb format,
+    raises InvalidSchemeError otherwise."""
+    if not isinstance(scheme, dict) or not isinstance(scheme.get('name'), str)\
+            or not scheme['name']:
+        raise InvalidSchemeError('Scheme has no name')
+    missing = [key for key in SCHEME_COLOR_KEYS if key not in scheme]
+    if missing:
+        raise InvalidSchemeError('Scheme "{}" has no {}'.format(
+            scheme['name'], ', '.join(missing)))
+    invalid = [
+        key for key in SCHEME_COLOR_KEYS + OPTIONAL_SCHEME_COLOR_KEYS
+        if key in scheme and not (isinstance(scheme[key], str) and
+                                  HEX_COLOR_REGEX.fullmatch(scheme[key]))]
+    if invalid:
+        raise InvalidSchemeError('Scheme "{}" has invalid colors for {}'.format(
+            scheme['name'], ', '.join(invalid)))
+    return scheme
+
+
+def load_valid_schemes(load, sources):
+    """Returns the valid schemes of load(source) for all sources, invalid ones
+    are logged and skipped."""
+    schemes = []
+    for source in sources:
+        try:
+            schemes.append(validate_scheme(load(source)))
+        except ValueError as error:
+            logging.warning("Skipping scheme {}: {}".format(source, error))
+    return schemes
+
+
+def _load_members(members):
+    # Runs in the worker processes of WindowsTerminalSchemeDownloader.read_schemes,
+    # members are (name, data) pairs read from the archive
+    remaining = iter(members)
+    return load_valid_schemes(lambda name: orjson.loads(next(remaining)[1]),
+                              [name for name, _ in members])
+
+
+def _chunks(sources, count):
+    chunk_size = max(1, -(-len(sources) // count))
+    return [sources[i:i + chunk_size] for i in range(0, len(sources), chunk_size)]
+
+
+class _PartialDownload(object):
+    """The part of an archive downloaded so far, in a spooled buffer."""
+
+    def __init__(self, max_memory_size):
+        self.archive = tempfile.SpooledTemporaryFile(max_size=max_memory_size)
+        self.digest = hashlib.sha256()
+        self.downloaded = 0
+        # Headers of the response that started the download
+        self.headers = None
+
+    def request_headers(self, headers):
+        if not self.downloaded:
+            return dict(headers or {})
+        # The conditional headers are only for the first response
+        request_headers = {'Range': 'bytes={}-'.format(self.downloaded)}
+        validator = self.headers.get('ETag') or self.headers.get('Last-Modified')
+        if validator:
+            request_headers['If-Range'] = validator
+        return request_headers
+
+    def read(self, response, chunk_size, progress=None):
+        if self.downloaded and response.status != 206:
+            logging.info("Server did not resume, downloading again")
+            self.archive.seek(0)
+            self.archive.truncate()
+            self.digest = hashlib.sha256()
+            self.downloaded = 0
+        if not self.downloaded:
+            self.headers = response.headers
+        total = self._total_size(response)
+        while chunk := response.read(chunk_size):
+            self.digest.update(chunk)
+            self.archive.write(chunk)
+            self.downloaded += len(chunk)
+            if progress is not None:
+                progress(self.downloaded, total)
+        if total is not None and self.downloaded < total:
+            raise ConnectionError('Connection closed after {} of {} bytes'.format(
+                self.downloaded, total))
+
+    def _total_size(self, response):
+        content_range = response.headers.get('Content-Range')
+        if response.status == 206 and content_range:
+            match = re.fullmatch(r'bytes \d+-\d+/(\d+)', content_range.strip())
+            return int(match.group(1)) if match else None
+        length = response.headers.get('Content-Length')
+        return self.downloaded + int(length) if length else None
 
 
 class WindowsTerminalSchemeDownloader(object):
     DEFAULT_SCHEMES_URL =\
        'https://github.com/mbadolato/iTerm2-Color-Schemes/archive/master.zip'
+    ZIP_SCHEME_PATH = 'iTerm2-Color-Schemes-master/windowsterminal/'
+    # Archives up to this size are kept in memory while downloading, bigger
+    # ones are written to a temporary file
+    MAX_MEMORY_ARCHIVE_SIZE = 16 * 1024 * 1024
+    CHUNK_SIZE = 64 * 1024
+    TIMEOUT_SECONDS = 30
+    # Attempts after the first one, the download continues where it stopped
+    RETRIES = 3
+    # Wait before the first retry, doubled for every further one
+    RETRY_BACKOFF_SECONDS = 0.5
+    # Scheme files are read in a thread pool if there are at least this many
+    PARALLEL_LOAD_THRESHOLD = 512
+    LOADER_THREADS = 8
+    # Archives with at least this many schemes are decoded in worker
+    # processes, below that starting the processes takes longer
+    PROCESS_POOL_THRESHOLD = 5000
+    LOADER_PROCESSES = min(8, os.cpu_count() or 1)
+    # Scheme files sent to a worker process at once, at most two batches per
+    # process are on their way, so memory does not grow with the archive
+    MEMBERS_PER_TASK = 256
 
-    def __init__(self, url=DEFAULT_SCHEMES_URL):
+    def __init__(self, url=DEFAULT_SCHEMES_URL, catalog_path=None,
+                 timeout=TIMEOUT_SECONDS, retries=RETRIES, progress=None):
         self.url = url
+        self.catalog_path = catalog_path
+        self.timeout = timeout
+        self.retries = retries
+        self.retry_backoff = self.RETRY_BACKOFF_SECONDS
+        # Called as progress(downloaded_bytes, total_bytes or None)
+        self.progress = progress
 
-    def download_repo(self):
+    def download_archive(self):
+        """Downloads the repo archive into a spooled buffer (in memory unless
+        it is very big) and returns it."""
+        return self._download()[0]
+
+    @timing.timed('download')
+    def _download(self, headers=None):
+        """Returns (archive, SHA-256 of the archive, response headers).
+
+        If the connection breaks, the download is retried with backoff and
+        continues with a Range request where it stopped, as long as the server
+        supports that and the archive did not change in between."""
         logging.info("Downloading schemes from {}".format(self.url))
-        with urllib.request.urlopen(self.url) as response:
-            with tempfile.NamedTemporaryFile(delete=False) as tmp_file:
-                shutil.copyfileobj(response, tmp_file)
+        download = _PartialDownload(self.MAX_MEMORY_ARCHIVE_SIZE)
+        attempt = 0
+        while True:
+            request = urllib.request.Request(
+                self.url, headers=download.request_headers(headers))
+            try:
+                with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                    download.read(response, self.CHUNK_SIZE, self.progress)
+                break
+            except (OSError, http.client.HTTPException) as error:
+                if not self._should_retry(error, attempt):
+                    download.archive.close()
+                    if isinstance(error, http.client.HTTPException):
+                        raise ConnectionError(str(error)) from error
+                    raise
+                wait = self.retry_backoff * 2 ** attempt
+                attempt += 1
+                logging.warning("Download failed ({}), retry {} of {} in {}s".format(
+                    error, attempt, self.retries, wait))
+                time.sleep(wait)
+            except BaseException:
+                download.archive.close()
+                raise
+        download.archive.seek(0)
         logging.info("Successfully Downloaded Schemes")
-        return tmp_file
-
-    def unpack_schemes(self, repo_zip,
-                       zip_scheme_path='iTerm2-Color-Schemes-master/windowsterminal/'):
-        tmpdir = tempfile.mkdtemp()
-        logging.info("Unpacking Schemes to temporary directory '{}'".format(tmpdir))
-        z = zipfile.ZipFile(repo_zip.name, 'r')
-        p = zipfile.Path(z, at=zip_scheme_path)
-        scheme_filenames = [x.name for x in (p.iterdir())]
-        for name in scheme_filenames:
-            logging.debug("Extracting {}".format(name))
-            z.extract(zip_scheme_path + name, path=tmpdir)
-        logging.info("Unpacking Schemes completed")
-        return tmpdir, scheme_filenames
+        return download.archive, download.digest.hexdigest(), download.headers
+
+    def _should_retry(self, error, attempt):
+        if attempt >= self.retries:
+            return False
+        if isinstance(error, urllib.error.HTTPError):
+            # Not Modified, Not Found etc. will not change by asking again
+            return error.code >= 500 or error.code == 429
+        return True
+
+    def fetch_schemes(self, keep_archive=False):
+        """Returns the schemes at url. The catalog of the last download is used
+        if the server says they did not change or can not be reached."""
+        with timing.span('catalog.load'):
+            catalog = SchemeCatalog.load(self.catalog_path)
+        cached = catalog.has_schemes_from(self.url)
+        try:
+            archive, sha256, response_headers = self._download(
+                catalog.conditional_headers() if cached else None)
+        except OSError as error:
+            # urllib raises HTTPError for 304 Not Modified as well
+            if not cached:
+                raise
+            if isinstance(error, urllib.error.HTTPError) and error.code == 304:
+                logging.info("Schemes not modified, using the catalog")
+                return catalog.schemes
+            logging.warning("Could not download schemes ({}), using the catalog "
+                            "from {}".format(error, catalog.path))
+            return catalog.schemes
+        with archive:
+            if keep_archive:
+                with tempfile.NamedTemporaryFile(
+                        suffix='.zip', delete=False) as archive_file:
+                    shutil.copyfileobj(archive, archive_file)
+                archive.seek(0)
+                logging.info('Run with this to skip re-downloading next time:\
+                     --repo_path {}'.format(archive_file.name))
+            if cached and sha256 == catalog.sha256:
+                logging.info("Downloaded the same archive again, using the catalog")
+                schemes = catalog.schemes
+            else:
+                schemes = self.read_schemes(archive)
+        catalog.url = self.url
+        catalog.etag = response_headers.get('ETag')
+        catalog.last_modified = response_headers.get('Last-Modified')
+        catalog.sha256 = sha256
+        catalog.schemes = schemes
+        with timing.span('catalog.save'):
+            catalog.save()
+        return schemes
+
+    @timing.timed('download.read_archive')
+    def read_schemes(self, archive, zip_scheme_path=ZIP_SCHEME_PATH, processes=None):
+        """Parses the schemes in zip_scheme_path of archive (path or file
+        object) straight from the zip, without extracting them. Big archives
+        are split between processes, the order of the schemes is the order
+        in the archive either way."""
+        logging.info("Loading all schemes from the archive")
+        with zipfile.ZipFile(archive, 'r') as z:
+            members = [
+                info for info in z.infolist()
+                if info.filename.startswith(zip_scheme_path) and
+                info.filename.endswith('.json') and
+                '/' not in info.filename[len(zip_scheme_path):]]
+            if processes is None:
+                processes = self.LOADER_PROCESSES
+                if len(members) < self.PROCESS_POOL_THRESHOLD:
+                    processes = 1
+            if processes <= 1:
+                scheme_array = load_valid_schemes(
+                    lambda name: orjson.loads(z.read(name)),
+                    [info.filename for info in members])
+            else:
+                scheme_array = self._read_in_processes(z, members, processes)
+        logging.info("Loaded all new schemes")
+        return scheme_array
+
+    def _read_in_processes(self, z, members, processes):
+        """Decodes the members of z in worker processes. The workers get the
+        bytes of their members only, not the whole archive, and only a few
+        batches are read ahead of them."""
+        from collections import deque
+        from concurrent.futures import ProcessPoolExecutor
+        scheme_array = []
+        pending = deque()
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            for start in range(0, len(members), self.MEMBERS_PER_TASK):
+                if len(pending) >= 2 * processes:
+                    scheme_array.extend(pending.popleft().result())
+                pending.append(pool.submit(_load_members, [
+                    (info.filename, z.read(info))
+                    for info in members[start:start + self.MEMBERS_PER_TASK]]))
+            while pending:
+                scheme_array.extend(pending.popleft().result())
+        return scheme_array
+
+    @timing.timed('download.load_schemes')
+    def load_schemes(self, load, sources, workers=None):
+        """Returns the valid schemes of load(source) for all sources, in the
+        order of sources. Big batches are loaded in a thread pool."""
+        if workers is None:
+            workers = self.LOADER_THREADS
+            if len(sources) < self.PARALLEL_LOAD_THRESHOLD:
+                workers = 1
+        if workers <= 1:
+            return load_valid_schemes(load, sources)
+        from concurrent.futures import ThreadPoolExecutor
+        # A few chunks per thread, one future per scheme costs more than
+        # loading it
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return [scheme for schemes in pool.map(
+                lambda chunk: load_valid_schemes(load, chunk),
+                _chunks(sources, workers * 4))
+                for scheme in schemes]
 
     def scheme_filenames(self, repo_path):
         logging.info("Trying to get scheme filenames from '{}'".format(repo_path))
         return list(os.walk(repo_path))[2][2]
 
     def get_scheme_from_file(self, filename):
-        with open(filename, 'r') as file:
-            scheme = json.load(file)
+        with open(filename, 'rb') as file:
+            scheme = orjson.loads(file.read())
             logging.debug("Loaded scheme '{}'".format(filename))
         return scheme
 
-    def get_all_schemes(self, path, schemes):
-        scheme_array = []
+    def get_all_schemes(self, path, schemes, workers=None):
         logging.info("Loading all schemes from json files")
-        for scheme_path in schemes:
-            scheme_array.append(
-                self.get_scheme_from_file(os.path.join(path, scheme_path))
-            )
+        scheme_array = self.load_schemes(
+            lambda scheme_path: self.get_scheme_from_file(
+                os.path.join(path, scheme_path)),
+            schemes, workers)
         logging.info("Loaded all new schemes")
         return scheme_array
 
     def download_and_add_schemes_to_config(self, repo_path=None, keep_repo=False,
-                                           config_file=None):
-        # optional parameter is only there to test stuff without downloading
-        # the zip every time...
+                                           config_file=None, scheme_filter=None):
+        # repo_path is only there to test stuff without downloading the zip
+        # every time, it can be the archive or a directory it was extracted to
         if not repo_path:
-            repo_zip = self.download_repo()
-            schemes_path, schemes = self.unpack_schemes(repo_zip)
-            logging.info('Run with this to skip re-downloading next time:\
-                 --repo_path {}'.format(schemes_path))
-            schemes_path = os.path.join(
-                schemes_path, 'iTerm2-Color-Schemes-master', 'windowsterminal')
+            new_schemes = self.fetch_schemes(keep_archive=keep_repo)
+        elif zipfile.is_zipfile(repo_path):
+            new_schemes = self.read_schemes(repo_path)
         else:
             schemes = self.scheme_filenames(repo_path)
             schemes_path = os.path.join(
                 repo_path, 'iTerm2-Color-Schemes-master', 'windowsterminal')
+            logging.debug("Repo Path: {}".format(schemes_path))
+            new_schemes = self.get_all_schemes(schemes_path, schemes)
+        if scheme_filter is not None:
+            new_schemes = scheme_filter(new_schemes)
 
-        logging.debug("Repo Path: {}".format(schemes_path))
-        new_schemes = self.get_all_schemes(schemes_path, schemes)
         config_file = WindowsTerminalConfigFile(path=config_file)
-        config = config_file.config
-        old_scheme_names = config_file.config.schemes()
-        for new_scheme in new_schemes:
-            if new_scheme['name'] in old_scheme_names:
-                logging.debug('Not adding scheme {} (already in config)'
-                              .format(new_scheme['name']))
-                continue
-            config.add_scheme(new_scheme, reuse_copy=True)
+        config_file.config.add_schemes(new_schemes)
         config_file.write()
-        if not keep_repo:
-            logging.info("Removing temporary repo directory")
-            shutil.rmtree(schemes_path)
-        else:
-            logging.info("Keeping temporary repo directory")
+
+    def sync_schemes_to_config(self, prune=False, config_file=None):
+        """Brings the schemes of the config up to date with the catalog (see
+        WindowsTerminalConfig.sync_schemes). With prune, schemes that were in
+        the last download but are gone upstream are removed. Returns (added,
+        updated, removed) names, the config is only written if one of them is
+        not empty."""
+        previous_names = ()
+        if prune:
+            catalog = SchemeCatalog.load(self.catalog_path)
+            if catalog.has_schemes_from(self.url):
+                previous_names = [scheme['name'] for scheme in catalog.schemes]
+            else:
+                logging.info("No earlier download of {}, nothing to prune".format(
+                    self.url))
+        new_schemes = self.fetch_schemes()
+        config_file = WindowsTerminalConfigFile(path=config_file)
+        changes = config_file.config.sync_schemes(
+            new_schemes, previous_names=previous_names)
+        if any(changes):
+            config_file.write()
+        return changes
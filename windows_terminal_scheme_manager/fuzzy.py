@@ -0,0 +1,69 @@
+import re
+
+# Fuzzy matching of scheme names for the filter box of the TUI.
+#
+# A query matches a name if its characters appear in the name in that order,
+# ignoring case. The lowercase names are made once, and as typing mostly adds
+# to the end of the query, the names matching the previous query are the only
+# ones searched for the next one. Matches are ranked by the shortest part of
+# the name that has the characters of the query, not just the first one.
+
+
+def _tightest_span(query, name, start):
+    """(start, end) of the shortest part of name that has the characters of
+    query in order, looking from start (where the first match begins) on."""
+    best = None
+    while True:
+        end = start
+        for char in query:
+            end = name.find(char, end)
+            if end == -1:
+                return best
+            end += 1
+        # The latest start for this end gives the shortest part ending there
+        start = end
+        for char in reversed(query):
+            start = name.rfind(char, 0, start)
+        if best is None or end - start < best[1] - best[0]:
+            best = (start, end)
+        start += 1
+
+
+class FuzzyIndex(object):
+    def __init__(self, names):
+        self.names = list(names)
+        self._lower_names = [name.lower() for name in self.names]
+        self._last_query = ''
+        self._last_matches = list(range(len(self.names)))
+
+    def __len__(self):
+        return len(self.names)
+
+    def search(self, query):
+        """Returns the indices of the names matching query, best first: names
+        with fewer characters between the matched ones, then the ones where the
+        match starts earlier, then shorter names."""
+        query = query.lower()
+        if query.startswith(self._last_query):
+            candidates = self._last_matches
+        else:
+            candidates = range(len(self.names))
+        if not query:
+            matches = list(candidates)
+            self._last_query, self._last_matches = query, matches
+            return matches
+        pattern = re.compile('.*?'.join(map(re.escape, query)))
+        lower_names = self._lower_names
+        ranked = []
+        for i in candidates:
+            match = pattern.search(lower_names[i])
+            if match is not None:
+                start, end = _tightest_span(query, lower_names[i], match.start())
+                ranked.append((end - start, start, len(lower_names[i]), i))
+        self._last_query = query
+        self._last_matches = [i for _, _, _, i in ranked]
+        ranked.sort()
+        return [i for _, _, _, i in ranked]
+
+    def search_names(self, query):
+        return [self.names[i] for i in self.search(query)]
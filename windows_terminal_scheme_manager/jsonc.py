@@ -0,0 +1,401 @@
+import io
+import json
+import re
+from json.encoder import encode_basestring_ascii
+
+# Parser for the JSON with comments that Windows Terminal uses for its config.
+#
+# The file is scanned once. Besides the parsed config it returns the comments
+# and blank lines ("trivia") of the file, keyed by the line number they get in
+# the layout written by WindowsTerminalConfig.assemble_config:
+#   * comments: lines that only contain comments or whitespace, and comments
+#     in front of the JSON on a line, which get a line of their own
+#   * trailing_comments: comments after JSON on the same line, appended to the
+#     JSON line they are on (unless that line is already ended by a // or a
+#     multi line comment, then they get a line of their own after it)
+# A byte order mark at the start is not part of the comments, the config keeps
+# it separately.
+# Trailing commas in objects and arrays are accepted.
+#
+# Optionally the positions of values in the text are recorded ("spans"), so
+# single values can be changed in the text without writing the whole config.
+#
+# dump/dumps write a config back in that layout in one pass, with the comments
+# put back where they were: the output of json.dumps(indent=4), but with
+# empty containers behind a key split over 2 lines like Windows Terminal does.
+
+TOKEN_REGEX = re.compile(r'''
+    (?P<newline>\n)
+  | (?P<whitespace>[ \t\r\ufeff]+)
+  | (?P<line_comment>//[^\n]*)
+  | (?P<block_comment>/\*.*?\*/)
+  | (?P<string>"(?:[^"\\\n]|\\.)*")
+  | (?P<number>-?(?:0|[1-9][0-9]*)(?:\.[0-9]+)?(?:[eE][-+]?[0-9]+)?)
+  | (?P<literal>true|false|null)
+  | (?P<punctuation>[{}\[\]:,])
+  | (?P<error>.)
+''', re.VERBOSE | re.DOTALL)
+
+LITERALS = {'true': True, 'false': False, 'null': None}
+BOM = '\ufeff'
+
+
+def is_split_when_empty(key, value):
+    """Empty containers behind a (simple) key are written as 2 lines, like
+    Windows Terminal does. Keys with a quote, a newline or the bracket in them
+    are not split, as the regexes older versions of wtsm ran on the output of
+    json.dumps did not match them (see test_jsonc)."""
+    if not isinstance(key, str) or not key:
+        return False
+    forbidden = '[\n"' if isinstance(value, list) else '{\n"'
+    return not any(char in forbidden for char in json.dumps(key)[1:-1])
+
+
+def parse(text, spans=None, track=None):
+    """Returns (config, comments, trailing_comments) for a JSONC string.
+
+    If spans is a dict, it gets (member_start, value_start, value_end) for the
+    value at every path (tuple of keys and indices) that track(path) returns
+    True for. Children are only tracked if their parent is. A path that occurs
+    more than once (duplicate keys) is set to None.
+    """
+    return _JsoncParser(text, spans, track).parse()
+
+
+def dump(value, file, comments=None, trailing_comments=None, bom=False):
+    """Writes value to the text file object file in the layout of the
+    Terminal config, with comments and trailing_comments (as returned by
+    parse) put back in, after a byte order mark if bom is set."""
+    if bom:
+        file.write(BOM)
+    _JsoncWriter(file, comments, trailing_comments).write(value)
+
+
+def dumps(value, comments=None, trailing_comments=None, bom=False):
+    buffer = io.StringIO()
+    dump(value, buffer, comments, trailing_comments, bom)
+    return buffer.getvalue()
+
+
+class _JsoncParser(object):
+    def __init__(self, text, spans=None, track=None):
+        self.text = text
+        self.spans = spans
+        self._track = track
+        self.comments = {}
+        self.trailing_comments = {}
+        # Number of the JSON line (without comments) that was started last
+        self.line_number = -1
+        self._pending_comments = []
+        # A byte order mark is not part of the comments, see dump
+        self._line_start = 1 if text.startswith(BOM) else 0
+        self._content_end = None
+        self._comment_end = None
+        self._line_comments = []
+        # End of the last JSON token that was read
+        self._token_end = 0
+        # Comment line number of the JSON line whose trailing comment ends
+        # with a // comment
+        self._commented_out_line = None
+
+    def parse(self):
+        self._tokens = self._significant_tokens()
+        token = self._next_token()
+        self._start_line()
+        path = () if self.spans is not None else None
+        value = self._parse_value(token, key=None, path=path)
+        kind, token, pos = self._next_token()
+        if kind is not None:
+            self._error('Extra data', pos)
+        # Comments after the config are written after its last line, blank
+        # lines at the end are dropped
+        while self._pending_comments and not self._pending_comments[-1].strip():
+            self._pending_comments.pop()
+        self._place_pending_comments(before_line=self.line_number + 1)
+        return value, self.comments, self.trailing_comments
+
+    def _error(self, message, pos):
+        raise json.JSONDecodeError(message, self.text, pos)
+
+    def _start_line(self):
+        """Starts a new JSON line and places all comments waiting for it."""
+        self.line_number += 1
+        self._place_pending_comments(before_line=self.line_number)
+
+    def _place_pending_comments(self, before_line):
+        for comment in self._pending_comments:
+            self.comments[len(self.comments) + before_line] = comment
+        self._pending_comments = []
+
+    def _end_physical_line(self, end):
+        text = self.text
+        if self._content_end is None:
+            self._pending_comments.append(text[self._line_start:end].rstrip('\r'))
+        elif self._line_comments:
+            inline = [text[start:stop] for start, stop in self._line_comments
+                      if stop <= self._content_end]
+            tail = text[self._content_end:end].rstrip()
+            trailing = ''.join(' ' + comment for comment in inline)
+            if tail:
+                trailing += tail
+            current_line = len(self.comments) + self.line_number
+            if self._pending_comments or self._commented_out_line == current_line:
+                # The JSON line ends with a // comment or is followed by lines
+                # of a multi line comment already, these comments can only go
+                # on a line of their own after that
+                self._pending_comments.append(trailing.lstrip())
+            else:
+                self.trailing_comments[current_line] =\
+                    self.trailing_comments.get(current_line, '') + trailing
+                if tail and text.startswith('//', self._line_comments[-1][0]):
+                    self._commented_out_line = current_line
+        self._line_start = end + 1
+        self._content_end = None
+        self._comment_end = None
+        self._line_comments = []
+
+    def _significant_tokens(self):
+        text = self.text
+        for match in TOKEN_REGEX.finditer(text):
+            kind = match.lastgroup
+            if kind == 'whitespace':
+                continue
+            if kind == 'newline':
+                self._end_physical_line(match.start())
+            elif kind == 'line_comment':
+                self._line_comments.append((match.start(), match.end()))
+            elif kind == 'block_comment':
+                self._block_comment(match.start(), match.end())
+            elif kind == 'error':
+                if text.startswith('/*', match.start()):
+                    self._error('Unterminated comment', match.start())
+                self._error('Expecting value', match.start())
+            else:
+                if self._content_end is None and (
+                        self._comment_end is not None or self._line_comments):
+                    # Comments in front of the first JSON on a line (or the
+                    # end of a multi line comment) keep a line of their own
+                    end = max([self._comment_end or 0] +
+                              [stop for _, stop in self._line_comments])
+                    self._pending_comments.append(text[self._line_start:end])
+                    self._line_start = end
+                    self._comment_end = None
+                    self._line_comments = []
+                self._content_end = self._token_end = match.end()
+                yield kind, match.group(), match.start()
+        if self._line_start < len(text) or self._content_end is not None:
+            self._end_physical_line(len(text))
+        yield None, None, len(text)
+
+    def _block_comment(self, start, end):
+        newline = self.text.find('\n', start, end)
+        if newline == -1:
+            self._line_comments.append((start, end))
+            return
+        # Lines of multi line comments are kept as they are
+        self._line_comments.append((start, newline))
+        self._end_physical_line(newline)
+        while (newline := self.text.find('\n', self._line_start, end)) != -1:
+            self._end_physical_line(newline)
+        self._comment_end = end
+
+    def _next_token(self):
+        return next(self._tokens)
+
+    def _child_path(self, path, key):
+        if path is None:
+            return None
+        path = path + (key,)
+        return path if self._track is None or self._track(path) else None
+
+    def _record_span(self, path, member_start, value_start):
+        self.spans[path] = None if path in self.spans else (
+            member_start, value_start, self._token_end)
+
+    def _parse_value(self, token, key, path=None):
+        kind, value, pos = token
+        if kind == 'string':
+            return self._string(value, pos)
+        if kind == 'number':
+            if any(char in value for char in '.eE'):
+                return float(value)
+            return int(value)
+        if kind == 'literal':
+            return LITERALS[value]
+        if value == '{':
+            return self._parse_object(key, path)
+        if value == '[':
+            return self._parse_array(key, path)
+        self._error('Expecting value', pos)
+
+    def _string(self, value, pos):
+        if '\\' not in value:
+            return value[1:-1]
+        try:
+            return json.loads(value)
+        except json.JSONDecodeError:
+            self._error('Invalid \\escape', pos)
+
+    def _close_container(self, key, container):
+        if container or is_split_when_empty(key, container):
+            self._start_line()
+
+    def _parse_object(self, key, path):
+        obj = {}
+        kind, value, pos = self._next_token()
+        while value != '}':
+            if kind != 'string':
+                self._error(
+                    'Expecting property name enclosed in double quotes', pos)
+            self._start_line()
+            member_key = self._string(value, pos)
+            member_start = pos
+            kind, value, pos = self._next_token()
+            if value != ':':
+                self._error("Expecting ':' delimiter", pos)
+            token = self._next_token()
+            member_path = self._child_path(path, member_key)
+            obj[member_key] = self._parse_value(token, member_key, member_path)
+            if member_path is not None:
+                self._record_span(member_path, member_start, token[2])
+            kind, value, pos = self._next_token()
+            if value == ',':
+                kind, value, pos = self._next_token()
+            elif value != '}':
+                self._error("Expecting ',' delimiter", pos)
+        self._close_container(key, obj)
+        return obj
+
+    def _parse_array(self, key, path):
+        array = []
+        token = self._next_token()
+        while token[1] != ']':
+            if token[0] is None:
+                self._error('Expecting value', token[2])
+            self._start_line()
+            element_path = self._child_path(path, len(array))
+            array.append(self._parse_value(token, None, element_path))
+            if element_path is not None:
+                self._record_span(element_path, token[2], token[2])
+            kind, value, pos = token = self._next_token()
+            if value == ',':
+                token = self._next_token()
+            elif value != ']':
+                self._error("Expecting ',' delimiter", pos)
+        self._close_container(key, array)
+        return array
+
+
+def _encode_float(value):
+    if value != value:
+        return 'NaN'
+    if value in (float('inf'), float('-inf')):
+        return 'Infinity' if value > 0 else '-Infinity'
+    return float.__repr__(value)
+
+
+def _encode_scalar(value):
+    """value as json.dumps writes it (strings ASCII only)."""
+    if isinstance(value, str):
+        return encode_basestring_ascii(value)
+    if value is None:
+        return 'null'
+    if value is True:
+        return 'true'
+    if value is False:
+        return 'false'
+    if isinstance(value, int):
+        return int.__repr__(value)
+    if isinstance(value, float):
+        return _encode_float(value)
+    raise TypeError('Object of type {} is not JSON serializable'.format(
+        type(value).__name__))
+
+
+def _encode_key(key):
+    if isinstance(key, str):
+        return encode_basestring_ascii(key)
+    if isinstance(key, float):
+        return '"{}"'.format(_encode_float(key))
+    if key is None or isinstance(key, (bool, int)):
+        return '"{}"'.format(_encode_scalar(key))
+    raise TypeError('keys must be str, int, float, bool or None, not {}'.format(
+        type(key).__name__))
+
+
+class _JsoncWriter(object):
+    INDENT = '    '
+    # Lines collected before they are written to the file
+    CHUNK_LINES = 4096
+
+    def __init__(self, file, comments=None, trailing_comments=None):
+        self.file = file
+        self.comments = comments or {}
+        self.trailing_comments = trailing_comments or {}
+        # Number of the next line written, comments included
+        self.line_number = 0
+        self._lines = []
+        self._written = False
+
+    def write(self, value):
+        self._write_value(value, None, '', '', '')
+        # Comments after the last line of the config
+        self._lines.extend(
+            comment for line_number, comment in sorted(self.comments.items())
+            if line_number >= self.line_number)
+        self._flush()
+
+    def _flush(self):
+        if not self._lines:
+            return
+        if self._written:
+            self.file.write('\n')
+        self.file.write('\n'.join(self._lines))
+        self._written = True
+        self._lines = []
+
+    def _line(self, text):
+        comments = self.comments
+        while self.line_number in comments:
+            self._lines.append(comments[self.line_number])
+            self.line_number += 1
+        trailing_comment = self.trailing_comments.get(self.line_number)
+        self._lines.append(
+            text if trailing_comment is None else text + trailing_comment)
+        self.line_number += 1
+        if len(self._lines) >= self.CHUNK_LINES:
+            self._flush()
+
+    def _write_value(self, value, key, indent, prefix, suffix):
+        """Writes value, its first line starts with prefix (indent and key) and
+        its last line ends with suffix (a comma or nothing)."""
+        if isinstance(value, dict):
+            opening, closing, items = '{', '}', value.items()
+        elif isinstance(value, list):
+            opening, closing, items = '[', ']', enumerate(value)
+        else:
+            self._line(prefix + _encode_scalar(value) + suffix)
+            return
+        if not value:
+            if is_split_when_empty(key, value):
+                self._line(prefix + opening)
+                self._line(indent + closing + suffix)
+            else:
+                self._line(prefix + opening + closing + suffix)
+            return
+        self._line(prefix + opening)
+        child_indent = indent + self.INDENT
+        is_object = opening == '{'
+        last = len(value) - 1
+        for i, (child_key, child) in enumerate(items):
+            if is_object:
+                child_prefix = child_indent + _encode_key(child_key) + ': '
+            else:
+                child_prefix, child_key = child_indent, None
+            child_suffix = ',' if i < last else ''
+            if isinstance(child, (dict, list)):
+                self._write_value(child, child_key, child_indent, child_prefix,
+                                  child_suffix)
+            else:
+                self._line(child_prefix + _encode_scalar(child) + child_suffix)
+        self._line(indent + closing + suffix)
@@ -1,15 +1,90 @@
 #!/usr/bin/env python3
 
 import logging
-from windows_terminal_scheme_manager.downloader import WindowsTerminalSchemeDownloader
-from windows_terminal_scheme_manager.terminal_config import WindowsTerminalConfigFile
-from windows_terminal_scheme_manager.screen import SchemeManager
+import importlib
 import click
-
-
-@click.group()
+from windows_terminal_scheme_manager import timing
+
+
+class LazyGroup(click.Group):
+    """Group that imports the modules of its subcommands only when they are
+    used, so that e.g. next-scheme does not have to import npyscreen or the
+    downloader."""
+
+    def __init__(self, *args, lazy_subcommands=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        # command name -> 'module:attribute'
+        self.lazy_subcommands = lazy_subcommands or {}
+
+    def list_commands(self, ctx):
+        return sorted(super().list_commands(ctx) + [*self.lazy_subcommands])
+
+    def get_command(self, ctx, cmd_name):
+        if cmd_name not in self.lazy_subcommands:
+            return super().get_command(ctx, cmd_name)
+        module_name, attribute = self.lazy_subcommands[cmd_name].split(':')
+        with timing.span('import ' + cmd_name):
+            return getattr(importlib.import_module(module_name), attribute)
+
+
+def start_profile(ctx, param, value):
+    """Times the phases of the command and prints them to stderr at the end."""
+    if not value:
+        return
+    if param.name == 'profile_json':
+        ctx.meta['profile_json'] = True
+    if timing.enabled():
+        return
+    timing.enable()
+    ctx.call_on_close(lambda: click.echo(
+        timing.report(as_json=ctx.meta.get('profile_json', False)), err=True))
+
+
+def start_profile_dump(ctx, param, value):
+    """Runs the command in cProfile and saves the stats to the file value, for
+    snakeviz or pstats."""
+    if value is None:
+        return
+    import cProfile
+    profiler = cProfile.Profile()
+    profiler.enable()
+
+    def dump():
+        profiler.disable()
+        profiler.dump_stats(value)
+    ctx.call_on_close(dump)
+
+
+COMMANDS = 'windows_terminal_scheme_manager.commands.'
+
+
+@click.group(cls=LazyGroup, lazy_subcommands={
+    'list': COMMANDS + 'schemes:list_schemes',
+    'next-scheme': COMMANDS + 'schemes:next_scheme',
+    'previous-scheme': COMMANDS + 'schemes:previous_scheme',
+    'set': COMMANDS + 'schemes:set_scheme',
+    'remove-scheme': COMMANDS + 'schemes:remove_scheme',
+    'add-all-schemes': COMMANDS + 'download:add_all_schemes',
+    'sync-schemes': COMMANDS + 'download:sync_schemes',
+    'ui': COMMANDS + 'ui:ui',
+    'stats': COMMANDS + 'stats:stats',
+    'search': COMMANDS + 'search:search',
+    'similar': COMMANDS + 'stats:similar',
+    'dedupe': COMMANDS + 'stats:dedupe',
+    'backups': COMMANDS + 'backups:backups',
+    'daemon': COMMANDS + 'daemon:daemon',
+    'apply': COMMANDS + 'apply:apply',
+})
 @click.option('--debug', default='ERROR',
               help='sets debug level (INFO, WARNING, ERROR)')
+@click.option('--profile', is_flag=True, is_eager=True, expose_value=False,
+              callback=start_profile,
+              help='prints the time of every phase to stderr')
+@click.option('--profile_json', is_flag=True, is_eager=True, expose_value=False,
+              callback=start_profile, help='like --profile, but as JSON')
+@click.option('--profile_dump', type=click.Path(dir_okay=False), default=None,
+              is_eager=True, expose_value=False, callback=start_profile_dump,
+              help='saves cProfile stats of the command to this file')
 def cli(debug='ERROR', config_file=None):
     logging.basicConfig(
         format='%(asctime)s %(levelname)-8s %(message)s',
@@ -18,94 +93,8 @@ def cli(debug='ERROR', config_file=None):
         )
 
 
-@click.command()
-@click.option("--config_file", default=None,
-              help='use a different file as Terminal config')
-def list(config_file):
-    config_file = WindowsTerminalConfigFile()
-    config_file.config
-    schemes = config_file.config.schemes()
-    current_scheme = config_file.config.get_current_scheme()
-    click.echo('Current Scheme: {}'.format(current_scheme))
-    click.echo('Available Schemes: {}'.format(', '.join(schemes)))
-
-
-@click.command()
-@click.option("--config_file", default=None,
-              help='use a different file as Terminal config')
-@click.option('--profile', default=None,
-              help='name of profile to change scheme for. Defaults to all profiles')
-def next_scheme(profile, config_file):
-    config_file = WindowsTerminalConfigFile()
-    config_file.config.cycle_schemes(profile)
-    config_file.write()
-    current_scheme = config_file.config.get_current_scheme(profile)
-    click.echo('New scheme: {}'.format(current_scheme))
-
-
-@click.command()
-@click.option("--config_file", default=None,
-              help='use a different file as Terminal config')
-@click.option('--profile', default=None,
-              help='name of profile to change scheme for. Defaults to all profiles')
-def previous_scheme(profile, config_file):
-    config_file = WindowsTerminalConfigFile()
-    config_file.config.cycle_schemes(profile, backwards=True)
-    config_file.write()
-    current_scheme = config_file.config.get_current_scheme(profile)
-    click.echo('New scheme: {}'.format(current_scheme))
-
-
-@click.command()
-@click.option("--config_file", default=None,
-              help='use a different file as Terminal config')
-@click.argument("scheme")
-def set(scheme):
-    config_file = WindowsTerminalConfigFile()
-    config_file.config.set_scheme(scheme)
-    config_file.write()
-    current_scheme = config_file.config.get_current_scheme()
-    click.echo('New scheme: {}'.format(current_scheme))
-
-
-@click.command()
-@click.option("--config_file", default=None,
-              help='use a different file as Terminal config')
-def add_all_schemes(config_file):
-    downloader = WindowsTerminalSchemeDownloader()
-    downloader.download_and_add_schemes_to_config(
-        keep_repo=True, config_file=config_file)
-
-
-@click.command()
-@click.argument('name')
-@click.option("--config_file", default=None,
-              help='use a different file as Terminal config')
-def remove_scheme(name, config_file):
-    config_file = WindowsTerminalConfigFile()
-    config_file.config.remove_scheme(name)
-    current_scheme = config_file.config.get_current_scheme()
-    if current_scheme == name:
-        config_file.config.cycle_schemes()
-        current_scheme = config_file.config.get_current_scheme()
-        click.echo('Deleted Scheme was active, switched to next scheme: {}'.format(
-            current_scheme))
-    config_file.write()
-
-
-@click.command()
-def ui():
-    ui = SchemeManager()
-    ui.run()
-
-
-cli.add_command(locals()['list'])
-cli.add_command(next_scheme)
-cli.add_command(previous_scheme)
-cli.add_command(locals()['set'])
-cli.add_command(add_all_schemes)
-cli.add_command(ui)
-cli.add_command(remove_scheme)
-
 if __name__ == "__main__":
+    # Needed by the worker processes of the downloader in frozen builds
+    import multiprocessing
+    multiprocessing.freeze_support()
     cli()
@@ -0,0 +1,186 @@
+import numpy as np
+from windows_terminal_scheme_manager.colors import (
+    ANSI_SLOTS, OPTIONAL_SCHEME_COLOR_KEYS, DARK_LUMINANCE)
+
+# Color statistics for many schemes at once.
+#
+# The colors of all schemes are decoded into one uint8 array of shape
+# (schemes, COLOR_SLOTS, RGB), every metric is computed on whole arrays.
+# numpy is optional for wtsm, only stats and the scheme filters need it.
+
+COLOR_SLOTS = ('background', 'foreground') + OPTIONAL_SCHEME_COLOR_KEYS + ANSI_SLOTS
+BACKGROUND = COLOR_SLOTS.index('background')
+FOREGROUND = COLOR_SLOTS.index('foreground')
+ANSI = slice(COLOR_SLOTS.index('black'), len(COLOR_SLOTS))
+
+# Linear sRGB to CIE XYZ, the Y row gives the relative luminance
+_RGB_TO_XYZ = np.array([[0.4124, 0.3576, 0.1805],
+                        [0.2126, 0.7152, 0.0722],
+                        [0.0193, 0.1192, 0.9505]])
+_D65_WHITE = _RGB_TO_XYZ.sum(axis=1)
+
+# Value of every hex digit by its ASCII code, 255 for everything else
+_HEX_VALUES = np.full(256, 255, dtype=np.uint8)
+_HEX_VALUES[np.frombuffer(b'0123456789', dtype=np.uint8)] = np.arange(10)
+_HEX_VALUES[np.frombuffer(b'abcdef', dtype=np.uint8)] = np.arange(10, 16)
+_HEX_VALUES[np.frombuffer(b'ABCDEF', dtype=np.uint8)] = np.arange(10, 16)
+# Decodes to invalid digits, so missing colors are marked like invalid ones
+_MISSING_COLOR = '#------'
+
+
+def _color_strings(schemes):
+    for scheme in schemes:
+        for slot in COLOR_SLOTS:
+            color = scheme.get(slot)
+            if isinstance(color, str) and len(color) == 7 and color[0] == '#':
+                yield color
+            else:
+                yield _MISSING_COLOR
+
+
+class SchemeMatrix(object):
+    # Rows of the distance matrix computed at once by duplicates
+    DISTANCE_BLOCK_SIZE = 1024
+
+    def __init__(self, schemes):
+        self.names = [scheme['name'] for scheme in schemes]
+        shape = (len(self.names), len(COLOR_SLOTS), 7)
+        text = ''.join(_color_strings(schemes)).encode('ascii', 'replace')
+        digits = _HEX_VALUES[np.frombuffer(text, dtype=np.uint8).reshape(shape)[
+            ..., 1:]]
+        # Which slots each scheme has a valid color for
+        self.present = (digits != 255).all(axis=-1)
+        digits[~self.present] = 0
+        self.rgb = (digits[..., 0::2] << 4 | digits[..., 1::2]).astype(np.uint8)
+        self._luminance = None
+        self._features = None
+
+    def __len__(self):
+        return len(self.names)
+
+    def luminance(self):
+        """Relative luminance (WCAG 2) of every color, shape (schemes, slots)."""
+        if self._luminance is None:
+            self._luminance = self._linear_rgb() @ _RGB_TO_XYZ[1]
+        return self._luminance
+
+    def _linear_rgb(self):
+        srgb = self.rgb / 255.0
+        return np.where(srgb <= 0.03928, srgb / 12.92,
+                        ((srgb + 0.055) / 1.055) ** 2.4)
+
+    def lab(self):
+        """CIELAB (D65) of every color, shape (schemes, slots, 3). Missing
+        colors count as white, which is what Terminal uses for them."""
+        rgb = self._linear_rgb()
+        rgb[~self.present] = 1.0
+        xyz = rgb @ _RGB_TO_XYZ.T / _D65_WHITE
+        f = np.where(xyz > (6 / 29) ** 3, np.cbrt(xyz),
+                     xyz / (3 * (6 / 29) ** 2) + 4 / 29)
+        return np.stack([116 * f[..., 1] - 16,
+                         500 * (f[..., 0] - f[..., 1]),
+                         200 * (f[..., 1] - f[..., 2])], axis=-1)
+
+    def features(self):
+        """One row per scheme with the Lab values of all its colors. The
+        euclidean distance of two rows divided by sqrt(slots) is the root mean
+        square of the color differences (CIE76 delta E) of the two schemes."""
+        if self._features is None:
+            self._features = np.ascontiguousarray(
+                self.lab().reshape(len(self), -1) / np.sqrt(len(COLOR_SLOTS)))
+            self._squared_norms = (self._features ** 2).sum(axis=1)
+        return self._features
+
+    def distances(self, rows):
+        """Distances (RMS delta E) between the schemes at rows and all schemes,
+        shape (len(rows), schemes)."""
+        return np.sqrt(np.maximum(self._squared_distances(rows), 0))
+
+    def _squared_distances(self, rows):
+        features = self.features()
+        squared = features[rows] @ features.T
+        squared *= -2
+        squared += self._squared_norms[rows, np.newaxis]
+        squared += self._squared_norms
+        return squared
+
+    def similar(self, index, k=10):
+        """Returns (indices, distances) of the k schemes closest to the scheme
+        at index, closest first."""
+        distances = self.distances([index])[0]
+        distances[index] = np.inf
+        k = min(k, len(self) - 1)
+        if k <= 0:
+            return np.array([], dtype=int), np.array([])
+        nearest = np.argpartition(distances, k - 1)[:k]
+        nearest = nearest[np.argsort(distances[nearest], kind='stable')]
+        return nearest, distances[nearest]
+
+    def duplicates(self, threshold, keep=()):
+        """Returns (duplicate, original, distance) index triples for schemes
+        closer than threshold to a scheme that is kept. Schemes are kept in
+        order, the ones in keep (indices) first."""
+        keep = set(keep)
+        order = np.array(sorted(range(len(self)), key=lambda i: i not in keep),
+                         dtype=int)
+        rank = np.empty(len(self), dtype=int)
+        rank[order] = np.arange(len(self))
+        # All pairs closer than threshold where the second scheme comes first,
+        # computed in blocks of rows to bound the memory use
+        pairs = []
+        for start in range(0, len(self), self.DISTANCE_BLOCK_SIZE):
+            rows = np.arange(start, min(start + self.DISTANCE_BLOCK_SIZE, len(self)))
+            squared = self._squared_distances(rows)
+            row, column = np.nonzero(squared < threshold ** 2)
+            earlier = rank[column] < rank[rows[row]]
+            row, column = row[earlier], column[earlier]
+            pairs.append((rows[row], column,
+                          np.sqrt(np.maximum(squared[row, column], 0))))
+        duplicate, original, distance = (
+            np.concatenate(values) for values in zip(*pairs)) if pairs else ((),) * 3
+        # Decides scheme by scheme in order, so it is known whether the
+        # earlier schemes are kept
+        duplicates = []
+        removed = set()
+        if pairs:
+            by_rank = np.lexsort((rank[original], rank[duplicate]))
+            for i, j, d in zip(duplicate[by_rank].tolist(), original[by_rank].tolist(),
+                               distance[by_rank].tolist()):
+                if i in removed or j in removed or i in keep:
+                    continue
+                duplicates.append((i, j, d))
+                removed.add(i)
+        return duplicates
+
+    def background_luminance(self):
+        return self.luminance()[:, BACKGROUND]
+
+    def is_dark(self):
+        return self.background_luminance() < DARK_LUMINANCE
+
+    def contrast(self):
+        """WCAG contrast ratio of every color against the background of its
+        scheme, shape (schemes, slots). Missing colors get NaN."""
+        luminance = self.luminance()
+        background = luminance[:, BACKGROUND, np.newaxis]
+        lighter = np.maximum(luminance, background)
+        darker = np.minimum(luminance, background)
+        contrast = (lighter + 0.05) / (darker + 0.05)
+        contrast[~self.present] = np.nan
+        return contrast
+
+    def foreground_contrast(self):
+        return self.contrast()[:, FOREGROUND]
+
+    def ansi_contrast(self):
+        return self.contrast()[:, ANSI]
+
+    def select(self, dark=None, min_contrast=None):
+        """Boolean mask of the schemes that are dark (dark=True) or light
+        (dark=False) and whose foreground has at least min_contrast."""
+        mask = np.ones(len(self), dtype=bool)
+        if dark is not None:
+            mask &= self.is_dark() == dark
+        if min_contrast is not None:
+            mask &= self.foreground_contrast() >= min_contrast
+        return mask
@@ -1,47 +1,178 @@
+import curses
+from collections import OrderedDict
 import npyscreen
 from windows_terminal_scheme_manager.terminal_config import WindowsTerminalConfigFile
+from windows_terminal_scheme_manager.background_writer import BackgroundWriter
+from windows_terminal_scheme_manager.fuzzy import FuzzyIndex
+from windows_terminal_scheme_manager.colors import ANSI_SLOTS, hex_to_rgb
+
+# Levels of the 6x6x6 color cube of 256 color terminals (colors 16 to 231)
+XTERM_CUBE_LEVELS = (0, 95, 135, 175, 215, 255)
+BASIC_COLORS = ((0, 0, 0), (205, 0, 0), (0, 205, 0), (205, 205, 0),
+                (0, 0, 238), (205, 0, 205), (0, 205, 205), (229, 229, 229))
+
+
+def _squared_distance(rgb, other):
+    return sum((a - b) ** 2 for a, b in zip(rgb, other))
+
+
+def nearest_terminal_color(rgb, colors=256):
+    """Number of the terminal color closest to rgb, for terminals with 256 or
+    8 colors."""
+    if colors < 256:
+        return min(range(8), key=lambda i: _squared_distance(rgb, BASIC_COLORS[i]))
+    cube = [min(range(6), key=lambda i: abs(XTERM_CUBE_LEVELS[i] - channel))
+            for channel in rgb]
+    cube_rgb = [XTERM_CUBE_LEVELS[i] for i in cube]
+    gray = min(23, max(0, (sum(rgb) // 3 - 3) // 10))
+    gray_rgb = (8 + 10 * gray,) * 3
+    if _squared_distance(rgb, gray_rgb) < _squared_distance(rgb, cube_rgb):
+        return 232 + gray
+    return 16 + 36 * cube[0] + 6 * cube[1] + cube[2]
+
+
+class ColorPairPool(object):
+    """Curses color pairs with a terminal color as background. Each color gets
+    its pair once and keeps it, the least recently used one is reassigned
+    when the pairs run out. The pairs npyscreen uses come before FIRST_PAIR."""
+    FIRST_PAIR = 64
+
+    def __init__(self):
+        self.colors = curses.COLORS if curses.has_colors() else 0
+        self.size = max(0, min(256, curses.COLOR_PAIRS - self.FIRST_PAIR))
+        self._pairs = OrderedDict()
+
+    def attribute(self, rgb):
+        if not self.size or self.colors < 8:
+            return curses.A_REVERSE
+        color = nearest_terminal_color(rgb, self.colors)
+        if color in self._pairs:
+            self._pairs.move_to_end(color)
+        else:
+            if len(self._pairs) < self.size:
+                pair = self.FIRST_PAIR + len(self._pairs)
+            else:
+                _, pair = self._pairs.popitem(last=False)
+            curses.init_pair(pair, curses.COLOR_BLACK, color)
+            self._pairs[color] = pair
+        return curses.color_pair(self._pairs[color])
 
 # This application class serves as a wrapper for the initialization of curses
 # and also manages the actual forms of the application
 
 
 class SchemeManager(npyscreen.NPSAppManaged):
+    def __init__(self, config_file=None):
+        self.config_file = config_file
+        self.writer = None
+        super().__init__()
+
     def onStart(self):
         # npyscreen.setTheme(npyscreen.Themes.ColorfulTheme)
-        self.config_file = WindowsTerminalConfigFile()
-        self.config = self.config_file.reload()
-        self.registerForm("MAIN", SchemeListForm(self.config_file))
+        if self.config_file is None:
+            self.config_file = WindowsTerminalConfigFile()
+        self.config = self.config_file.config
+        # Changes are written in the background, see BackgroundWriter
+        self.writer = BackgroundWriter(self.config_file)
+        self.registerForm("MAIN", SchemeListForm(self.config_file, self.writer))
         # self.registerForm("Testing", OtherForm(self.config))
 
+    def run(self, *args, **kwargs):
+        try:
+            return super().run(*args, **kwargs)
+        finally:
+            # Also when leaving with ctrl-c, so the last change is not lost
+            if self.writer is not None:
+                self.writer.close()
+
+
+class ColorSwatch(npyscreen.wgwidget.Widget):
+    """The 16 ANSI colors of a scheme in two rows."""
+    def __init__(self, screen, **keywords):
+        self.colors = []
+        self._pool = None
+        super().__init__(screen, editable=False, **keywords)
+
+    def calculate_area_needed(self):
+        return 2, 8 * 3
+
+    def update(self, clear=True):
+        if clear:
+            self.clear()
+        if self.hidden:
+            return
+        if self._pool is None:
+            self._pool = ColorPairPool()
+        for i, rgb in enumerate(self.colors):
+            row, column = divmod(i, 8)
+            if rgb is not None:
+                self.parent.curses_pad.addstr(
+                    self.rely + row, self.relx + 3 * column, '   ',
+                    self._pool.attribute(rgb))
+
 
 class SchemeList(npyscreen.MultiLineAction):
-    def __init__(self, *args, **kwargs):
-        self.config_file = WindowsTerminalConfigFile()
-        self.config = self.config_file.config
-        super().__init__(*args, **kwargs)
+    def when_cursor_moved(self):
+        self.parent.show_swatch()
 
     def actionHighlighted(self, scheme_name, key_press):
-        self.config.set_scheme(scheme_name)
-        self.config_file.write()
+        config_file = self.parent.config_file
+        with self.parent.writer.lock:
+            config_file.set_scheme(scheme_name)
+        self.parent.writer.changed()
         if key_press == 32:  # space-bar
             # no idea if I'm supposed to put the key-code here but it works?
             self.h_cursor_line_down(32)
         title = self.parent._widgets_by_id[0]
-        title.value = self.config.get_current_scheme()
+        title.value = config_file.config.get_current_scheme()
         title.display()
 
 
 class SchemeListForm(npyscreen.Form):
-    def __init__(self, config):
-        self.config_file = config
+    def __init__(self, config_file, writer):
+        self.config_file = config_file
         self.config = self.config_file.config
+        self.writer = writer
+        self.schemes_by_name = {
+            scheme['name']: scheme for scheme in self.config.get('schemes')}
+        self.index = FuzzyIndex(self.config.schemes())
         super().__init__()
 
     def create(self):
         self.add(npyscreen.TitleFixedText, name="Current Scheme:",
                  value=self.config.get_current_scheme(), max_width=40)
-        self.add(SchemeList, name="Scheme List",
-                 values=self.config.schemes(), max_height=None, max_width=30)
+        title_text = self.add(npyscreen.TitleText, name="Filter:", max_width=40)
+        # Only on the entry, TitleText would call it for its title as well
+        title_text.entry_widget.value_changed_callback = self.filter_changed
+        self.nextrely += 1
+        list_rely = self.nextrely
+        self.scheme_list = self.add(SchemeList, name="Scheme List",
+                                    values=self.index.names, max_height=None,
+                                    max_width=30)
+        self.swatch = self.add(ColorSwatch, relx=34, rely=list_rely)
+        self.show_swatch(display=False)
+
+    def filter_changed(self, widget):
+        self.scheme_list.values = self.index.search_names(widget.value or '')
+        self.scheme_list.cursor_line = 0
+        self.scheme_list.start_display_at = 0
+        self.scheme_list.display()
+        self.show_swatch()
+
+    def show_swatch(self, display=True):
+        values = self.scheme_list.values
+        cursor_line = self.scheme_list.cursor_line
+        scheme = (self.schemes_by_name.get(values[cursor_line])
+                  if 0 <= cursor_line < len(values) else None)
+        colors = []
+        for slot in ANSI_SLOTS:
+            try:
+                colors.append(hex_to_rgb(scheme[slot]))
+            except (TypeError, KeyError, ValueError):
+                colors.append(None)
+        self.swatch.colors = colors
+        if display:
+            self.swatch.display()
 
     def afterEditing(self):
         self.parentApp.setNextForm(None)
@@ -0,0 +1,185 @@
+import os
+import colorsys
+import hashlib
+import logging
+import orjson
+from windows_terminal_scheme_manager.fuzzy import FuzzyIndex
+from windows_terminal_scheme_manager.colors import (
+    DARK_LUMINANCE, hex_to_rgb, relative_luminance, contrast)
+
+# Index of the schemes in a Terminal config for `wtsm search`.
+#
+# The index is saved next to the config with the size, mtime and SHA-256 the
+# config had when it was built. As long as the config has the same mtime (or
+# at least the same content) the index is used without parsing the config.
+# Every entry has the name of a scheme and what can be searched for besides
+# it: dark or light, the dominant hue, the foreground contrast and where the
+# scheme came from.
+
+# Schemes that come with Windows Terminal
+BUILTIN_SCHEMES = frozenset((
+    'Campbell', 'Campbell Powershell', 'Vintage', 'One Half Dark',
+    'One Half Light', 'Solarized Dark', 'Solarized Light', 'Tango Dark',
+    'Tango Light'))
+SOURCES = ('builtin', 'downloaded', 'custom')
+# Hue names by the hue angle (degrees) they start at
+HUES = ((0, 'red'), (20, 'orange'), (45, 'yellow'), (70, 'green'), (160, 'cyan'),
+        (200, 'blue'), (260, 'purple'), (300, 'pink'), (340, 'red'))
+GRAY = 'gray'
+# Colors that set the look of a scheme, the ANSI colors of most schemes
+# cover every hue and count less
+HUE_WEIGHTS = {'background': 4, 'foreground': 2, 'selectionBackground': 1,
+               'cursorColor': 1}
+ANSI_HUE_WEIGHT = 0.25
+# Below this (weighted chroma) a scheme has no dominant hue
+MIN_CHROMA = 0.5
+
+
+def hue_name(degrees):
+    return [name for start, name in HUES if degrees >= start][-1]
+
+
+def dominant_hue(scheme):
+    """Name of the hue with the most chroma in the scheme, weighted by how
+    much of the screen the colors cover, or gray."""
+    weights = {}
+    for key, color in scheme.items():
+        if key == 'name' or not isinstance(color, str) or len(color) != 7:
+            continue
+        try:
+            red, green, blue = (channel / 255 for channel in hex_to_rgb(color))
+        except ValueError:
+            continue
+        hue, _, _ = colorsys.rgb_to_hsv(red, green, blue)
+        chroma = max(red, green, blue) - min(red, green, blue)
+        name = hue_name(hue * 360)
+        weights[name] = weights.get(name, 0) + chroma * HUE_WEIGHTS.get(
+            key, ANSI_HUE_WEIGHT)
+    if not weights or max(weights.values()) < MIN_CHROMA:
+        return GRAY
+    return max(weights, key=weights.get)
+
+
+def _file_stamp(path):
+    try:
+        stat_result = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return [stat_result.st_size, stat_result.st_mtime_ns]
+
+
+def _file_sha256(path):
+    with open(path, 'rb') as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+
+class SchemeSearchIndex(object):
+    FILENAME = 'wtsm_search_index.json'
+    VERSION = 1
+
+    def __init__(self, path, stamp=None, entries=None):
+        self.path = path
+        # Size, mtime and SHA-256 of the config and size and mtime of the
+        # catalog the index was built from
+        self.stamp = stamp
+        self.entries = entries if entries is not None else []
+
+    @classmethod
+    def path_for(cls, config_path):
+        return os.path.join(os.path.dirname(config_path), cls.FILENAME)
+
+    @classmethod
+    def for_config(cls, config_path, catalog_path=None):
+        """Returns the index of the config at config_path, built again first
+        if the config or the scheme catalog changed."""
+        from windows_terminal_scheme_manager.catalog import SchemeCatalog
+        if catalog_path is None:
+            catalog_path = SchemeCatalog.default_path()
+        index = cls.load(cls.path_for(config_path))
+        config_stamp = _file_stamp(config_path)
+        catalog_stamp = _file_stamp(catalog_path)
+        stamp = index.stamp or {}
+        if stamp.get('catalog') == catalog_stamp:
+            if stamp.get('config') == config_stamp:
+                return index
+            sha256 = _file_sha256(config_path)
+            if stamp.get('sha256') == sha256:
+                logging.info("Config was touched but not changed, keeping index")
+                index.stamp['config'] = config_stamp
+                index.save()
+                return index
+        logging.info("Building search index {}".format(index.path))
+        index.build(config_path, SchemeCatalog.load(catalog_path), catalog_stamp)
+        index.save()
+        return index
+
+    @classmethod
+    def load(cls, path):
+        try:
+            with open(path, 'rb') as file:
+                data = orjson.loads(file.read())
+        except FileNotFoundError:
+            return cls(path)
+        except ValueError:
+            logging.warning("Ignoring broken search index {}".format(path))
+            return cls(path)
+        if data.get('version') != cls.VERSION:
+            return cls(path)
+        return cls(path, data['stamp'], data['entries'])
+
+    def save(self):
+        temp_path = self.path + '.tmp'
+        try:
+            with open(temp_path, 'wb') as file:
+                file.write(orjson.dumps({'version': self.VERSION, 'stamp': self.stamp,
+                                         'entries': self.entries}))
+            os.replace(temp_path, self.path)
+        except OSError as error:
+            # The index is only a cache, searching works without saving it
+            logging.warning("Could not save search index {}: {}".format(
+                self.path, error))
+
+    def build(self, config_path, catalog, catalog_stamp):
+        from windows_terminal_scheme_manager.terminal_config import (
+            WindowsTerminalConfigFile, scheme_hash)
+        config_file = WindowsTerminalConfigFile(path=config_path)
+        downloaded = {}
+        if catalog.schemes is not None:
+            downloaded = {scheme['name']: scheme_hash(scheme)
+                          for scheme in catalog.schemes}
+        self.entries = [self._entry(scheme, downloaded)
+                        for scheme in config_file.config.get('schemes')]
+        self.stamp = {'config': _file_stamp(config_path),
+                      'sha256': _file_sha256(config_path),
+                      'catalog': catalog_stamp}
+
+    @staticmethod
+    def _entry(scheme, downloaded):
+        background = scheme.get('background', '#000000')
+        foreground = scheme.get('foreground', '#ffffff')
+        try:
+            is_dark = relative_luminance(background) < DARK_LUMINANCE
+            foreground_contrast = round(contrast(foreground, background), 2)
+        except ValueError:
+            is_dark, foreground_contrast = None, None
+        if scheme['name'] in BUILTIN_SCHEMES:
+            source = 'builtin'
+        elif scheme['name'] in downloaded:
+            source = 'downloaded'
+        else:
+            source = 'custom'
+        return {'name': scheme['name'], 'dark': is_dark,
+                'hue': dominant_hue(scheme), 'contrast': foreground_contrast,
+                'source': source}
+
+    def search(self, query='', dark=None, min_contrast=None, hue=None, source=None):
+        """Returns the entries matching the filters whose names fuzzy match
+        query, best match first (see FuzzyIndex)."""
+        entries = [
+            entry for entry in self.entries
+            if (dark is None or entry['dark'] == dark) and
+            (min_contrast is None or (entry['contrast'] or 0) >= min_contrast) and
+            (hue is None or entry['hue'] == hue) and
+            (source is None or entry['source'] == source)]
+        names = FuzzyIndex(entry['name'] for entry in entries)
+        return [entries[i] for i in names.search(query)]
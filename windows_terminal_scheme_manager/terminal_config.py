@@ -1,36 +1,133 @@
 import os
 import math
+import stat
+import hashlib
 import logging
 import copy
 import json
 import re
 import sys
+import fnmatch
+import bisect
 from functools import reduce
 from operator import getitem
-import random
-import filecmp
 from datetime import datetime
-import subprocess
-import platform
 from functools import lru_cache
-import orjson
+from contextlib import contextmanager
+from windows_terminal_scheme_manager import jsonc, timing
+
+
+class ConfigLineIndex(object):
+    """Line spans of the nodes of a config in its formatted layout.
+
+    Line numbers are counted in the formatted JSON without comments (what
+    ``jsonc.dumps`` writes when it gets no comments). Sizes of
+    containers are cached and adjusted when the config is edited, so an edit
+    can find out where it lands without dumping the config again.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self._sizes = {}
+
+    def size(self, value, key=None):
+        if not isinstance(value, (dict, list)):
+            return 1
+        if not value:
+            return 2 if jsonc.is_split_when_empty(key, value) else 1
+        cached = self._sizes.get(id(value))
+        if cached is not None and cached[0] is value:
+            return cached[1]
+        if isinstance(value, dict):
+            size = 2 + sum(self.size(child, child_key)
+                           for child_key, child in value.items())
+        else:
+            size = 2 + sum(self.size(child) for child in value)
+        self._sizes[id(value)] = (value, size)
+        return size
+
+    def node_size(self, *path):
+        node, key = self.config, None
+        for key in path:
+            node = node[key]
+        return self.size(node, key if isinstance(key, str) else None)
+
+    def start(self, *path):
+        line = 0
+        node = self.config
+        for key in path:
+            # Skip the opening line of the container and all nodes before key
+            line += 1
+            if isinstance(node, dict):
+                for child_key, child in node.items():
+                    if child_key == key:
+                        break
+                    line += self.size(child, child_key)
+            else:
+                line += sum(self.size(child) for child in node[:key])
+            node = node[key]
+        return line
+
+    def end(self, *path):
+        return self.start(*path) + self.node_size(*path) - 1
+
+    def forget(self, node):
+        cached = self._sizes.get(id(node))
+        if cached is not None and cached[0] is node:
+            del self._sizes[id(node)]
+
+    def adjust(self, path, increment_by):
+        """Adds increment_by to the cached sizes of all parents of the node at
+        path, after that node changed its size."""
+        if not path:
+            return
+        node = self.config
+        nodes = [node]
+        for key in path[:-1]:
+            node = node[key]
+            nodes.append(node)
+        for node in nodes:
+            cached = self._sizes.get(id(node))
+            if cached is not None and cached[0] is node:
+                self._sizes[id(node)] = (node, cached[1] + increment_by)
+
+
+class ProfileNotFoundError(LookupError):
+    pass
+
+
+class InvalidOperationError(ValueError):
+    pass
 
 
 class WindowsTerminalConfig(object):
-    def __init__(self, json, comments):
+    def __init__(self, json, comments, trailing_comments=None, bom=False,
+                 newline='\n'):
         self.config = copy.deepcopy(json)
         self.comments = comments
-        self._config_copy = None
+        self.trailing_comments = trailing_comments or {}
+        # Whether the file started with a byte order mark
+        self.bom = bom
+        # Line ending of the file, '\n' or '\r\n'
+        self.newline = newline
+        self._line_index = ConfigLineIndex(self.config)
+        # Position of every scheme name in the schemes list, built on demand
+        self._scheme_positions = None
+        # Position of every profile name and GUID in the profiles list
+        self._profile_positions = None
+        # Number of edits made through _extend, _remove_all and _set_key
+        self.edit_count = 0
 
     def clone(self):
         config = copy.deepcopy(self.config)
         comments = copy.deepcopy(self.comments)
-        return self.__class__(config, comments)
+        trailing_comments = copy.deepcopy(self.trailing_comments)
+        return self.__class__(config, comments, trailing_comments, self.bom,
+                              self.newline)
 
     def get_default_config(self):
         default_guid = self.config.get('defaultProfile')
-        return next((profile for profile in self.profiles()
-                    if profile['guid'] == default_guid))
+        return self.get_profile(default_guid)
 
     def profiles(self):
         return self.get('profiles', 'list')
@@ -41,48 +138,116 @@ class WindowsTerminalConfig(object):
     def get_defaults(self):
         return self.get('profiles', 'defaults')
 
-    def add_scheme(self, scheme_dict, reuse_copy=False):
-        scheme_name = scheme_dict['name']
-        if scheme_name in self.schemes():
-            return
-
-        if not reuse_copy or not self._config_copy:
-            self._config_copy = copy.deepcopy(self.config)
-        self.config['schemes'].append(scheme_dict)
-        changed_line_number, change_length = self.__get_line_number_for_change(
-            self._config_copy, self.config)
-        self.__increase_comment_offset_from_pos(
-            start_pos=changed_line_number, increment_by=change_length)
-        logging.info('Added scheme {} to config'.format(scheme_name))
-        if reuse_copy:
-            self._config_copy['schemes'].append(scheme_dict)
+    def add_scheme(self, scheme_dict):
+        self.add_schemes([scheme_dict])
+
+    @timing.timed('config.add_schemes')
+    def add_schemes(self, scheme_dicts):
+        """Adds all schemes that are not in the config yet with a single edit.
+        Returns the names of the added schemes."""
+        scheme_positions = self._scheme_index()
+        position = len(self.get('schemes'))
+        new_schemes = []
+        for scheme_dict in scheme_dicts:
+            scheme_name = scheme_dict['name']
+            if scheme_name in scheme_positions:
+                logging.debug('Not adding scheme {} (already in config)'
+                              .format(scheme_name))
+                continue
+            scheme_positions[scheme_name] = position
+            position += 1
+            new_schemes.append(scheme_dict)
+        if not new_schemes:
+            return []
+
+        self._extend('schemes', items=new_schemes)
+        added_names = [scheme['name'] for scheme in new_schemes]
+        logging.info('Added schemes {} to config'.format(', '.join(added_names)))
+        return added_names
 
     def remove_scheme(self, scheme_name):
-        if scheme_name not in self.schemes():
-            return
-
-        self._config_copy = copy.deepcopy(self.config)
-        i_of_scheme_to_remove = next((
-            i for i, scheme in enumerate(self.config['schemes'])
-            if scheme['name'] == scheme_name
-        ))
-        self.config['schemes'].pop(i_of_scheme_to_remove)
-        changed_line_number, change_length = self.__get_line_number_for_change(
-            self._config_copy, self.config)
-        self.__increase_comment_offset_from_pos(
-            start_pos=changed_line_number, increment_by=-change_length)
-        logging.info('Removed scheme {} from config'.format(scheme_name))
+        self.remove_schemes([scheme_name])
+
+    @timing.timed('config.remove_schemes')
+    def remove_schemes(self, scheme_names=(), pattern=None, positions=()):
+        """Removes all schemes with one of the given names, a name matching
+        the glob pattern or one of the given positions in the schemes list
+        with a single edit. Returns the removed names."""
+        scheme_names = set(scheme_names)
+        positions = set(positions)
+        indices = [
+            i for i, scheme in enumerate(self.get('schemes'))
+            if i in positions or scheme['name'] in scheme_names or
+            (pattern is not None and fnmatch.fnmatchcase(scheme['name'], pattern))
+        ]
+        if not indices:
+            return []
+
+        removed_names = [self.get('schemes', i, 'name') for i in indices]
+        self._remove_all('schemes', keys=indices)
+        # Positions of all following schemes changed
+        self._scheme_positions = None
+        logging.info('Removed schemes {} from config'.format(
+            ', '.join(removed_names)))
+        return removed_names
+
+    @timing.timed('config.sync_schemes')
+    def sync_schemes(self, scheme_dicts, previous_names=()):
+        """Makes the schemes of the config match scheme_dicts: new schemes are
+        added and schemes whose colors changed are replaced in place. Schemes
+        named in previous_names (the names scheme_dicts had the last time) that
+        are not in scheme_dicts anymore are removed, unless a profile uses
+        them. Other schemes (the user's own, the built-in ones) are kept.
+        Returns the (added, updated, removed) names."""
+        scheme_positions = self._scheme_index()
+        schemes = self.get('schemes')
+        new_schemes = []
+        updated_names = []
+        for scheme_dict in scheme_dicts:
+            position = scheme_positions.get(scheme_dict['name'])
+            if position is None:
+                new_schemes.append(scheme_dict)
+            elif scheme_hash(schemes[position]) != scheme_hash(scheme_dict):
+                self._set_key('schemes', key=position, value=scheme_dict)
+                updated_names.append(scheme_dict['name'])
+        removed_names = []
+        if previous_names:
+            names = {scheme_dict['name'] for scheme_dict in scheme_dicts}
+            names.update(self.schemes_in_use())
+            removed_names = self.remove_schemes(
+                [name for name in previous_names if name not in names])
+        added_names = self.add_schemes(new_schemes)
+        if updated_names:
+            logging.info('Updated schemes {} in config'.format(
+                ', '.join(updated_names)))
+        return added_names, updated_names, removed_names
 
     def schemes(self):
         return [scheme['name'] for scheme in self.get('schemes')]
 
+    def schemes_in_use(self):
+        profiles = [self.get_defaults(), *self.profiles()]
+        return {profile['colorScheme'] for profile in profiles
+                if 'colorScheme' in profile}
+
+    def has_scheme(self, scheme_name):
+        return scheme_name in self._scheme_index()
+
+    def _scheme_index(self):
+        if self._scheme_positions is None:
+            self._scheme_positions = {}
+            for i, scheme in enumerate(self.get('schemes')):
+                self._scheme_positions.setdefault(scheme['name'], i)
+        return self._scheme_positions
+
     def set_scheme(self, name=None, profile=None):
-        schemes = self.schemes()
+        schemes = self.get('schemes')
         if not schemes:
             logging.info('This config has no schemes :(')
             raise Exception
         if not name:
-            name = random.choice(schemes)
+            import random
+            name = random.choice(schemes)['name']
         if profile:
             self.set_attribute_for_profile(profile, 'colorScheme', name)
             logging.info('Scheme {} set for profile {}'.format(name, profile))
@@ -95,42 +260,44 @@ class WindowsTerminalConfig(object):
         current_scheme = self.get_attribute_for_profile(profile, 'colorScheme')
 
         if not current_scheme and choose_first_if_none_chosen:
-            all_schemes = self.schemes()
+            all_schemes = self.get('schemes')
             if len(all_schemes) == 0:
                 logging.info('This config has no schemes :(')
                 return None
-            current_scheme = all_schemes[0]
+            current_scheme = all_schemes[0]['name']
 
         return current_scheme
 
-    def cycle_schemes(self, profile=None, backwards=False):
-        next_scheme = self._next_scheme(profile, backwards)
+    def cycle_schemes(self, profile=None, backwards=False, candidates=None):
+        """Switches to the next (or previous) scheme, only counting schemes in
+        candidates if it is given."""
+        next_scheme = self._next_scheme(profile, backwards, candidates)
         if not next_scheme:
             raise Exception("This config file does not have schemes to cycle :(")
         logging.info('Cycling schemes. Next Theme: {}'.format(next_scheme))
         self.set_scheme(next_scheme, profile)
 
-    def _next_scheme(self, profile=None, backwards=False):
+    def _next_scheme(self, profile=None, backwards=False, candidates=None):
         current_scheme = self.get_current_scheme(profile)
-        if not current_scheme:
-            current_scheme = self.get_current_scheme(
-                profile, choose_first_if_none_chosen=True)
-            if not backwards:
-                return current_scheme
         logging.debug("profile: {}, scheme: {}".format(profile, current_scheme))
-        schemes = self.schemes()
-        if len(schemes) == 0:
-            return None
-        next_scheme = schemes[0]
-        if backwards:
-            schemes = list(reversed(schemes))
-        for i, scheme in enumerate(schemes):
-            if scheme == current_scheme:
+        schemes = self.get('schemes')
+        n = len(schemes)
+        i = self._scheme_index().get(current_scheme) if current_scheme else None
+        if i is not None:
+            step = -1 if backwards else 1
+            positions = ((i + step * k) % n for k in range(1, n + 1))
+        elif not current_scheme and backwards:
+            # Going back from the first scheme
+            positions = range(n - 1, -1, -1)
+        else:
+            positions = range(n)
+        for position in positions:
+            name = schemes[position]['name']
+            if candidates is None or name in candidates:
                 logging.debug("i: {}, current_scheme: {}, new scheme pos: {}".format(
-                    i, current_scheme, (i + 1) % len(schemes)))
-                next_scheme = schemes[(i + 1) % len(schemes)]
-                break
-        return next_scheme
+                    i, current_scheme, position))
+                return name
+        return None
 
     def _get_profile_names(self):
         profiles = self.profiles()
@@ -140,204 +307,351 @@ class WindowsTerminalConfig(object):
         self.set_attribute_for_profile('DEFAULTS', key, value)
 
     def get_attribute_for_profile(self, profile_name, key):
-        if profile_name == 'DEFAULTS':
-            profile = self.get_defaults()
-        else:
-            profile = next((profile for profile in self.profiles()
-                            if profile['name'] == profile_name))
-        return profile.get(key)
+        return self.get_profile(profile_name).get(key)
 
     def get_profile(self, profile_name, from_other_obj=None):
+        """Returns the profile with the given name or GUID, or the defaults
+        for all profiles for 'DEFAULTS'."""
+        return self.get(*self._profile_path(profile_name))
+
+    def _profile_index(self):
+        if self._profile_positions is None:
+            self._profile_positions = {}
+            for i, profile in enumerate(self.profiles()):
+                for key in ('guid', 'name'):
+                    if key in profile:
+                        self._profile_positions.setdefault(profile[key], i)
+        return self._profile_positions
+
+    def _profile_path(self, profile_name):
         if profile_name in ('DEFAULTS', None):
-            profile = self.get_defaults()
-        else:
-            profile = next((profile for profile in self.profiles()
-                            if profile['name'] == profile_name))
-        return profile
+            return ('profiles', 'defaults')
+        i_of_profile = self._profile_index().get(profile_name)
+        if i_of_profile is None:
+            raise ProfileNotFoundError(
+                'No profile with name or GUID "{}" in config'.format(profile_name))
+        return ('profiles', 'list', i_of_profile)
 
     def set_attribute_for_profile(self, profile_name, key, value):
-        profile = self.get_profile(profile_name)
-
-        # Calculations for adding a line here, comments have to be moved
-        if key not in profile:
-            config_copy = self.clone()
-            profile_copy = config_copy.get_profile(profile_name)
-            profile_copy[key] = value
-
-            changed_line_number, change_length = self.__get_line_number_for_change(
-                self.config, config_copy.config)
-            if change_length == 0:
-                raise Exception("This should never happen :|")
-            self.__increase_comment_offset_from_pos(start_pos=changed_line_number,
-                                                    increment_by=change_length)
-        profile[key] = value
+        self._set_key(*self._profile_path(profile_name), key=key, value=value)
+        if key in ('guid', 'name'):
+            self._profile_positions = None
         return self
 
     @classmethod
     def from_file(cls, path):
+        return WindowsTerminalConfig.parse(cls.read_file(path))
+
+    @classmethod
+    @timing.timed('config.read')
+    def read_file(cls, path):
         logging.info("Trying to load Terminal config from {}".format(path))
         try:
-            with open(path, 'r') as file:
-                text = file.read()
+            # Not utf-8-sig and without translating newlines, a BOM and \r\n
+            # are kept in the text and written back
+            with open(path, 'r', encoding='utf-8', newline='') as file:
+                return file.read()
         except OSError:
             print("Could not open config file at \"{}\"\nDoes it exist?".format(
                 path
             ))
             raise
 
-        return WindowsTerminalConfig.parse(text)
-
     @classmethod
-    def parse(cls, config_as_string):
+    @timing.timed('config.parse')
+    def parse(cls, config_as_string, spans=None, track=None):
         logging.info("Parsing config file")
-        text = WindowsTerminalConfigFile.fix_formatting(config_as_string)
-        line_array = text.split('\n')
-
-        lines_without_comments = []
-        comments = {}
-        for i, line in enumerate(line_array):
-            if re.match(' *//|^ *$', line):
-                comments[i] = line
-            else:
-                lines_without_comments.append(line)
-
-        return WindowsTerminalConfig(json.loads('\n'.join(lines_without_comments)),
-                                     comments)
+        config, comments, trailing_comments = jsonc.parse(
+            config_as_string, spans=spans, track=track)
+        first_newline = config_as_string.find('\n')
+        newline = '\r\n' if first_newline > 0 and config_as_string[
+            first_newline - 1] == '\r' else '\n'
+        return WindowsTerminalConfig(config, comments, trailing_comments,
+                                     bom=config_as_string.startswith(jsonc.BOM),
+                                     newline=newline)
 
     def __increase_comment_offset_from_pos(self, start_pos=0, increment_by=1):
-        new_comments = {}
-        for line_number, comment in self.comments.items():
-            if line_number <= start_pos:
-                new_comments[line_number] = comment
-            else:
-                new_comments[line_number + increment_by] = comment
-        self.comments = new_comments
-
-    @classmethod
-    def _get_formatted_lines(cls, json_dict):
-        dumped = orjson.dumps(json_dict, option=orjson.OPT_INDENT_2)
-        return WindowsTerminalConfigFile.fix_formatting(dumped.decode()).split('\n')
-
-    @classmethod
-    def _get_first_different_line(cls, lines1, lines2):
-        # This is the linear approach. Turns out this is really slow when
-        # you add all 200+ schemes and the config file becomes 4000+ lines...
-        # return next(line_num for line_num, (line1, line2) in
-        #             enumerate(zip(old_lines, new_lines))
-        #             if line1 != line2)
-
-        def equal_up_to(line):
-            return "".join(lines1[0:line]) == "".join(lines2[0:line])
-
-        # Find lines that are different with binary search.
-        # Works because the lines are "sorted" for this purpose
-        # (unchanged lines numbers < changed line numbers)
-        def binary_search(remaining_length, pos=None, counter=0):
-            # The counter is just for debugging...
-            counter += 1
-            # if counter > 300:
-            #     import ipdb; ipdb.set_trace()
-            if pos is None:
-                remaining_length = round(remaining_length / 2)
-                pos = remaining_length
-            next_distance = max(1, round(remaining_length / 2))
-            if pos == 0:
-                return 0 if lines1[0] != lines2[0] else None
-            if equal_up_to(pos):
-                return binary_search(next_distance, pos + next_distance, counter)
-            else:
-                if equal_up_to(pos - 1):
-                    return pos
-                return binary_search(next_distance, pos - next_distance, counter)
-
-        shortest = min(len(lines1), len(lines2))
-        first_different_line_number = binary_search(shortest)
-        return first_different_line_number
-
-    def __get_line_number_for_change(self, old_json, new_json):
-        old_lines = WindowsTerminalConfig._get_formatted_lines(old_json)
-        new_lines = WindowsTerminalConfig._get_formatted_lines(new_json)
-        # import difflib, tempfile
-        # with tempfile.TemporaryFile(mode='w') as file:
-        #     file.write(difflib.HtmlDiff().make_file(old_lines, new_lines))
-        try:
-            first_changed_line_number = WindowsTerminalConfig\
-                ._get_first_different_line(old_lines, new_lines)
-        except StopIteration:
-            None, 0
-        comments_before_line = (len(['_' for k in self.comments
-                                     if k < first_changed_line_number]))
-        # print('Line: ', first_changed_line_number)
-        # print("Comments before line", comments_before_line)
-        first_changed_line_number_with_comments =\
-            first_changed_line_number + comments_before_line
-        # print("With comments", first_changed_line_number_with_comments)
-        length_difference = abs(len(new_lines) - len(old_lines))
-        return first_changed_line_number_with_comments, length_difference
-
+        def move(comments):
+            new_comments = {}
+            for line_number, comment in comments.items():
+                if line_number <= start_pos:
+                    new_comments[line_number] = comment
+                else:
+                    new_comments[line_number + increment_by] = comment
+            return new_comments
+
+        self.comments = move(self.comments)
+        self.trailing_comments = move(self.trailing_comments)
+
+    def _comment_offsets(self):
+        # Line number of every comment minus the comments in front of it, in
+        # order (never decreasing)
+        return [comment_line_number - i
+                for i, comment_line_number in enumerate(sorted(self.comments))]
+
+    def _line_with_comments(self, line_number, offsets=None):
+        # Comments are stored with their line number in the assembled file,
+        # every comment in front of a line pushes it down by one
+        if offsets is None:
+            offsets = self._comment_offsets()
+        return line_number + bisect.bisect_right(offsets, line_number)
+
+    def _insert_lines_after(self, line_number, count):
+        self.__increase_comment_offset_from_pos(
+            start_pos=self._line_with_comments(line_number), increment_by=count)
+
+    def _remove_lines(self, *spans):
+        """Removes the comments inside of the given (line_number, count) spans
+        and moves all following comments up, in a single pass."""
+        offsets = self._comment_offsets()
+        removed_ranges = [
+            (self._line_with_comments(line_number, offsets),
+             self._line_with_comments(line_number + count - 1, offsets))
+            for line_number, count in sorted(spans)]
+
+        def move(comments, trailing):
+            # Comments and ranges are both in order, so the ranges in front of
+            # a comment are only walked past once
+            new_comments = {}
+            removed_before = 0
+            ranges = iter(removed_ranges)
+            first, last = next(ranges, (None, None))
+            for comment_line_number in sorted(comments):
+                while first is not None and (comment_line_number > last or (
+                        first < comment_line_number == last and not trailing)):
+                    removed_before += last - first + 1
+                    first, last = next(ranges, (None, None))
+                if first is not None and (comment_line_number > first or (
+                        comment_line_number == first and trailing)):
+                    # Comments inside of the removed lines go away with them
+                    continue
+                new_comments[comment_line_number - removed_before] =\
+                    comments[comment_line_number]
+            return new_comments
+
+        self.comments = move(self.comments, trailing=False)
+        self.trailing_comments = move(self.trailing_comments, trailing=True)
+
+    def _append_to(self, *path, value):
+        self._extend(*path, items=[value])
+
+    def _extend(self, *path, items):
+        self.edit_count += 1
+        container = self.get(*path)
+        index = self._line_index
+        old_size = index.node_size(*path)
+        if container:
+            # New lines go after the last element, which only gets a comma
+            line_number = index.end(*path) - 1
+        else:
+            # New lines go right after the opening bracket
+            line_number = index.start(*path)
+        if isinstance(container, dict):
+            container.update(items)
+        else:
+            container.extend(items)
+        index.forget(container)
+        increment_by = index.node_size(*path) - old_size
+        index.adjust(path, increment_by)
+        self._insert_lines_after(line_number, increment_by)
+
+    def _remove_all(self, *path, keys):
+        self.edit_count += 1
+        container = self.get(*path)
+        line_index = self._line_index
+        old_size = line_index.node_size(*path)
+        end = line_index.end(*path)
+        keys = set(keys)
+        spans = []
+        line_number = line_index.start(*path) + 1
+        for key, child in (container.items() if isinstance(container, dict)
+                           else enumerate(container)):
+            count = line_index.size(child, key if isinstance(key, str) else None)
+            if key in keys:
+                spans.append((line_number, count))
+                line_index.forget(child)
+            line_number += count
+        if isinstance(container, dict):
+            for key in keys:
+                del container[key]
+        else:
+            container[:] = [child for i, child in enumerate(container)
+                            if i not in keys]
+        line_index.forget(container)
+        increment_by = line_index.node_size(*path) - old_size
+        line_index.adjust(path, increment_by)
+        removed_lines = sum(count for _, count in spans)
+        if -increment_by > removed_lines:
+            # An empty container that is not split joins its brackets
+            spans.append((end, -increment_by - removed_lines))
+        self._remove_lines(*spans)
+
+    def _set_key(self, *path, key, value):
+        container = self.get(*path)
+        if isinstance(container, dict) and key not in container:
+            self._append_to(*path, value=(key, value))
+            return
+        line_index = self._line_index
+        old_count = line_index.node_size(*path, key)
+        new_count = line_index.size(value, key)
+        if old_count != new_count:
+            first = self._line_with_comments(line_index.start(*path, key))
+            self._remove_lines((line_index.start(*path, key), old_count))
+            # Comments in front of the old value stay in front of the new one
+            self.__increase_comment_offset_from_pos(
+                start_pos=first - 1, increment_by=new_count)
+            line_index.adjust((*path, key), new_count - old_count)
+        line_index.forget(container[key])
+        container[key] = value
+        self.edit_count += 1
+
+    @timing.timed('config.assemble')
     def assemble_config(self):
-        conf_string = WindowsTerminalConfigFile.fix_formatting(
-            json.dumps(self.config, indent=4))
-        comment_offset = 0
-        assembled_config_lines = []
-
-        for i, line in enumerate(conf_string.split("\n")):
-            while (comment_for_current_line := self.comments.get(i + comment_offset)) is not None: # noqa
-                assembled_config_lines.append(comment_for_current_line)
-                comment_offset += 1
-            assembled_config_lines.append(line)
-        assembled_config = "\n".join(assembled_config_lines)
-        return assembled_config
+        return jsonc.dumps(self.config, self.comments, self.trailing_comments,
+                           self.bom)
+
+
+CONFIG_DIR_ENV_VARIABLE = 'WTSM_CONFIG_DIR'
+TERMINAL_PACKAGE_DIR = os.path.join(
+    'Packages', 'Microsoft.WindowsTerminal_8wekyb3d8bbwe', 'LocalState')
+
+
+def scheme_hash(scheme):
+    """Hash of the colors of a scheme (everything but its name), to find out
+    if two versions of a scheme differ."""
+    colors = {key: value.lower() if isinstance(value, str) else value
+              for key, value in scheme.items() if key != 'name'}
+    return hashlib.sha256(
+        json.dumps(colors, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def cache_dir():
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(
+        os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_home, 'wtsm')
+
+
+@timing.timed('config_dir.ask_windows')
+def _find_local_app_data_from_wsl():
+    # Asking Windows through powershell is slow, so it is only done when the
+    # cached result is missing or does not exist anymore
+    import subprocess
+    local_app_data = subprocess.check_output(
+        ["powershell.exe", "[Environment]::GetFolderPath('LocalApplicationData')"],
+        encoding='utf-8').strip()
+    return subprocess.check_output(
+        ["wslpath", local_app_data], encoding='utf-8').strip()
+
+
+@lru_cache(maxsize=None)
+@timing.timed('config_dir')
+def default_config_dir():
+    """Directory of the Windows Terminal config. Can be set with the
+    WTSM_CONFIG_DIR environment variable, otherwise it is looked up (and
+    cached on disk when running in WSL)."""
+    config_dir = os.environ.get(CONFIG_DIR_ENV_VARIABLE)
+    if config_dir:
+        return os.path.expandvars(config_dir)
+    import platform
+    if platform.system() == "Windows":
+        return os.path.join(
+            os.path.expandvars('%LOCALAPPDATA%'), TERMINAL_PACKAGE_DIR)
+
+    cache_path = os.path.join(cache_dir(), 'config_dir')
+    try:
+        with open(cache_path, 'r') as file:
+            config_dir = file.read().strip()
+        if os.path.isdir(config_dir):
+            return config_dir
+        logging.info("Cached config directory {} does not exist anymore".format(
+            config_dir))
+    except OSError:
+        pass
+
+    try:
+        config_dir = os.path.join(
+            _find_local_app_data_from_wsl(), TERMINAL_PACKAGE_DIR)
+    except (OSError, ValueError) as error:
+        logging.info("Could not ask Windows for LocalAppData: {}".format(error))
+        sys.exit('Could not find the Windows Terminal config directory, set {} or '
+                 'use --config_file'.format(CONFIG_DIR_ENV_VARIABLE))
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        with open(cache_path, 'w') as file:
+            file.write(config_dir)
+    except OSError:
+        logging.info("Could not cache config directory in {}".format(cache_path))
+    return config_dir
 
 
 class WindowsTerminalConfigFile(object):
-    if platform.system() == "Windows":
-        APPDATA = os.path.expandvars('%LOCALAPPDATA%')
-    else:
-        LOCALAPPDATA = subprocess.check_output(
-            ["powershell.exe", "[Environment]::GetFolderPath('LocalApplicationData')"],
-            encoding='utf-8').strip()
-        APPDATA = subprocess.check_output(
-            ["wslpath", LOCALAPPDATA], encoding='utf-8').strip()
-    DEFAULT_CONFIG_DIR = os.path.join(
-        APPDATA, 'Packages', 'Microsoft.WindowsTerminal_8wekyb3d8bbwe', 'LocalState')
-    DEFAULT_CONFIG_PATH = os.path.join(DEFAULT_CONFIG_DIR, 'profiles.json')
-    DEFAULT_BACKUP_PATH = DEFAULT_CONFIG_DIR
-    DEFAULT_BACKUP_FILENAME = 'profiles_{}.json'
-    BACKUP_DATE_FORMAT = '%Y%m%d%H%M'
-    BRACKET_REGEX = re.compile(r":\s*\n\s*([\[\{])")
-    EMPTY_ARRAY_REGEX = re.compile(r"([ \t]*)(\"[^\[\n\"]+\"\: )\[[\t ]*\](,?)")
-    EMPTY_OBJECT_REGEX = re.compile(r"([ \t]*)(\"[^{\n\"]+\"\: ){[\t ]*}(,?)")
+    DEFAULT_CONFIG_FILENAME = 'profiles.json'
+    # Operations of apply and their arguments (with their defaults)
+    OPERATIONS = {
+        'set_scheme': {'scheme': None, 'profile': None},
+        'cycle_schemes': {'profile': None, 'backwards': False},
+        'set_attribute': {'key': None, 'value': None, 'profile': None},
+        'add_schemes': {'schemes': None},
+        'remove_schemes': {'names': (), 'pattern': None},
+    }
 
     def __init__(self, path=None):
         if path is None:
-            path = self.__class__.DEFAULT_CONFIG_PATH
+            path = self.default_config_path()
         if not os.path.exists(os.path.expandvars(path)):
             sys.exit('Config file not found ({})'.format(path))
         self.path = os.path.expandvars(path)
-        self.config = WindowsTerminalConfig.from_file(self.path)
-
-    def backup_config_file(self, dest=DEFAULT_BACKUP_PATH):
-        destination_template = os.path.expandvars(os.path.join(
-            dest, self.DEFAULT_BACKUP_FILENAME))
+        # (path, size, mtime) and SHA-256 of the file last hashed or written
+        self._digest_cache = (None, None)
+        self.reload()
 
+    @classmethod
+    def default_config_path(cls):
+        return os.path.join(default_config_dir(), cls.DEFAULT_CONFIG_FILENAME)
+
+    def default_backup_path(self):
+        return os.path.dirname(self.path)
+
+    def backup_store(self, dest=None):
+        from windows_terminal_scheme_manager.backups import BackupStore
+        if dest is None:
+            dest = self.default_backup_path()
+        return BackupStore(os.path.join(
+            os.path.expandvars(dest), BackupStore.DIRECTORY_NAME))
+
+    @timing.timed('write.backup')
+    def backup_config_file(self, dest=None):
+        """Adds the config file to the backup store in dest and prunes old
+        backups. Returns the backup."""
         try:
+            with open(self.path, 'rb') as file:
+                data = file.read()
             config_mtime = datetime.fromtimestamp(os.stat(self.path).st_mtime)
         except FileNotFoundError:
             logging.info("No file found at {}, nothing to backup".format(self.path))
             return
-        backup_path = destination_template.format(config_mtime.strftime(
-            self.BACKUP_DATE_FORMAT))
-        logging.info("Backing up Terminal config file to {}".format(backup_path))
-        with open(self.path, 'r') as file:
-            with open(backup_path, 'w') as backup_file:
-                backup_file.write(file.read())
-
-        filecmp.cmp(self.path, backup_path)
-        logging.info("Backed up and checked Terminal config file to {}".format(
-            backup_path))
-
-    def remove_backups(self, dest=DEFAULT_BACKUP_PATH):
+        store = self.backup_store(dest)
+        logging.info("Backing up Terminal config file to {}".format(store.directory))
+        backup = store.add(data, time=config_mtime)
+        store.prune()
+        return backup
+
+    def restore_backup(self, backup_id, dest=None):
+        """Replaces the config file with a backup (id or hash) from dest. The
+        current file is backed up first."""
+        store = self.backup_store(dest)
+        backup = store.find(backup_id)
+        data = store.read(backup)
+        if self._file_digest() != hashlib.sha256(data).digest():
+            self._replace_file(data, backup_dest=dest)
+        self.reload()
+        return backup
+
+    def remove_backups(self, dest=None):
+        """Removes all backups, including the timestamped copies older versions
+        of wtsm made."""
+        if dest is None:
+            dest = self.default_backup_path()
         regex = r"^profiles_\d{12}.json$"
         backups_dir = os.path.expandvars(dest)
         with os.scandir(backups_dir) as files:
@@ -346,34 +660,264 @@ class WindowsTerminalConfigFile(object):
                     logging.debug("Deleting backup file {}".format(file.name))
                     os.remove(os.path.join(backups_dir, file.name))
                     logging.info("Deleted backup file {}".format(file.name))
+        self.backup_store(dest).clear()
 
     def reload(self):
-        self.config = WindowsTerminalConfig.from_file(self.path)
+        return self._load(WindowsTerminalConfig.read_file(self.path))
+
+    def _load(self, text):
+        spans = {}
+        self.config = WindowsTerminalConfig.parse(
+            text, spans=spans, track=self._is_patchable_path)
+        # The text the config was read from, kept as long as all edits of the
+        # config could be made to it directly (see _patch_attribute)
+        self.text = text
+        self._text_spans = spans
+        self._text_edit_count = self.config.edit_count
+        self._text_patched = False
         return self.config
 
-    def test_write(self, path=DEFAULT_CONFIG_PATH.replace(
-                   'profiles.json', 'profiles_test.json')):
+    @contextmanager
+    def transaction(self, write=True):
+        """Edits of the config in the with block are written once at the end.
+        If the block raises, the config goes back to the state it had before
+        and nothing is written."""
+        if self.text is not None and self._text_edit_count == self.config.edit_count:
+            # Parsing the text again is only needed if something fails
+            text, snapshot = self.text, None
+        else:
+            text, snapshot = None, self.config.clone()
+        try:
+            yield self.config
+        except BaseException:
+            logging.info("Rolling back the changes to the config")
+            if text is not None:
+                self._load(text)
+            else:
+                self.config, self.text = snapshot, None
+            raise
+        if write:
+            self.write()
+
+    @timing.timed('config.apply')
+    def apply(self, operations, write=True):
+        """Runs the operations (dicts, see OPERATIONS) in one transaction.
+        Raises InvalidOperationError (after rolling back) if one fails."""
+        with self.transaction(write=write):
+            for number, operation in enumerate(operations, 1):
+                try:
+                    self._apply_operation(operation)
+                except Exception as error:
+                    raise InvalidOperationError('Operation {} ({}) failed: {}'.format(
+                        number, operation.get('op') if isinstance(operation, dict)
+                        else operation, error)) from error
+        return len(operations)
+
+    def _apply_operation(self, operation):
+        if (not isinstance(operation, dict) or
+                operation.get('op') not in self.OPERATIONS):
+            raise InvalidOperationError('operations are objects with an "op" out of '
+                                        '{}'.format(', '.join(self.OPERATIONS)))
+        arguments = dict(self.OPERATIONS[operation['op']])
+        unknown = set(operation) - set(arguments) - {'op'}
+        if unknown:
+            raise InvalidOperationError('unknown arguments {}'.format(
+                ', '.join(sorted(unknown))))
+        arguments.update((key, value) for key, value in operation.items()
+                         if key != 'op')
+        getattr(self, '_apply_' + operation['op'])(**arguments)
+
+    def _apply_set_scheme(self, scheme, profile):
+        if not self.config.has_scheme(scheme):
+            raise InvalidOperationError('no scheme named "{}"'.format(scheme))
+        self.set_scheme(scheme, profile)
+
+    def _apply_cycle_schemes(self, profile, backwards):
+        self.cycle_schemes(profile, backwards=backwards)
+
+    def _apply_set_attribute(self, key, value, profile):
+        if not isinstance(key, str):
+            raise InvalidOperationError('"key" has to be a string')
+        self.config.set_attribute_for_profile(profile, key, value)
+
+    def _apply_add_schemes(self, schemes):
+        if not isinstance(schemes, list) or not all(
+                isinstance(scheme, dict) and isinstance(scheme.get('name'), str)
+                for scheme in schemes):
+            raise InvalidOperationError('"schemes" has to be a list of schemes')
+        self.config.add_schemes(schemes)
+
+    def _apply_remove_schemes(self, names, pattern):
+        if not isinstance(names, (list, tuple)):
+            raise InvalidOperationError('"names" has to be a list')
+        self.config.remove_schemes(names, pattern=pattern)
+
+    @staticmethod
+    def _is_patchable_path(path):
+        # Attributes of the defaults and the profiles
+        return path[0] == 'profiles' and len(path) <= 4
+
+    @timing.timed('config.set_scheme')
+    def set_scheme(self, name=None, profile=None):
+        self.config.set_scheme(name, profile)
+        self._patch_attribute(profile, 'colorScheme')
+
+    @timing.timed('config.cycle_schemes')
+    def cycle_schemes(self, profile=None, backwards=False, candidates=None):
+        self.config.cycle_schemes(profile, backwards, candidates)
+        self._patch_attribute(profile, 'colorScheme')
+
+    def _patch_attribute(self, profile_name, key):
+        """Changes key of the profile in the text the config was read from to
+        the value it has in the config now, so that write() does not have to
+        assemble the whole config. If the config was edited in other ways or
+        the spot in the text is unclear, the whole config is written."""
+        if self.text is None or self.config.edit_count != self._text_edit_count + 1:
+            self.text = None
+            return
+        path = self.config._profile_path(profile_name)
+        value = json.dumps(self.config.get(*path, key))
+        patch = self._find_patch(path, key, value)
+        if patch is None:
+            logging.info("Can not change {} in place, writing whole config".format(
+                key))
+            self.text = None
+            return
+        start, end, replacement, member_offset = patch
+        self.text = self.text[:start] + replacement + self.text[end:]
+        increment_by = len(replacement) - (end - start)
+        for span_path, span in self._text_spans.items():
+            if span is not None:
+                self._text_spans[span_path] = tuple(
+                    position if position < end else position + increment_by
+                    for position in span)
+        if member_offset is not None:
+            member_start = start + member_offset
+            value_start = member_start + len(json.dumps(key)) + 2
+            self._text_spans[(*path, key)] = (
+                member_start, value_start, value_start + len(value))
+        self._text_edit_count = self.config.edit_count
+        self._text_patched = True
+
+    def _find_patch(self, path, key, value):
+        """Returns (start, end, replacement, member_offset) to put value into
+        the text, member_offset is where a newly added member starts in the
+        replacement. Returns None if that is not possible."""
+        text = self.text
+        spans = self._text_spans
+        if (*path, key) in spans:
+            if spans[(*path, key)] is None:
+                return None
+            _, value_start, value_end = spans[(*path, key)]
+            return value_start, value_end, value, None
+
+        if spans.get(path) is None:
+            return None
+        _, object_start, object_end = spans[path]
+        member = '{}: {}'.format(json.dumps(key), value)
+        first_key = next((other_key for other_key in self.config.get(*path)
+                          if other_key != key), None)
+        if first_key is None:
+            # Empty object, new line after the opening bracket
+            line_start = text.rfind('\n', 0, object_start) + 1
+            indent = re.match(r'[ \t]*', text[line_start:object_start]).group()
+            prefix = self.config.newline + indent + '    '
+            inside = text[object_start + 1:object_end - 1]
+            if '\n' in inside:
+                return (object_start + 1, object_start + 1, prefix + member,
+                        len(prefix))
+            if inside.strip():
+                return None
+            # {} on one line, the closing bracket gets a line of its own
+            return (object_start + 1, object_end - 1,
+                    prefix + member + self.config.newline + indent, len(prefix))
+        if spans.get((*path, first_key)) is None:
+            return None
+        # Before the first member, on a line of its own if that member has one
+        first_member_start = spans[(*path, first_key)][0]
+        line_start = text.rfind('\n', 0, first_member_start) + 1
+        indent = text[line_start:first_member_start]
+        separator = ' ' if indent.strip() else self.config.newline + indent
+        return (first_member_start, first_member_start,
+                member + ',' + separator, 0)
+
+    def test_write(self, path=None):
+        if path is None:
+            path = os.path.join(os.path.dirname(self.path), 'profiles_test.json')
         old_path = self.path
         self.path = path
         self.write()
         self.path = old_path
 
-    def write(self):
-        assembled_config = self.config.assemble_config()
-        self.backup_config_file()
+    @timing.timed('write.serialize')
+    def serialize(self):
+        """Returns the config the way write() would write it (bytes), with the
+        line endings of the file it was read from."""
+        if (self.text is not None and self._text_patched and
+                self._text_edit_count == self.config.edit_count):
+            assembled_config = self.text
+        else:
+            assembled_config = self.config.assemble_config()
+            if self.config.newline != '\n':
+                assembled_config = assembled_config.replace(
+                    '\n', self.config.newline)
+            self.text = None
+        return assembled_config.encode('utf-8')
+
+    @timing.timed('write')
+    def write(self, data=None):
+        """Writes the config, or data returned by serialize() earlier."""
+        if data is None:
+            data = self.serialize()
+        if self._file_digest() == hashlib.sha256(data).digest():
+            logging.info("Terminal config file is unchanged, not writing it")
+            return
         logging.info("Trying to write Terminal config file to {}".format(self.path))
-        with open(self.path, 'w') as file:
-            file.write(assembled_config)
+        self._replace_file(data)
         logging.info("Finished writing Terminal config file")
 
-    @classmethod
-    def fix_formatting(cls, lines):
-        logging.debug('Fixing Formatting')
-        # Removes newlines before opening [ and {
-        lines = cls.BRACKET_REGEX.sub(': \\1', lines)
-        # Splits empty arrays in 2 lines
-        lines = cls.EMPTY_ARRAY_REGEX.sub('\\1\\2[\n\\1]\\3', lines)
-        # Splits empty objects in 2 lines
-        lines = cls.EMPTY_OBJECT_REGEX.sub('\\1\\2{\n\\1}\\3', lines)
-        logging.debug('Formatting fixed')
-        return lines
+    def _replace_file(self, data, backup_dest=None):
+        """Atomically replaces the config file with data (bytes), after adding
+        the old file to the backups."""
+        import tempfile
+        directory, filename = os.path.split(self.path)
+        fd, temp_path = tempfile.mkstemp(
+            prefix='.{}.'.format(filename), suffix='.tmp', dir=directory or '.')
+        try:
+            with timing.span('write.file'), os.fdopen(fd, 'wb') as file:
+                file.write(data)
+                file.flush()
+                os.fsync(file.fileno())
+            try:
+                os.chmod(temp_path, stat.S_IMODE(os.stat(self.path).st_mode))
+            except FileNotFoundError:
+                pass
+            # The old file stays intact until the new one replaces it
+            self.backup_config_file(backup_dest)
+            os.replace(temp_path, self.path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        self._remember_file_digest(hashlib.sha256(data).digest())
+
+    @timing.timed('write.hash')
+    def _file_digest(self):
+        """Returns the SHA-256 of the file at self.path, or None if there is
+        none. The digest is cached as long as size and mtime do not change."""
+        try:
+            file_stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        key = (self.path, file_stat.st_size, file_stat.st_mtime_ns)
+        cached_key, digest = self._digest_cache
+        if cached_key != key:
+            with open(self.path, 'rb') as file:
+                digest = hashlib.sha256(file.read()).digest()
+            self._digest_cache = (key, digest)
+        return digest
+
+    def _remember_file_digest(self, digest):
+        file_stat = os.stat(self.path)
+        self._digest_cache = (
+            (self.path, file_stat.st_size, file_stat.st_mtime_ns), digest)
@@ -0,0 +1,105 @@
+import json
+import functools
+import threading
+from time import perf_counter
+
+# Timing of the phases of a command, shown by `wtsm --profile`.
+#
+# Code marks its phases with `with span('name'):` or the @timed('name')
+# decorator. Nothing is recorded until enable() is called, until then a span
+# costs a global lookup and a comparison. Spans can be nested, the report
+# adds up the calls of each phase under the same parent phases. Every thread
+# nests its spans on its own, spans of other threads (like the background
+# writer of the UI) show up as phases of their own.
+
+_recorder = None
+
+
+class _Recorder(object):
+    def __init__(self):
+        self.start = perf_counter()
+        # [path, seconds] of every finished or running span, in start order
+        self.spans = []
+        # path: names of the spans the thread is in
+        self.local = threading.local()
+
+
+def enable():
+    global _recorder
+    _recorder = _Recorder()
+
+
+def disable():
+    global _recorder
+    _recorder = None
+
+
+def enabled():
+    return _recorder is not None
+
+
+class span(object):
+    __slots__ = ('name', '_record', '_start')
+
+    def __init__(self, name):
+        self.name = name
+        self._record = None
+
+    def __enter__(self):
+        recorder = _recorder
+        if recorder is not None:
+            path = getattr(recorder.local, 'path', ()) + (self.name,)
+            recorder.local.path = path
+            self._record = [path, 0.0]
+            recorder.spans.append(self._record)
+            self._start = perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self._record is not None:
+            self._record[1] = perf_counter() - self._start
+            if _recorder is not None:
+                _recorder.local.path = self._record[0][:-1]
+            self._record = None
+
+
+def timed(name):
+    """Decorator that runs the function in a span."""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if _recorder is None:
+                return function(*args, **kwargs)
+            with span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def phases():
+    """Returns the phases as dicts with path (names of the phase and its
+    parents), calls and seconds, in the order they first started."""
+    if _recorder is None:
+        return []
+    by_path = {}
+    for path, seconds in _recorder.spans:
+        phase = by_path.setdefault(path, {'path': list(path), 'calls': 0,
+                                          'seconds': 0.0})
+        phase['calls'] += 1
+        phase['seconds'] += seconds
+    return list(by_path.values())
+
+
+def report(as_json=False):
+    """Text (or JSON) with the time of every phase and in total since
+    enable()."""
+    total = perf_counter() - _recorder.start if _recorder is not None else 0.0
+    if as_json:
+        return json.dumps({'seconds': total, 'phases': phases()}, indent=2)
+    lines = ['{:<44} {:>6} {:>10}'.format('Phase', 'Calls', 'ms')]
+    for phase in phases():
+        lines.append('{:<44} {:>6} {:>10.2f}'.format(
+            '  ' * (len(phase['path']) - 1) + phase['path'][-1], phase['calls'],
+            phase['seconds'] * 1000))
+    lines.append('{:<44} {:>6} {:>10.2f}'.format('total', '', total * 1000))
+    return '\n'.join(lines)